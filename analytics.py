@@ -0,0 +1,259 @@
+"""
+Статистика по записанным партиям.
+
+GameLogWriter подписывается на события GameState и пишет каждую партию в свой
+файл game-<время>.jsonl: одна строка JSON на событие. Индексы сторон и юнитов из событий
+пишутся именами (SIDE_FIELDS, order), так что журнал не зависит от порядка индексов.
+В каждой строке есть хэш позиции после события (position), по нему повтор партии
+проверяется на расхождение.
+Сводка (Summary) читает журналы построчно генераторами и хранит только счетчики
+и бегущие средние, поэтому память не зависит от числа партий. Вместе со сводкой
+на диске лежат смещения в еще открытых журналах, и update_summary() дочитывает только
+новые строки. Журнал закрыт, если в нем есть game_over или после него начат следующий
+(имена сортируются по времени начала); закрытые журналы забываются, от них остается только имя
+последнего (closed_until), а наборы незаконченной партии отбрасываются вместе с ней.
+"""
+import json
+import os
+import time
+from collections import Counter
+from typing import Dict, Iterator, Optional, Tuple
+
+from battle_engine import LOSE, OVERWHELM, WIN
+from battle_logic import GameState
+from catalogue import SIDE_INDEX, SIDE_NAMES, UNIT_NAMES
+from i18n import T, side_text, tr
+
+SIDES = SIDE_NAMES
+# Поля событий GameState, в которых лежит индекс стороны
+SIDE_FIELDS = ('side', 'attacker', 'defender', 'winner')
+SUMMARY_FILE = 'summary.json'
+SUMMARY_VERSION = 2
+OUTCOME_NAMES = {OVERWHELM: T.STATS_OVERWHELM, WIN: T.STATS_WIN, LOSE: T.STATS_LOSE}
+
+_default_dir = os.environ.get('STALINGAME_GAMES',
+                              os.path.join(os.path.expanduser('~'), '.stalingame', 'games'))
+
+
+def set_default_dir(path: str):
+    """Куда писать журналы партий (на Android — в user_data_dir приложения)"""
+    global _default_dir
+    _default_dir = path
+
+
+def get_default_dir() -> str:
+    return _default_dir
+
+
+class GameLogWriter:
+    """Слушатель GameState: событие -> строка в журнале текущей партии"""
+
+    def __init__(self, log_dir: Optional[str] = None):
+        self.log_dir = log_dir or _default_dir
+        self._file = None
+        self._games = 0
+
+    def __call__(self, event: str, data: dict):
+        if event == 'new_game':
+            # Файл новой партии заводится на первом событии: пустые партии не пишутся
+            self.close()
+            return
+        if self._file is None:
+            os.makedirs(self.log_dir, exist_ok=True)
+            self._games += 1
+            name = f"game-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._games:06d}.jsonl"
+            self._file = open(os.path.join(self.log_dir, name), 'w', encoding='utf-8')
+        line = dict(data, event=event, time=time.time(), position=GameState.position_digest())
+        for key in SIDE_FIELDS:
+            if line.get(key) is not None:
+                line[key] = SIDE_NAMES[line[key]]
+        if 'order' in line:
+            line['order'] = {UNIT_NAMES[unit]: count for unit, count in line['order'].items()}
+        self._file.write(json.dumps(line, ensure_ascii=False) + '\n')
+        self._file.flush()
+        if event == 'game_over':
+            self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def iter_log_files(log_dir: str) -> Iterator[str]:
+    if not os.path.isdir(log_dir):
+        return
+    for name in sorted(os.listdir(log_dir)):
+        if name.startswith('game-') and name.endswith('.jsonl'):
+            yield name
+
+
+def iter_events(path: str, offset: int = 0) -> Iterator[Tuple[int, dict]]:
+    """(смещение после строки, событие) начиная с offset; недописанная последняя строка пропускается"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b'\n'):
+                return
+            offset += len(line)
+            try:
+                yield offset, json.loads(line)
+            except ValueError:
+                continue
+
+
+class RunningMean:
+    __slots__ = ('count', 'mean')
+
+    def __init__(self, count: int = 0, mean: float = 0.0):
+        self.count = count
+        self.mean = mean
+
+    def add(self, value: float):
+        self.count += 1
+        self.mean += (value - self.mean) / self.count
+
+
+class Summary:
+    """Бегущие агрегаты по всем прочитанным партиям"""
+
+    def __init__(self):
+        self.games = 0
+        self.wins = Counter()
+        self.set_games = Counter()
+        self.set_wins = Counter()
+        self.bank = {side: RunningMean() for side in SIDES}
+        self.turns = Counter()
+        self.units_lost = Counter()
+        self.outcomes = Counter()
+        # Прочитано из открытых журналов, их наборы и последний закрытый журнал
+        self.offsets: Dict[str, int] = {}
+        self.open_games: Dict[str, Dict[str, str]] = {}
+        self.closed_until = ''
+
+    def feed(self, game: str, event: dict):
+        kind = event.get('event')
+        if kind == 'starting_set':
+            self.open_games.setdefault(game, {})[event['side']] = event['name']
+        elif kind == 'end_turn':
+            self.turns[event['side']] += 1
+            self.bank[event['side']].add(event['bank'])
+        elif kind == 'battle':
+            self.outcomes[event['outcome']] += 1
+            self.units_lost[event['defender']] += event['units_lost'] + event['forts_lost']
+        elif kind == 'game_over':
+            self.games += 1
+            self.wins[event['winner']] += 1
+            for side, set_name in self.open_games.pop(game, {}).items():
+                key = f"{side}/{set_name}"
+                self.set_games[key] += 1
+                self.set_wins[key] += side == event['winner']
+
+    def close_log(self, game: str):
+        """Журнал больше не пишется: партия без победителя в наборы не идет"""
+        self.offsets.pop(game, None)
+        self.open_games.pop(game, None)
+        self.closed_until = max(self.closed_until, game)
+
+    def win_rate(self, side: str) -> float:
+        return self.wins[side] / self.games if self.games else 0.0
+
+    def set_win_rate(self, key: str) -> float:
+        return self.set_wins[key] / self.set_games[key] if self.set_games[key] else 0.0
+
+    def units_lost_per_turn(self, side: str) -> float:
+        return self.units_lost[side] / self.turns[side] if self.turns[side] else 0.0
+
+    def lines(self):
+        """Строки для экрана статистики"""
+        yield tr(T.STATS_GAMES, games=self.games)
+        for side in SIDES:
+            yield f"=== {side_text(SIDE_INDEX[side])} ==="
+            yield tr(T.STATS_WINS, wins=self.wins[side], rate=self.win_rate(side))
+            yield tr(T.STATS_BANK, bank=self.bank[side].mean)
+            yield tr(T.STATS_LOSSES, losses=self.units_lost_per_turn(side))
+        yield ''
+        yield f"=== {tr(T.STATS_SETS)} ==="
+        for key in sorted(self.set_games):
+            yield f"{key}: {self.set_wins[key]}/{self.set_games[key]} ({self.set_win_rate(key):.0%})"
+        yield ''
+        yield f"=== {tr(T.STATS_OUTCOMES)} ==="
+        total = sum(self.outcomes.values())
+        for outcome, name in OUTCOME_NAMES.items():
+            count = self.outcomes[outcome]
+            yield f"{tr(name)}: {count} ({count / total if total else 0:.0%})"
+
+    def to_dict(self) -> dict:
+        return {
+            'version': SUMMARY_VERSION,
+            'games': self.games,
+            'wins': dict(self.wins),
+            'set_games': dict(self.set_games),
+            'set_wins': dict(self.set_wins),
+            'bank': {side: [mean.count, mean.mean] for side, mean in self.bank.items()},
+            'turns': dict(self.turns),
+            'units_lost': dict(self.units_lost),
+            'outcomes': {str(k): v for k, v in self.outcomes.items()},
+            'offsets': self.offsets,
+            'open_games': self.open_games,
+            'closed_until': self.closed_until,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Summary':
+        summary = cls()
+        if data.get('version') != SUMMARY_VERSION:
+            return summary
+        summary.games = data['games']
+        summary.wins.update(data['wins'])
+        summary.set_games.update(data['set_games'])
+        summary.set_wins.update(data['set_wins'])
+        for side, (count, mean) in data['bank'].items():
+            summary.bank[side] = RunningMean(count, mean)
+        summary.turns.update(data['turns'])
+        summary.units_lost.update(data['units_lost'])
+        summary.outcomes.update({int(k): v for k, v in data['outcomes'].items()})
+        summary.offsets = data['offsets']
+        summary.open_games = data['open_games']
+        summary.closed_until = data['closed_until']
+        return summary
+
+
+def load_summary(log_dir: str) -> Summary:
+    try:
+        with open(os.path.join(log_dir, SUMMARY_FILE), encoding='utf-8') as f:
+            return Summary.from_dict(json.load(f))
+    except (OSError, ValueError, KeyError):
+        return Summary()
+
+
+def save_summary(log_dir: str, summary: Summary):
+    path = os.path.join(log_dir, SUMMARY_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(summary.to_dict(), f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def update_summary(log_dir: Optional[str] = None) -> Summary:
+    """Сводка с учетом строк, дописанных в журналы после прошлого обновления"""
+    log_dir = log_dir or _default_dir
+    summary = load_summary(log_dir)
+    changed = False
+    names = [name for name in iter_log_files(log_dir) if name > summary.closed_until]
+    for i, name in enumerate(names):
+        path = os.path.join(log_dir, name)
+        offset = summary.offsets.get(name, 0)
+        finished = i < len(names) - 1
+        if os.path.getsize(path) > offset:
+            for offset, event in iter_events(path, offset):
+                summary.feed(name, event)
+                finished = finished or event.get('event') == 'game_over'
+            summary.offsets[name] = offset
+            changed = True
+        if finished:
+            summary.close_log(name)
+            changed = True
+    if changed:
+        save_summary(log_dir, summary)
+    return summary
@@ -0,0 +1,266 @@
+"""
+Автосохранение партии с отложенной записью.
+
+Слушатель GameState только отмечает, что позиция изменилась; изменения без события
+(ход соперника через GameState.apply_delta) отмечает mark_dirty(). Раз в окно (poll() по
+таймеру, в приложении — Clock) изменения за окно сворачиваются в одну дельту
+GameState.delta_since от прошлой записи, и дельта уходит в очередь потока записи.
+Касания в GameScreen и ShopScreen диска не ждут: запись, fsync и переименование идут
+в потоке, а поток, если отстал, пишет накопившееся одним fsync.
+
+На диске две части в каталоге сохранения:
+  autosave.json     опорная точка {version, scenario, seq, hash, d}: вся позиция,
+                    пишется во временный файл, fsync и os.replace;
+  autosave.journal  строки JSON {seq, base, hash, d} — дельты после опорной точки,
+                    дописываются с fsync; после новой опорной точки журнал обнуляется.
+Опорная точка пишется на первое изменение партии и после каждых CHECKPOINT_EVERY дельт;
+новая партия (событие new_game) стирает сохранение, пока в ней ничего не сделано.
+
+recover() при запуске берет опорную точку и дельты журнала, пока seq идут подряд и base
+совпадает с hash предыдущей; недописанная строка и все после нее отбрасываются. Позиция
+после применения сверяется с hash последней записи (GameState.position_digest), при
+расхождении берется одна опорная точка. Так после сбоя теряется не больше одного окна.
+"""
+import json
+import os
+import queue
+import threading
+from typing import Callable, List, Optional
+
+from battle_logic import GameState
+
+SNAPSHOT_FILE = 'autosave.json'
+JOURNAL_FILE = 'autosave.journal'
+VERSION = 2
+DEFAULT_INTERVAL = 1.0
+CHECKPOINT_EVERY = 200
+
+_RESET = 'reset'
+_SNAPSHOT = 'snapshot'
+_DELTA = 'delta'
+_STOP = 'stop'
+
+
+def _fsync_dir(path: str):
+    # На части платформ каталог не открывается для fsync; переименование все равно атомарно
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _scenario_name() -> Optional[str]:
+    return GameState._scenario.name if GameState._scenario is not None else None
+
+
+class Autosave:
+    def __init__(self, save_dir: str, checkpoint_every: int = CHECKPOINT_EVERY,
+                 on_error: Optional[Callable] = None):
+        """on_error(exception) вызывается из потока записи, если сохранить не удалось"""
+        self.save_dir = save_dir
+        self.checkpoint_every = checkpoint_every
+        self.on_error = on_error
+        self.seq = 0
+        self._baseline = None
+        self._baseline_digest = None
+        self._since_checkpoint = 0
+        self._dirty = False
+        self._reset = False
+        self._queue = queue.Queue()
+        self._thread = None
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.save_dir, SNAPSHOT_FILE)
+
+    @property
+    def journal_path(self) -> str:
+        return os.path.join(self.save_dir, JOURNAL_FILE)
+
+    # Главный поток
+
+    def start(self):
+        """Начинает запись от текущей позиции: первая запись после изменений — опорная точка"""
+        GameState.add_listener(self._on_game_event)
+        self._thread = threading.Thread(target=self._write_loop, name='autosave', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Дописывает последнее окно и останавливает поток записи"""
+        GameState.remove_listener(self._on_game_event)
+        if self._thread is not None:
+            self.poll()
+            self._queue.put((_STOP, None))
+            self._thread.join()
+            self._thread = None
+
+    def flush(self):
+        """Записывает изменения сразу и ждет диска (например, когда приложение уходит в фон)"""
+        if self._thread is not None:
+            self.poll()
+            self._queue.join()
+
+    def mark_dirty(self):
+        """Позиция изменилась помимо событий GameState: запишется в ближайшее окно"""
+        self._dirty = True
+
+    def _on_game_event(self, event, data):
+        if event == 'new_game':
+            # Новая партия еще не начата: старое сохранение стирается, новое — с первого хода
+            self._reset = True
+            self._dirty = False
+        else:
+            self.mark_dirty()
+
+    def poll(self):
+        """Сворачивает изменения за окно в одну запись очереди; без изменений ничего не делает"""
+        if self._reset:
+            self._reset = False
+            self._baseline = None
+            self._queue.put((_RESET, None))
+        if not self._dirty:
+            return
+        self._dirty = False
+        digest = GameState.position_digest()
+        if self._baseline is None or self._since_checkpoint >= self.checkpoint_every:
+            self.seq += 1
+            record = {'version': VERSION, 'scenario': _scenario_name(), 'seq': self.seq, 'hash': digest,
+                      'd': GameState.delta_since()}
+            self._since_checkpoint = 0
+            self._queue.put((_SNAPSHOT, record))
+        else:
+            delta = GameState.delta_since(self._baseline)
+            if not delta:
+                return
+            self.seq += 1
+            record = {'seq': self.seq, 'base': self._baseline_digest, 'hash': digest, 'd': delta}
+            self._since_checkpoint += 1
+            self._queue.put((_DELTA, record))
+        self._baseline = GameState.baseline()
+        self._baseline_digest = digest
+
+    def recover(self) -> bool:
+        """
+        Восстанавливает сохраненную партию в GameState (уже инициализированный, с тем же
+        сценарием). False — сохранения нет, оно от другого сценария или не сошлось; тогда
+        позиция остается начальной.
+        """
+        try:
+            with open(self.snapshot_path, encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if not isinstance(snapshot, dict) or snapshot.get('version') != VERSION \
+                or snapshot.get('scenario') != _scenario_name():
+            return False
+        records = self._read_journal(snapshot)
+        if not self._apply(snapshot, records):
+            # Журнал не сошелся с позицией: откат к одной опорной точке
+            GameState.initialize()
+            records = []
+            if not self._apply(snapshot, records):
+                GameState.initialize()
+                return False
+        self.seq = (records[-1] if records else snapshot)['seq']
+        self._baseline = GameState.baseline()
+        self._baseline_digest = GameState.position_digest()
+        self._since_checkpoint = len(records)
+        return True
+
+    @staticmethod
+    def _apply(snapshot: dict, records: List[dict]) -> bool:
+        try:
+            GameState.apply_delta(snapshot['d'])
+            for record in records:
+                GameState.apply_delta(record['d'])
+        except (KeyError, IndexError, TypeError, ValueError):
+            return False
+        return GameState.position_digest() == (records[-1] if records else snapshot)['hash']
+
+    def _read_journal(self, snapshot: dict) -> List[dict]:
+        """Записи журнала, которые непрерывно продолжают опорную точку"""
+        records = []
+        seq, digest = snapshot['seq'], snapshot['hash']
+        try:
+            with open(self.journal_path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    if record.get('seq', 0) <= seq and not records:
+                        # Хвост журнала до опорной точки: сбой между ее записью и обнулением журнала
+                        continue
+                    if record.get('seq') != seq + 1 or record.get('base') != digest:
+                        break
+                    records.append(record)
+                    seq, digest = record['seq'], record['hash']
+        except OSError:
+            pass
+        return records
+
+    # Поток записи
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except OSError as e:
+                if self.on_error is not None:
+                    self.on_error(e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if batch[-1][0] == _STOP:
+                return
+
+    def _write(self, batch):
+        # Все до последней опорной точки или сброса перекрыто ими и не пишется
+        start = max((i for i, (kind, _) in enumerate(batch) if kind in (_RESET, _SNAPSHOT)), default=-1)
+        if start >= 0:
+            kind, record = batch[start]
+            if kind == _RESET:
+                self._remove()
+            else:
+                self._write_snapshot(record)
+        deltas = [record for kind, record in batch[start + 1:] if kind == _DELTA]
+        if deltas:
+            os.makedirs(self.save_dir, exist_ok=True)
+            with open(self.journal_path, 'ab') as f:
+                f.write(b''.join(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+                                 for record in deltas))
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _write_snapshot(self, record: dict):
+        os.makedirs(self.save_dir, exist_ok=True)
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        _fsync_dir(self.save_dir)
+        with open(self.journal_path, 'wb') as f:
+            os.fsync(f.fileno())
+
+    def _remove(self):
+        for path in (self.snapshot_path, self.journal_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,223 @@
+"""
+Многораундовый бой стеков N на M.
+
+Раунд: обе стороны бросают кубик (1-6), суммы сравниваются как в calculate_battle.
+  - атака больше защиты в 1.5 раза — оборона уничтожена вместе с укреплениями, бой окончен;
+  - атака больше защиты — защитник теряет самый слабый батальон, последний — оборона сломлена;
+  - иначе атакующий теряет самый слабый батальон, последний — атака отбита.
+Если задан max_rounds и раунды кончились, атакующий отходит.
+
+Потери всегда снимают самый слабый батальон, поэтому в бою остаются сильнейшие i атакующих
+и j защитников, и состояние полностью задается парой (i, j).
+"""
+import random
+from dataclasses import dataclass, field
+from enum import IntEnum
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from catalogue import FORT
+from errors import Error, GameError
+
+DICE_FACES = range(1, 7)
+
+
+class BattleEnd(IntEnum):
+    """Конец многораундового боя; текст — i18n.BATTLE_END_TEXTS"""
+    DESTROYED = 0
+    BROKEN = 1
+    REPELLED = 2
+    STALLED = 3
+
+
+ATTACKER_WINS = (BattleEnd.DESTROYED, BattleEnd.BROKEN)
+
+
+class Outcome(IntEnum):
+    """Исход одного сравнения сил, как в calculate_battle; значения хранятся в таблице исходов"""
+    OVERWHELM = 0
+    WIN = 1
+    LOSE = 2
+
+
+OVERWHELM, WIN, LOSE = Outcome
+
+
+def compare(attack_total: int, defence_total: int) -> Outcome:
+    if attack_total > 1.5 * defence_total:
+        return OVERWHELM
+    if attack_total > defence_total:
+        return WIN
+    return LOSE
+
+
+@dataclass
+class BattleDistribution:
+    attackers: int
+    defenders: int
+    # (исход, осталось атакующих, осталось защитников) -> вероятность
+    outcomes: Dict[Tuple[BattleEnd, int, int], float] = field(default_factory=dict)
+
+    def probability(self, *ends: BattleEnd):
+        return sum(p for (end, _, _), p in self.outcomes.items() if end in ends)
+
+    @property
+    def attacker_win_probability(self):
+        return self.probability(*ATTACKER_WINS)
+
+    @property
+    def expected_attacker_losses(self):
+        return sum(p * (self.attackers - left) for (_, left, _), p in self.outcomes.items())
+
+    @property
+    def expected_defender_losses(self):
+        return sum(p * (self.defenders - left) for (_, _, left), p in self.outcomes.items())
+
+
+@lru_cache(maxsize=65536)
+def round_probabilities(attack: int, defence: int, exact: bool = False):
+    """(уничтожена, защитник теряет батальон, атакующий теряет батальон) за один раунд"""
+    counts = [0, 0, 0]
+    for atk_die in DICE_FACES:
+        for def_die in DICE_FACES:
+            counts[compare(attack + atk_die, defence + def_die)] += 1
+    overwhelm, win = counts[OVERWHELM], counts[WIN]
+    total = len(DICE_FACES) ** 2
+    if exact:
+        from fractions import Fraction
+        return Fraction(overwhelm, total), Fraction(win, total), Fraction(total - overwhelm - win, total)
+    return overwhelm / total, win / total, (total - overwhelm - win) / total
+
+
+def _prefix_sums(values: Sequence[int], front_width: Optional[int]) -> List[int]:
+    """sums[i] — сила i сильнейших батальонов (в бою участвуют не больше front_width)"""
+    ordered = sorted(values, reverse=True)
+    sums = [0]
+    for i, value in enumerate(ordered):
+        in_front = front_width is None or i < front_width
+        sums.append(sums[-1] + (value if in_front else 0))
+    return sums
+
+
+@lru_cache(maxsize=1024)
+def _distribution(attack_values: Tuple[int, ...], defence_values: Tuple[int, ...], fixed_defence: int,
+                  max_rounds: Optional[int], front_width: Optional[int], exact: bool) -> BattleDistribution:
+    n, m = len(attack_values), len(defence_values)
+    attack_sums = _prefix_sums(attack_values, front_width)
+    defence_sums = _prefix_sums(defence_values, front_width)
+
+    result = BattleDistribution(n, m)
+    outcomes = result.outcomes
+
+    def settle(key, p):
+        outcomes[key] = outcomes.get(key, 0) + p
+
+    # Вероятностная масса идет вперед от (n, m): за раунд i + j уменьшается ровно на 1
+    if exact:
+        # Точные дроби нужны только для проверок, поэтому fractions грузится по требованию
+        from fractions import Fraction
+        mass = {(n, m): Fraction(1)}
+    else:
+        mass = {(n, m): 1.0}
+    for total in range(n + m, 0, -1):
+        for i in range(min(n, total), 0, -1):
+            j = total - i
+            if j > m or j < 0:
+                continue
+            p = mass.pop((i, j), None)
+            if not p:
+                continue
+
+            rounds_played = (n - i) + (m - j)
+            if max_rounds is not None and rounds_played >= max_rounds:
+                settle((BattleEnd.STALLED, i, j), p)
+                continue
+
+            p_over, p_win, p_lose = round_probabilities(attack_sums[i], defence_sums[j] + fixed_defence, exact)
+
+            if p_over:
+                settle((BattleEnd.DESTROYED, i, 0), p * p_over)
+            if p_win:
+                if j <= 1:
+                    settle((BattleEnd.BROKEN, i, 0), p * p_win)
+                else:
+                    mass[(i, j - 1)] = mass.get((i, j - 1), 0) + p * p_win
+            if p_lose:
+                if i == 1:
+                    settle((BattleEnd.REPELLED, 0, j), p * p_lose)
+                else:
+                    mass[(i - 1, j)] = mass.get((i - 1, j), 0) + p * p_lose
+
+    return result
+
+
+def battle_distribution(attack_values: Sequence[int], defence_values: Sequence[int],
+                        fixed_defence: int = 0, max_rounds: Optional[int] = None,
+                        front_width: Optional[int] = None, exact: bool = False) -> BattleDistribution:
+    """
+    Точное распределение исходов боя.
+    fixed_defence — защита укреплений и местности, она не убывает по ходу боя.
+    """
+    if not attack_values:
+        raise GameError(Error.NO_ATTACKERS)
+    # Порядок батальонов на исход не влияет — сортировка делает кэш общим для перестановок
+    return _distribution(tuple(sorted(attack_values, reverse=True)), tuple(sorted(defence_values, reverse=True)),
+                         fixed_defence, max_rounds, front_width, exact)
+
+
+def resolve_battle(attack_values: Sequence[int], defence_values: Sequence[int],
+                   fixed_defence: int = 0, max_rounds: Optional[int] = None,
+                   front_width: Optional[int] = None, rng=None):
+    """
+    Разыгрывает бой по раундам со случайными кубиками.
+    Возвращает (исход, осталось атакующих, осталось защитников, журнал раундов).
+    """
+    if not attack_values:
+        raise GameError(Error.NO_ATTACKERS)
+    rng = rng or random
+    n, m = len(attack_values), len(defence_values)
+    attack_sums = _prefix_sums(attack_values, front_width)
+    defence_sums = _prefix_sums(defence_values, front_width)
+
+    i, j = n, m
+    log = []
+    while True:
+        if max_rounds is not None and len(log) >= max_rounds:
+            return BattleEnd.STALLED, i, j, log
+
+        a = attack_sums[i] + rng.randint(1, 6)
+        d = defence_sums[j] + fixed_defence + rng.randint(1, 6)
+        log.append((a, d))
+
+        result = compare(a, d)
+        if result == OVERWHELM:
+            return BattleEnd.DESTROYED, i, 0, log
+        if result == WIN:
+            if j <= 1:
+                return BattleEnd.BROKEN, i, 0, log
+            j -= 1
+        else:
+            if i == 1:
+                return BattleEnd.REPELLED, 0, j, log
+            i -= 1
+
+
+def stack_values(side, stack: Dict[int, int], stat: str) -> List[int]:
+    """Раскладывает стек {индекс юнита: количество} в список атак или защит батальонов"""
+    return [getattr(side.units[unit], stat) for unit, count in stack.items() for _ in range(count)]
+
+
+def stack_battle_distribution(attacker, defender, attacker_stack: Dict[int, int], defender_stack: Dict[int, int],
+                              forts: int = 0, terrain_bonus: int = 0, **kwargs) -> BattleDistribution:
+    """battle_distribution для стеков сторон с учетом укреплений и местности"""
+    for unit in attacker_stack:
+        if unit not in range(len(attacker.units)):
+            raise GameError(Error.UNKNOWN_ATTACKER_UNIT, unit=unit)
+    for unit in defender_stack:
+        if unit not in range(len(defender.units)):
+            raise GameError(Error.UNKNOWN_DEFENDER_UNIT, unit=unit)
+
+    fixed_defence = forts * defender.units[FORT].defence + terrain_bonus
+    return battle_distribution(stack_values(attacker, attacker_stack, 'attack'),
+                               stack_values(defender, defender_stack, 'defence'),
+                               fixed_defence, **kwargs)
@@ -1,15 +1,18 @@
+from array import array
+from collections import Counter
 from dataclasses import dataclass, field
 from typing import Dict, List, Tuple, Optional
 import random
-from enum import Enum
 
-
-class GamePhase(Enum):
-    CHOICE = "Выбор"
-    MOVEMENT = "Передвижение"
-    PLACEMENT = "Размещение"
-    ATTACK = "Атака"
-    COMPLETION = "Завершение"
+from battle_engine import OVERWHELM, Outcome, compare, round_probabilities
+from catalogue import (COMBAT_UNITS, FORT, SIDE_COUNT, SIDE_INDEX, SIDE_NAMES, UNIT_COUNT, UNIT_INDEX,
+                       UNIT_NAMES, USSR, opponent)
+from errors import Error, GameError
+from movement import DistanceIndex, Move, apply_moves, validate_moves
+from rules import Action, GamePhase, is_legal, legal_action_set, legal_actions, next_phase
+from terrain import ProvinceModifiers
+from threat_map import ThreatMap
+import zobrist
 
 
 @dataclass
@@ -26,214 +29,710 @@ class UnitType:
 class Province:
     name: str
     terrain: str
-    owner: Optional[str] = None
-    units: Dict[str, int] = field(default_factory=dict)
+    # Сторона-владелец (GERMANY, USSR) и стеки {юнит: число} — индексы, не имена
+    owner: Optional[int] = None
+    units: Dict[int, int] = field(default_factory=dict)
     forts: int = 0
+    # Номер в порядке сценария — индекс провинции в массивах ProvinceModifiers
+    index: int = 0
+
+
+PHASES = tuple(GamePhase)
+PHASE_INDEX = {phase: i for i, phase in enumerate(PHASES)}
+
+# Характеристики по сторонам в порядке UNIT_NAMES: атака, защита, цена, ход, дальность атаки
+UNIT_STATS = (
+    # Германия
+    ((8, 10, 12, 1, 1), (10, 14, 16, 1, 1), (12, 14, 18, 2, 1), (18, 20, 22, 2, 1),
+     (10, 4, 18, 1, 2), (0, 2, 6, 0, 0)),
+    # СССР
+    ((9, 10, 10, 1, 1), (11, 14, 14, 1, 1), (13, 14, 18, 2, 1), (19, 20, 22, 2, 1),
+     (11, 4, 18, 1, 2), (0, 2, 6, 0, 0)),
+)
+MAX_PLACEMENTS = (999, 999, 2, 2, 3, 999)
+MAX_ATTACKERS = 2
+
+# Раскладка буфера стороны: [банк, доступно x UNIT_COUNT, можно разместить x UNIT_COUNT]
+BANK_SLOT = 0
+AVAILABLE_OFFSET = 1
+MAX_PLACEMENTS_OFFSET = 1 + UNIT_COUNT
+BUFFER_SIZE = 1 + 2 * UNIT_COUNT
+
+
+class UnitCounts:
+    """Словарное представление части буфера стороны: {индекс юнита: число}"""
+    __slots__ = ('_side', '_buffer', '_offset')
+
+    def __init__(self, side: 'Side', offset: int):
+        self._side = side
+        self._buffer = side.buffer
+        self._offset = offset
+
+    def _slot(self, unit: int) -> int:
+        # Соседние части буфера — банк и лимиты: чужой индекс не должен читать или писать их
+        if unit not in range(UNIT_COUNT):
+            raise KeyError(unit)
+        return self._offset + unit
+
+    def __getitem__(self, unit: int) -> int:
+        return self._buffer[self._slot(unit)]
+
+    def __setitem__(self, unit: int, value: int):
+        self._side.write(self._slot(unit), value)
+
+    def __contains__(self, unit) -> bool:
+        return unit in range(UNIT_COUNT)
+
+    def __iter__(self):
+        return iter(range(UNIT_COUNT))
+
+    def __len__(self) -> int:
+        return UNIT_COUNT
+
+    def get(self, unit: int) -> int:
+        """Как self[unit]: набор юнитов фиксирован, неизвестный индекс — KeyError, а не default"""
+        return self[unit]
+
+    def keys(self):
+        return range(UNIT_COUNT)
+
+    def values(self):
+        return self._buffer[self._offset:self._offset + UNIT_COUNT].tolist()
+
+    def items(self):
+        return enumerate(self.values())
+
+    def copy(self) -> Dict[int, int]:
+        return dict(self.items())
+
+    def __eq__(self, other):
+        return dict(self.items()) == dict(other.items())
+
+    def __repr__(self):
+        return repr(self.copy())
 
 
-@dataclass
 class Side:
-    name: str
-    units: Dict[str, UnitType] = field(default_factory=dict)
-    available: Dict[str, int] = field(default_factory=dict)
-    bank: int = 0
-    max_placements: Dict[str, int] = field(default_factory=dict)
-    provinces: List[str] = field(default_factory=list)
+    """
+    Сторона. Банк, доступные юниты и лимиты размещения лежат в одном array('i'),
+    поэтому копия состояния для симуляции или отмены — одно копирование буфера.
+    Все записи в буфер идут через write(), который за O(1) обновляет хэш стороны (zobrist).
+    units — типы юнитов стороны по индексам UNIT_NAMES.
+    """
+    __slots__ = ('id', 'units', 'attack', 'defence', 'cost',
+                 'buffer', '_available', '_max_placements', 'provinces', 'hash', '_slot_keys')
+
+    def __init__(self, side_id: int, units: Optional[List[UnitType]] = None,
+                 available: Optional[Dict[int, int]] = None, bank: int = 0,
+                 max_placements: Optional[Dict[int, int]] = None,
+                 provinces: Optional[List[str]] = None):
+        self.id = side_id
+        self.units = units if units is not None else []
+        self.buffer = array('i', [0] * BUFFER_SIZE)
+        # Пустой буфер дает нулевой хэш: нулевые значения ключей не имеют
+        self.hash = 0
+        self._slot_keys = [zobrist.feature('side', side_id, slot) for slot in range(BUFFER_SIZE)]
+        self._available = UnitCounts(self, AVAILABLE_OFFSET)
+        self._max_placements = UnitCounts(self, MAX_PLACEMENTS_OFFSET)
+        self.provinces = provinces if provinces is not None else []
+        self.bank = bank
+        if available:
+            self.available = available
+        if max_placements:
+            self.max_placements = max_placements
+        self.refresh_stats()
 
-    def add_units(self, unit_name: str, count: int):
-        self.available[unit_name] = self.available.get(unit_name, 0) + count
+    @property
+    def name(self) -> str:
+        """Имя стороны для сериализации"""
+        return SIDE_NAMES[self.id]
+
+    def refresh_stats(self):
+        """Пересобирает массивы характеристик по индексам юнитов после изменения units"""
+        units = list(self.units) + [None] * (UNIT_COUNT - len(self.units))
+        self.attack = array('i', [u.attack if u else 0 for u in units])
+        self.defence = array('i', [u.defence if u else 0 for u in units])
+        self.cost = array('i', [u.cost if u else 0 for u in units])
+
+    @property
+    def bank(self) -> int:
+        return self.buffer[BANK_SLOT]
+
+    @bank.setter
+    def bank(self, value: int):
+        self.write(BANK_SLOT, value)
+
+    def write(self, slot: int, value: int):
+        base = self._slot_keys[slot]
+        self.hash ^= zobrist.key(base, self.buffer[slot]) ^ zobrist.key(base, value)
+        self.buffer[slot] = value
+
+    def _rehash(self):
+        self.hash = 0
+        for slot, value in enumerate(self.buffer):
+            self.hash ^= zobrist.key(self._slot_keys[slot], value)
+
+    @property
+    def available(self) -> UnitCounts:
+        return self._available
+
+    @available.setter
+    def available(self, counts: Dict[int, int]):
+        self._fill(AVAILABLE_OFFSET, counts)
+
+    @property
+    def max_placements(self) -> UnitCounts:
+        return self._max_placements
+
+    @max_placements.setter
+    def max_placements(self, counts: Dict[int, int]):
+        self._fill(MAX_PLACEMENTS_OFFSET, counts)
+
+    def _fill(self, offset: int, counts: Dict[int, int]):
+        for i in range(UNIT_COUNT):
+            self.write(offset + i, 0)
+        for unit, count in counts.items():
+            self.write(offset + unit, count)
+
+    def add_units(self, unit: int, count: int):
+        slot = AVAILABLE_OFFSET + unit
+        self.write(slot, self.buffer[slot] + count)
+
+    def order_cost(self, order: Dict[int, int]) -> int:
+        return sum(self.cost[unit] * count for unit, count in order.items() if unit in range(UNIT_COUNT))
+
+    def validate_order(self, order: Dict[int, int]) -> List[Tuple[Optional[int], GameError]]:
+        """
+        Проверяет заказ {юнит: количество} целиком за один проход.
+        Возвращает список (юнит, ошибка); юнит None — ошибка по заказу в целом.
+        """
+        errors = []
+        buf = self.buffer
+        total = 0
+        for unit, count in order.items():
+            if unit not in range(len(self.units)):
+                errors.append((unit, GameError(Error.UNKNOWN_UNIT, unit=unit)))
+                continue
+            if count < 0:
+                errors.append((unit, GameError(Error.NEGATIVE_COUNT, unit=unit)))
+                continue
+            limit = buf[MAX_PLACEMENTS_OFFSET + unit]
+            if count > limit:
+                errors.append((unit, GameError(Error.PLACEMENT_LIMIT, unit=unit, limit=limit)))
+            total += self.cost[unit] * count
+
+        if total > buf[BANK_SLOT]:
+            errors.append((None, GameError(Error.NOT_ENOUGH_BANK, total=total, bank=buf[BANK_SLOT])))
+        return errors
+
+    def buy_units(self, order: Dict[int, int]) -> List[Tuple[Optional[int], GameError]]:
+        """Покупает весь заказ разом; при любой ошибке ничего не меняется"""
+        errors = self.validate_order(order)
+        if errors:
+            return errors
+
+        buf = self.buffer
+        for unit, count in order.items():
+            self.write(BANK_SLOT, buf[BANK_SLOT] - self.cost[unit] * count)
+            self.write(AVAILABLE_OFFSET + unit, buf[AVAILABLE_OFFSET + unit] + count)
+            self.write(MAX_PLACEMENTS_OFFSET + unit, buf[MAX_PLACEMENTS_OFFSET + unit] - count)
+        return []
+
+    def snapshot(self) -> array:
+        return self.buffer[:]
+
+    def restore(self, snapshot: array):
+        self.buffer[:] = snapshot
+        self._rehash()
+
+    def __repr__(self):
+        return (f"Side(name={self.name!r}, bank={self.bank}, available={self.available!r}, "
+                f"max_placements={self.max_placements!r}, provinces={self.provinces!r})")
 
 
 class GameState:
-    _sides = {}
-    _current_player = 'СССР'
+    # Стороны по индексам SIDE_NAMES
+    _sides: List[Side] = []
+    _current_player = USSR
     _current_phase = GamePhase.CHOICE
     _current_dice = 0
     _provinces = {}
     _game_map = {}
-    _selected_starting_sets = {'Германия': 0, 'СССР': 0}
+    _distance_index = None
+    _threat_maps: List[ThreatMap] = []
+    _modifiers = None
+    # Хэши провинций и их XOR — часть хэша позиции, обновляется в _provinces_changed
+    _province_hashes = {}
+    _provinces_hash = 0
+    _listeners = []
+    _selected_starting_sets = [0] * SIDE_COUNT
+    # Карта и стартовые наборы; None — сценарий по умолчанию (scenarios/default.json)
+    _scenario = None
+    # Наборы сценария по сторонам, юниты в них — {индекс юнита: число}
+    _starting_sets: List[List[dict]] = []
+    # Кубик; GameState.seed() делает партию воспроизводимой
+    _rng = random.Random()
 
     @classmethod
-    def initialize(cls):
-        # Германия
-        germany_units = [
-            ('Л. Пехота', 8, 10, 12, 1, 1),
-            ('Т. Пехота', 10, 14, 16, 1, 1),
-            ('Л. Танк', 12, 14, 18, 2, 1),
-            ('Т. Танк', 18, 20, 22, 2, 1),
-            ('Арта', 10, 4, 18, 1, 2),
-            ('Укреп', 0, 2, 6, 0, 0),
-        ]
-
-        # СССР
-        ussr_units = [
-            ('Л. Пехота', 9, 10, 10, 1, 1),
-            ('Т. Пехота', 11, 14, 14, 1, 1),
-            ('Л. Танк', 13, 14, 18, 2, 1),
-            ('Т. Танк', 19, 20, 22, 2, 1),
-            ('Арта', 11, 4, 18, 1, 2),
-            ('Укреп', 0, 2, 6, 0, 0),
-        ]
-
-        germany = Side('Германия')
-        ussr = Side('СССР')
-
-        for n, a, d, c, m, ar in germany_units:
-            germany.units[n] = UnitType(n, a, d, c, m, ar)
-            germany.available[n] = 0
-
-        for n, a, d, c, m, ar in ussr_units:
-            ussr.units[n] = UnitType(n, a, d, c, m, ar)
-            ussr.available[n] = 0
-
-        max_placements_data = {
-            'Л. Пехота': 999,
-            'Т. Пехота': 999,
-            'Л. Танк': 2,
-            'Т. Танк': 2,
-            'Арта': 3,
-            'Укреп': 999,
-        }
-
-        germany.max_placements = max_placements_data.copy()
-        ussr.max_placements = max_placements_data.copy()
+    def seed(cls, value=None):
+        cls._rng = random.Random(value)
 
-        cls._sides['Германия'] = germany
-        cls._sides['СССР'] = ussr
-
-        # Стартовые наборы
-        cls._germany_starting_sets = [
-            {'name': 'Всех под ружьё', 'units': {'Л. Пехота': 5, 'Т. Пехота': 2, 'Арта': 1, 'Укреп': 3}},
-            {'name': 'Стандарт', 'units': {'Л. Пехота': 4, 'Т. Пехота': 1, 'Л. Танк': 1, 'Арта': 1, 'Укреп': 3}},
-            {'name': 'Кошки', 'units': {'Л. Пехота': 3, 'Л. Танк': 2, 'Т. Танк': 1}},
-            {'name': 'Ба-бах', 'units': {'Л. Пехота': 5, 'Арта': 2, 'Укреп': 2}},
-        ]
+    @classmethod
+    def use_scenario(cls, scenario):
+        """Начинает новую партию на карте сценария (scenario.Scenario)"""
+        cls._scenario = scenario
+        cls.initialize()
 
-        cls._ussr_starting_sets = [
-            {'name': 'РОДИНА-МАТЬ ЗОВЕТ!', 'units': {'Л. Пехота': 5, 'Т. Пехота': 3, 'Арта': 1, 'Укреп': 3}},
-            {'name': 'Стандарт', 'units': {'Л. Пехота': 4, 'Т. Пехота': 1, 'Т. Танк': 1, 'Арта': 1, 'Укреп': 3}},
-            {'name': 'Танкоград', 'units': {'Л. Пехота': 4, 'Л. Танк': 1, 'Т. Танк': 2, 'Укреп': 1}},
-            {'name': 'Столкнем гада!', 'units': {'Л. Пехота': 4, 'Т. Пехота': 1, 'Арта': 2, 'Укреп': 3}},
-        ]
+    @classmethod
+    def initialize(cls):
+        cls._sides = [Side(side, units, max_placements=dict(enumerate(MAX_PLACEMENTS)))
+                      for side, units in enumerate(get_all_unit_types())]
+
+        if cls._scenario is None:
+            import scenario
+            cls._scenario = scenario.load()
+        # Имена сторон и юнитов из сценария переводятся в индексы один раз, здесь
+        cls._starting_sets = [[{'name': s['name'], 'units': {UNIT_INDEX[name]: count
+                                                             for name, count in s['units'].items()}}
+                               for s in cls._scenario.starting_sets[side_name]]
+                              for side_name in SIDE_NAMES]
 
         cls._initialize_map()
-        cls._current_player = 'СССР'
+        cls._current_player = USSR
         cls._current_phase = GamePhase.CHOICE
         cls._current_dice = 0
+        cls._emit('new_game')
 
     @classmethod
-    def set_starting_set(cls, side: str, set_index: int):
-        cls._selected_starting_sets[side] = set_index
+    def ensure_initialized(cls):
+        """Данные игры для инструментов, которым не нужна начатая партия"""
+        if not cls._sides:
+            cls.initialize()
 
-        if side == 'Германия':
-            sets = cls._germany_starting_sets
-        else:
-            sets = cls._ussr_starting_sets
+    @classmethod
+    def add_listener(cls, listener):
+        """listener(event, data) вызывается после каждого изменения состояния игры"""
+        if listener not in cls._listeners:
+            cls._listeners.append(listener)
+
+    @classmethod
+    def remove_listener(cls, listener):
+        if listener in cls._listeners:
+            cls._listeners.remove(listener)
+
+    @classmethod
+    def _emit(cls, event: str, **data):
+        for listener in list(cls._listeners):
+            listener(event, data)
+
+    @classmethod
+    def set_starting_set(cls, side: int, set_index: int):
+        cls._selected_starting_sets[side] = set_index
+        sets = cls.get_starting_sets(side)
 
         if 0 <= set_index < len(sets):
             selected_set = sets[set_index]
             side_obj = cls._sides[side]
 
-            for unit_name in side_obj.available.keys():
-                side_obj.available[unit_name] = 0
+            for unit in side_obj.available.keys():
+                side_obj.available[unit] = 0
+
+            for province_name in side_obj.provinces:
+                province = cls._provinces[province_name]
+                province.units.clear()
+                province.forts = 0
+            cls._provinces_changed(side_obj.provinces)
 
-            for unit_name, count in selected_set['units'].items():
-                side_obj.available[unit_name] = count
+            for unit, count in selected_set['units'].items():
+                side_obj.available[unit] = count
+                cls.deploy_units(side, unit, count)
+            cls._emit('starting_set', side=side, index=set_index, name=selected_set['name'])
 
     @classmethod
-    def get_starting_sets(cls, side: str):
-        if side == 'Германия':
-            return cls._germany_starting_sets
-        else:
-            return cls._ussr_starting_sets
+    def get_starting_sets(cls, side: int):
+        return cls._starting_sets[side]
 
     @classmethod
     def _initialize_map(cls):
-        provinces = [
-            Province('Москва', 'город', 'СССР'),
-            Province('Смоленск', 'равнина', 'СССР'),
-            Province('Киев', 'город', 'СССР'),
-            Province('Берлин', 'город', 'Германия'),
-            Province('Варшава', 'город', 'Германия'),
-            Province('Прага', 'равнина', 'Германия'),
-        ]
-
-        for province in provinces:
-            cls._provinces[province.name] = province
-
-        cls._game_map = {
-            'Москва': ['Смоленск'],
-            'Смоленск': ['Москва', 'Киев', 'Варшава'],
-            'Киев': ['Смоленск', 'Варшава'],
-            'Варшава': ['Смоленск', 'Киев', 'Берлин', 'Прага'],
-            'Берлин': ['Варшава', 'Прага'],
-            'Прага': ['Варшава', 'Берлин'],
+        cls._provinces = {}
+        for name, terrain, owner_name in cls._scenario.provinces:
+            owner = None if owner_name is None else SIDE_INDEX[owner_name]
+            cls._provinces[name] = Province(name, terrain, owner, index=len(cls._provinces))
+            if owner is not None:
+                cls._sides[owner].provinces.append(name)
+        cls._game_map = cls._scenario.adjacency
+
+        # Радиус индекса — наибольшая дальность хода или атаки среди всех юнитов
+        radius = max(max(u.movement_range, u.attack_range)
+                     for side in cls._sides for u in side.units)
+        cls._distance_index = DistanceIndex(cls._game_map, radius)
+
+        cls._modifiers = ProvinceModifiers(cls._provinces)
+        cls._province_hashes = {}
+        cls._provinces_hash = 0
+        cls._rehash_provinces(cls._provinces)
+        cls._threat_maps = [ThreatMap(side.id, cls._sides, cls._provinces, cls._distance_index,
+                                      cls._modifiers.terrain_bonus)
+                            for side in cls._sides]
+
+    @classmethod
+    def terrain_bonus(cls, province_name: str) -> int:
+        return cls._modifiers.terrain_bonus[cls._provinces[province_name].index]
+
+    @classmethod
+    def get_province_modifiers(cls) -> ProvinceModifiers:
+        return cls._modifiers
+
+    @classmethod
+    def get_threat_map(cls, side: Optional[int] = None) -> ThreatMap:
+        return cls._threat_maps[cls._current_player if side is None else side]
+
+    @classmethod
+    def _provinces_changed(cls, province_names):
+        province_names = list(province_names)
+        for name in province_names:
+            cls._modifiers.refresh(name)
+        cls._rehash_provinces(province_names)
+        for threat_map in cls._threat_maps:
+            threat_map.invalidate(province_names)
+
+    @classmethod
+    def _rehash_provinces(cls, province_names):
+        for name in province_names:
+            new = zobrist.province_hash(cls._provinces[name])
+            cls._provinces_hash ^= cls._province_hashes.get(name, 0) ^ new
+            cls._province_hashes[name] = new
+
+    @classmethod
+    def position_hash(cls) -> int:
+        """
+        64-битный хэш всей позиции: буферы сторон, провинции, фаза, кубик, чей ход.
+        Части поддерживаются при каждом изменении, поэтому вызов — O(1).
+        """
+        h = cls._provinces_hash ^ zobrist.turn_hash(PHASE_INDEX[cls._current_phase], cls._current_dice,
+                                                    cls._current_player)
+        for side in cls._sides:
+            h ^= side.hash
+        return h
+
+    @classmethod
+    def position_digest(cls) -> str:
+        return zobrist.digest(cls.position_hash())
+
+    @classmethod
+    def baseline(cls) -> dict:
+        """Опорная точка для delta_since: копии буферов сторон, хэши провинций и ход"""
+        return {
+            'sides': {side.id: (side.snapshot(), tuple(side.provinces)) for side in cls._sides},
+            'provinces': dict(cls._province_hashes),
+            'turn': (PHASE_INDEX[cls._current_phase], cls._current_dice, cls._current_player),
         }
 
+    @classmethod
+    def delta_since(cls, baseline: Optional[dict] = None) -> dict:
+        """
+        Изменения позиции с опорной точки в виде, пригодном для JSON; без опоры — вся позиция.
+        Измененные провинции находятся сравнением их хэшей, стороны — по ячейкам буфера.
+        Стороны и юниты в дельте записаны именами: формат не зависит от порядка индексов.
+        """
+        baseline = baseline or {'sides': {}, 'provinces': {}, 'turn': None}
+        delta = {}
+        sides = {}
+        for side in cls._sides:
+            old_buffer, old_provinces = baseline['sides'].get(side.id, (None, None))
+            changes = {}
+            slots = [[slot, value] for slot, value in enumerate(side.buffer)
+                     if old_buffer is None or old_buffer[slot] != value]
+            if slots:
+                changes['b'] = slots
+            if old_provinces is None or tuple(side.provinces) != old_provinces:
+                changes['p'] = list(side.provinces)
+            if changes:
+                sides[side.name] = changes
+        if sides:
+            delta['s'] = sides
+
+        old_hashes = baseline['provinces']
+        provinces = {}
+        for name, province_hash in cls._province_hashes.items():
+            if old_hashes.get(name) != province_hash:
+                province = cls._provinces[name]
+                owner = None if province.owner is None else SIDE_NAMES[province.owner]
+                units = {UNIT_NAMES[unit]: count for unit, count in province.units.items()}
+                provinces[name] = [owner, province.forts, units]
+        if provinces:
+            delta['p'] = provinces
+
+        turn = (PHASE_INDEX[cls._current_phase], cls._current_dice, cls._current_player)
+        if turn != baseline['turn']:
+            delta['t'] = [turn[0], turn[1], SIDE_NAMES[turn[2]]]
+        return delta
+
+    @classmethod
+    def apply_delta(cls, delta: dict):
+        """Применяет результат delta_since, полученный с другого устройства или из сохранения"""
+        for name, changes in delta.get('s', {}).items():
+            side = cls._sides[SIDE_INDEX[name]]
+            for slot, value in changes.get('b', ()):
+                side.write(slot, value)
+            if 'p' in changes:
+                side.provinces[:] = changes['p']
+
+        provinces = delta.get('p', {})
+        for name, (owner, forts, units) in provinces.items():
+            province = cls._provinces[name]
+            province.owner = None if owner is None else SIDE_INDEX[owner]
+            province.forts = forts
+            province.units.clear()
+            province.units.update((UNIT_INDEX[unit_name], count) for unit_name, count in units.items())
+        if provinces:
+            cls._provinces_changed(provinces)
+
+        if 't' in delta:
+            phase_index, dice, player = delta['t']
+            cls._current_phase = PHASES[phase_index]
+            cls._current_dice = dice
+            cls._current_player = SIDE_INDEX[player]
+
+    @classmethod
+    def get_capital(cls, side: int) -> Optional[str]:
+        provinces = cls._sides[side].provinces
+        return provinces[0] if provinces else None
+
+    @classmethod
+    def deploy_units(cls, side: int, unit: int, count: int, province_name: Optional[str] = None):
+        """Выставляет юниты на карту (по умолчанию — в столицу стороны)"""
+        province_name = province_name or cls.get_capital(side)
+        if province_name is None or count <= 0:
+            return
+        province = cls._provinces[province_name]
+        if unit == FORT:
+            province.forts += count
+        else:
+            province.units[unit] = province.units.get(unit, 0) + count
+        cls._provinces_changed([province_name])
+
+    @classmethod
+    def purchase_units(cls, side: int, order: Dict[int, int]) -> List[Tuple[Optional[int], GameError]]:
+        """Покупка заказа стороной с выставлением купленного в столицу"""
+        order = {unit: count for unit, count in order.items() if count}
+        errors = cls._sides[side].buy_units(order)
+        if not errors:
+            for unit, count in order.items():
+                cls.deploy_units(side, unit, count)
+            cls._emit('purchase', side=side, order=order)
+        return errors
+
+    @classmethod
+    def place_units(cls, order: Dict[int, int]) -> List[Tuple[Optional[int], GameError]]:
+        """Размещение в свой ход: покупка заказа и переход к атаке; пустой заказ — отказ от размещения"""
+        if not cls.is_legal(Action.PLACE):
+            return [(None, GameError(Error.NOT_PLACEMENT_PHASE))]
+        errors = cls.purchase_units(cls._current_player, order)
+        if not errors:
+            cls._advance(Action.PLACE)
+        return errors
+
     @classmethod
     def get_current_side(cls):
         return cls._sides[cls._current_player]
 
     @classmethod
     def get_enemy_side(cls):
-        return cls._sides['Германия' if cls._current_player == 'СССР' else 'СССР']
+        return cls._sides[opponent(cls._current_player)]
+
+    @classmethod
+    def get_current_phase(cls):
+        return cls._current_phase
+
+    @classmethod
+    def get_current_dice(cls):
+        return cls._current_dice
+
+    @classmethod
+    def legal_actions(cls):
+        """Действия, разрешенные сейчас, в порядке таблицы rules.TRANSITIONS"""
+        return legal_actions(cls._current_phase, cls._current_dice > 0)
+
+    @classmethod
+    def legal_action_set(cls):
+        return legal_action_set(cls._current_phase, cls._current_dice > 0)
+
+    @classmethod
+    def is_legal(cls, action: Action) -> bool:
+        return is_legal(cls._current_phase, cls._current_dice > 0, action)
+
+    @classmethod
+    def _advance(cls, action: Action):
+        """Переход по таблице правил; слушатели узнают о каждом действии, даже без смены фазы"""
+        cls._current_phase = next_phase(cls._current_phase, action)
+        cls._emit('action', side=cls._current_player, action=action.name)
 
     @classmethod
     def roll_dice(cls):
-        if cls._current_phase == GamePhase.CHOICE:
-            cls._current_dice = random.randint(1, 6)
+        if cls.is_legal(Action.ROLL):
+            cls._current_dice = cls._rng.randint(1, 6)
+            cls._advance(Action.ROLL)
             return cls._current_dice
         return 0
 
     @classmethod
     def choose_attack(cls):
-        if cls._current_phase == GamePhase.CHOICE and cls._current_dice > 0:
-            cls._current_phase = GamePhase.MOVEMENT
+        if cls.is_legal(Action.CHOOSE_ATTACK):
+            cls._advance(Action.CHOOSE_ATTACK)
+            cls._emit('attack_choice', side=cls._current_player, die=cls._current_dice)
             return True
         return False
 
+    @classmethod
+    def add_resources(cls, side: int, amount: int):
+        """Ресурсы вне хода (магазин): тоже событие, чтобы их видели синхронизация и автосохранение"""
+        cls._sides[side].bank += amount
+        cls._emit('resources', side=side, amount=amount)
+
     @classmethod
     def choose_bank(cls):
-        if cls._current_phase == GamePhase.CHOICE and cls._current_dice > 0:
-            cls.get_current_side().bank += cls._current_dice
+        if cls.is_legal(Action.CHOOSE_BANK):
+            amount = cls._current_dice
+            cls.get_current_side().bank += amount
             cls._current_dice = 0
-            cls._current_phase = GamePhase.MOVEMENT
+            cls._advance(Action.CHOOSE_BANK)
+            cls._emit('bank', side=cls._current_player, amount=amount)
             return True
         return False
 
     @classmethod
-    def move_unit(cls, unit_name: str, to_province: str):
-        if cls._current_phase == GamePhase.MOVEMENT:
-            cls._current_phase = GamePhase.PLACEMENT
+    def reachable_provinces(cls, unit: int, from_province: str) -> List[str]:
+        """Куда юнит текущей стороны может пойти из провинции за один ход"""
+        side = cls.get_current_side()
+        if unit not in range(len(side.units)) or side.units[unit].movement_range <= 0:
+            return []
+        result = []
+        for name in cls._distance_index.within(from_province, side.units[unit].movement_range):
+            move = Move(unit, from_province, name)
+            if not validate_moves(side.id, [move], cls._provinces, side.units, cls._distance_index):
+                result.append(name)
+        return result
+
+    @classmethod
+    def move_units(cls, moves: List[Move]) -> List[Tuple[int, GameError]]:
+        """
+        Выполняет пакет ходов одной транзакцией: либо все ходы, либо ни одного.
+        Возвращает список ошибок (номер хода, GameError); пустой список — успех.
+        Пустой пакет означает отказ от передвижения.
+        """
+        if not cls.is_legal(Action.MOVE):
+            return [(i, GameError(Error.NOT_MOVEMENT_PHASE)) for i in range(max(1, len(moves)))]
+
+        side = cls.get_current_side()
+        errors = validate_moves(side.id, moves, cls._provinces, side.units, cls._distance_index)
+        if errors:
+            return errors
+
+        apply_moves(side, moves, cls._provinces)
+        cls._provinces_changed({name for move in moves for name in (move.from_province, move.to_province)})
+        cls._advance(Action.MOVE)
+        cls._emit('move', side=side.id, moves=len(moves))
+        return []
+
+    @classmethod
+    def move_unit(cls, unit: int, to_province: str, from_province: Optional[str] = None,
+                  count: int = 1):
+        if not cls.is_legal(Action.MOVE):
+            return False
+
+        if from_province is None:
+            # Берем ближайший стек этого юнита, из которого цель достижима
+            side = cls.get_current_side()
+            candidates = [name for name in side.provinces
+                          if cls._provinces[name].units.get(unit, 0) >= count
+                          and to_province in cls.reachable_provinces(unit, name)]
+            if not candidates:
+                return False
+            from_province = min(candidates,
+                                key=lambda name: cls._distance_index.distance(name, to_province))
+
+        return not cls.move_units([Move(unit, from_province, to_province, count)])
+
+    @classmethod
+    def attack_province(cls, target_name: str, attacker_units: List[int]):
+        """Атака вражеской провинции: защитники, укрепления и местность берутся из нее"""
+        if not cls.is_legal(Action.ATTACK):
+            raise GameError(Error.NOT_ATTACK_PHASE if cls._current_phase != GamePhase.ATTACK
+                            else Error.DICE_BANKED)
+
+        threat = cls.get_threat_map().get(target_name)
+        if threat is None:
+            raise GameError(Error.OUT_OF_REACH, province=target_name)
+
+        # Каждый выбранный батальон должен быть отдельным батальоном в досягаемости
+        reachable = cls.get_threat_map().attacker_counts(target_name)
+        for unit, count in Counter(attacker_units).items():
+            if unit not in reachable:
+                raise GameError(Error.UNIT_OUT_OF_REACH, unit=unit, province=target_name)
+            if count > reachable[unit]:
+                raise GameError(Error.REACH_LIMIT, unit=unit, province=target_name, count=reachable[unit])
+
+        target = cls._provinces[target_name]
+        forts, terrain_bonus = cls._modifiers.battle_modifiers(target_name)
+        report = calculate_battle(
+            attacker=cls.get_current_side(),
+            defender=cls._sides[target.owner],
+            attacker_units=attacker_units,
+            defender_units=threat.defenders,
+            atk_die=cls._current_dice,
+            def_die=0,
+            forts=forts,
+            terrain_bonus=terrain_bonus,
+            consume=True
+        )
+
+        defender = target.owner
+        forts_destroyed = target.forts if report.defence_destroyed else 0
+        if report.defence_destroyed:
+            # Оборона уничтожена целиком вместе с укреплениями, провинция переходит атакующему
+            target.units.clear()
+            target.forts = 0
+            target.owner = cls._current_player
+            cls._sides[defender].provinces.remove(target_name)
+            cls.get_current_side().provinces.append(target_name)
+            cls._provinces_changed([target_name])
+
+        cls._advance(Action.ATTACK)
+        cls._emit('battle', attacker=cls._current_player, defender=defender, province=target_name,
+                  outcome=report.outcome, units_lost=report.units_lost, forts_lost=forts_destroyed)
+
+        winner = cls.get_winner()
+        if winner is not None:
+            cls._emit('game_over', winner=winner)
+        return report
+
+    @classmethod
+    def get_winner(cls) -> Optional[int]:
+        """Побеждает сторона, у противника которой не осталось боевых юнитов"""
+        for side in cls._sides:
+            if not any(side.available[unit] for unit in COMBAT_UNITS):
+                return opponent(side.id)
+        return None
+
+    @classmethod
+    def skip_attack(cls):
+        if cls.is_legal(Action.SKIP_ATTACK):
+            cls._advance(Action.SKIP_ATTACK)
             return True
         return False
 
     @classmethod
     def end_turn(cls):
-        if cls._current_phase == GamePhase.COMPLETION:
-            cls._current_player = 'Германия' if cls._current_player == 'СССР' else 'СССР'
-            cls._current_phase = GamePhase.CHOICE
+        if cls.is_legal(Action.END_TURN):
+            side = cls.get_current_side()
+            cls._emit('end_turn', side=side.id, bank=side.bank)
+            cls._current_player = opponent(cls._current_player)
             cls._current_dice = 0
+            cls._advance(Action.END_TURN)
             return True
         return False
 
-    @classmethod
-    def get_full_status(cls):
-        lines = []
-        for name, side in cls._sides.items():
-            lines.append(f"=== {name} ===")
-            lines.append(f"Ресурсы: {side.bank}")
-            for unit_name, count in side.available.items():
-                if count > 0:
-                    max_place = side.max_placements.get(unit_name, 0)
-                    lines.append(f"  {unit_name}: {count} (можно разместить: {max_place})")
-
-        lines.append('')
-        lines.append('')
-        lines.append('')
-
-        return lines
-
     @property
     def current_player(self):
         return self._current_player
@@ -248,144 +747,164 @@ class GameState:
 
 
 # НЕЗАВИСИМЫЕ ФУНКЦИИ ДЛЯ КАЛЬКУЛЯТОРА БОЯ
-def get_all_unit_types():
-    """Возвращает все типы юнитов для независимого калькулятора"""
-    return {
-        'Германия': {
-            'Л. Пехота': UnitType('Л. Пехота', 8, 10, 12, 1, 1),
-            'Т. Пехота': UnitType('Т. Пехота', 10, 14, 16, 1, 1),
-            'Л. Танк': UnitType('Л. Танк', 12, 14, 18, 2, 1),
-            'Т. Танк': UnitType('Т. Танк', 18, 20, 22, 2, 1),
-            'Арта': UnitType('Арта', 10, 4, 18, 1, 2),
-            'Укреп': UnitType('Укреп', 0, 2, 6, 0, 0),
-        },
-        'СССР': {
-            'Л. Пехота': UnitType('Л. Пехота', 9, 10, 10, 1, 1),
-            'Т. Пехота': UnitType('Т. Пехота', 11, 14, 14, 1, 1),
-            'Л. Танк': UnitType('Л. Танк', 13, 14, 18, 2, 1),
-            'Т. Танк': UnitType('Т. Танк', 19, 20, 22, 2, 1),
-            'Арта': UnitType('Арта', 11, 4, 18, 1, 2),
-            'Укреп': UnitType('Укреп', 0, 2, 6, 0, 0),
-        }
-    }
+def get_all_unit_types() -> List[List[UnitType]]:
+    """Все типы юнитов [сторона][юнит] для независимого калькулятора; каждый вызов — новые объекты"""
+    return [[UnitType(UNIT_NAMES[unit], *stats) for unit, stats in enumerate(side_stats)]
+            for side_stats in UNIT_STATS]
+
+
+@dataclass(slots=True)
+class BattleReport:
+    """
+    Итог одного боя: исход, суммы сил и потери обороны числами. Строк здесь нет —
+    текст собирает UI, а пакетные расчеты складывают отчеты без разбора строк.
+    """
+    outcome: Outcome
+    attack_total: int
+    defence_total: int
+    # {индекс юнита: потеряно батальонов}, укрепления отдельно в forts_lost
+    casualties: Dict[int, int] = field(default_factory=dict)
+    forts_lost: int = 0
+
+    @property
+    def units_lost(self) -> int:
+        return sum(self.casualties.values())
+
+    @property
+    def defence_destroyed(self) -> bool:
+        # Подавляющая атака берет провинцию, даже если оборонять ее было некому
+        return self.outcome is OVERWHELM
+
+
+def _count(units: List[int]) -> Dict[int, int]:
+    counts = {}
+    for unit in units:
+        counts[unit] = counts.get(unit, 0) + 1
+    return counts
+
+
+def _check_units(units: List[int], error: Error):
+    for unit in units:
+        if unit not in range(UNIT_COUNT):
+            raise GameError(error, unit=unit)
 
 
-def independent_battle_calculation(attacker_side: str, defender_side: str,
-                                   attacker_units: List[str], defender_units: List[str],
+def independent_battle_calculation(attacker_side: int, defender_side: int,
+                                   attacker_units: List[int], defender_units: List[int],
                                    atk_die: int = 0, def_die: int = 0,
-                                   forts: int = 0, terrain_bonus: int = 0) -> Tuple[str, int, int, List[str]]:
+                                   forts: int = 0, terrain_bonus: int = 0) -> BattleReport:
     """
     Независимый расчет боя, не зависящий от состояния игры
     """
     if not attacker_units:
-        raise ValueError('Нужно выбрать хотя бы один атакующий батальон')
+        raise GameError(Error.NO_ATTACKERS)
 
-    if len(attacker_units) > 2:
-        raise ValueError('Максимум 2 атакующих батальона')
+    if len(attacker_units) > MAX_ATTACKERS:
+        raise GameError(Error.TOO_MANY_ATTACKERS, limit=MAX_ATTACKERS)
 
-    # Получаем характеристики юнитов
-    all_units = get_all_unit_types()
+    if attacker_side not in range(SIDE_COUNT) or defender_side not in range(SIDE_COUNT):
+        raise GameError(Error.UNKNOWN_SIDE)
 
-    if attacker_side not in all_units or defender_side not in all_units:
-        raise ValueError('Неверно указана сторона')
+    # Проверяем, что все указанные юниты существуют
+    _check_units(attacker_units, Error.UNKNOWN_ATTACKER_UNIT)
+    _check_units(defender_units, Error.UNKNOWN_DEFENDER_UNIT)
 
+    # Получаем характеристики юнитов
+    all_units = get_all_unit_types()
     attacker_units_data = all_units[attacker_side]
     defender_units_data = all_units[defender_side]
 
-    # Проверяем, что все указанные юниты существуют
-    for unit in attacker_units:
-        if unit not in attacker_units_data:
-            raise ValueError(f'Неизвестный атакующий юнит: {unit}')
-
-    for unit in defender_units:
-        if unit not in defender_units_data:
-            raise ValueError(f'Неизвестный защищающийся юнит: {unit}')
-
     # Расчет сил (без проверки доступности)
-    attack_total = sum(attacker_units_data[n].attack for n in attacker_units) + atk_die
-    defence_total = (sum(defender_units_data[n].defence for n in defender_units) +
+    attack_total = sum(attacker_units_data[u].attack for u in attacker_units) + atk_die
+    defence_total = (sum(defender_units_data[u].defence for u in defender_units) +
                      def_die +
-                     forts * defender_units_data['Укреп'].defence +
+                     forts * defender_units_data[FORT].defence +
                      terrain_bonus)
 
-    killed = []
-    outcome = ""
-
-    if attack_total > 1.5 * defence_total:
-        outcome = 'Атака подавляющая — оборона уничтожена.'
+    result = compare(attack_total, defence_total)
+    if result is OVERWHELM:
         # В независимом расчете просто указываем, что было бы уничтожено
-        killed = defender_units.copy()
-        if forts > 0:
-            killed.append(f'Укреп x{forts}')
-    elif attack_total > defence_total:
-        outcome = 'Атака успешна — оборона отступает.'
-    else:
-        outcome = 'Атака отбита.'
+        return BattleReport(result, attack_total, defence_total, _count(defender_units), max(0, forts))
+    return BattleReport(result, attack_total, defence_total)
+
+
+def independent_win_probability(attacker_side: int, defender_side: int,
+                                attacker_units: List[int], defender_units: List[int],
+                                forts: int = 0, terrain_bonus: int = 0) -> Tuple[float, float]:
+    """(подавляющая атака, успешная атака) при случайных кубиках d6 у обеих сторон"""
+    # Таблица индексируется составами до расчета сумм; вне ее — считаем по каталогу
+    from matchup_table import get_table
+    table = get_table()
+    if table is not None:
+        odds = table.dice_odds(attacker_side, defender_side, attacker_units, defender_units, forts, terrain_bonus)
+        if odds is not None:
+            return odds[0] / 36, odds[1] / 36
 
-    return outcome, attack_total, defence_total, killed
+    all_units = get_all_unit_types()
+    attack = sum(all_units[attacker_side][u].attack for u in attacker_units)
+    defence = (sum(all_units[defender_side][u].defence for u in defender_units) +
+               forts * all_units[defender_side][FORT].defence + terrain_bonus)
+    p_over, p_win, _ = round_probabilities(attack, defence)
+    return p_over, p_win
 
 
 # Функции для основной игры
-def can_move(unit_name: str, to_province: str) -> bool:
+def can_move(unit: int, to_province: str) -> bool:
     return True
 
 
-def can_attack(attacker_province: str, defender_province: str, unit_name: str) -> bool:
+def can_attack(attacker_province: str, defender_province: str, unit: int) -> bool:
     return True
 
 
 def calculate_battle(attacker: Side, defender: Side,
-                     attacker_unit_names: List[str], defender_unit_names: List[str],
+                     attacker_units: List[int], defender_units: List[int],
                      atk_die: int = 0, def_die: int = 0, forts: int = 0,
-                     terrain_bonus: int = 0, consume: bool = True) -> Tuple[str, int, int, List[str]]:
-    if not attacker_unit_names:
-        raise ValueError('Нужно выбрать хотя бы один атакующий батальон')
+                     terrain_bonus: int = 0, consume: bool = True) -> BattleReport:
+    if not attacker_units:
+        raise GameError(Error.NO_ATTACKERS)
+
+    if len(attacker_units) > MAX_ATTACKERS:
+        raise GameError(Error.TOO_MANY_ATTACKERS, limit=MAX_ATTACKERS)
 
-    if len(attacker_unit_names) > 2:
-        raise ValueError('Максимум 2 атакующих батальона')
+    _check_units(attacker_units, Error.UNKNOWN_ATTACKER_UNIT)
+    _check_units(defender_units, Error.UNKNOWN_DEFENDER_UNIT)
+    attacker_buf = attacker.buffer
+    defender_buf = defender.buffer
 
-    # Проверяем доступность юнитов только если consume=True
+    # Проверяем доступность юнитов только если consume=True; одинаковые батальоны считаются поштучно
     if consume:
-        for un in attacker_unit_names:
-            if attacker.available.get(un, 0) < 1:
-                raise ValueError(f'У атакующего нет {un}')
+        for unit, count in Counter(attacker_units).items():
+            if attacker_buf[AVAILABLE_OFFSET + unit] < count:
+                raise GameError(Error.ATTACKER_LACKS, unit=unit, count=count)
 
-        for un in defender_unit_names:
-            if defender.available.get(un, 0) < 1:
-                raise ValueError(f'У обороняющегося нет {un}')
+        for unit, count in Counter(defender_units).items():
+            if defender_buf[AVAILABLE_OFFSET + unit] < count:
+                raise GameError(Error.DEFENDER_LACKS, unit=unit, count=count)
 
     forts = max(0, int(forts))
-    if consume and forts > defender.available.get('Укреп', 0):
-        raise ValueError('У обороняющегося нет такого количества укреплений')
+    if consume and forts > defender_buf[AVAILABLE_OFFSET + FORT]:
+        raise GameError(Error.DEFENDER_LACKS_FORTS, count=forts)
 
     # Расчет сил
-    attack_total = sum(attacker.units[n].attack for n in attacker_unit_names) + atk_die
-    defence_total = (sum(defender.units[n].defence for n in defender_unit_names) +
+    attack = attacker.attack
+    defence = defender.defence
+    attack_total = sum(attack[i] for i in attacker_units) + atk_die
+    defence_total = (sum(defence[i] for i in defender_units) +
                      def_die +
-                     forts * defender.units['Укреп'].defence +
+                     forts * defence[FORT] +
                      terrain_bonus)
 
-    killed = []
-    outcome = ""
-
-    if attack_total > 1.5 * defence_total:
-        outcome = 'Атака подавляющая — оборона уничтожена.'
-        if consume:
-            for n in defender_unit_names:
-                defender.available[n] = max(0, defender.available.get(n, 0) - 1)
-                killed.append(n)
-            if forts > 0:
-                avail = defender.available.get('Укреп', 0)
-                destroyed = min(avail, forts)
-                defender.available['Укреп'] = avail - destroyed
-                killed.append(f'Укреп x{destroyed}')
-    elif attack_total > defence_total:
-        outcome = 'Атака успешна — оборона отступает.'
-    else:
-        outcome = 'Атака отбита.'
-
-    return outcome, attack_total, defence_total, killed
-
-
-# Инициализация при импорте
-GameState.initialize()
\ No newline at end of file
+    outcome = compare(attack_total, defence_total)
+    if outcome is not OVERWHELM or not consume:
+        return BattleReport(outcome, attack_total, defence_total)
+
+    for i in defender_units:
+        slot = AVAILABLE_OFFSET + i
+        defender.write(slot, max(0, defender_buf[slot] - 1))
+    destroyed = 0
+    if forts > 0:
+        avail = defender_buf[AVAILABLE_OFFSET + FORT]
+        destroyed = min(avail, forts)
+        defender.write(AVAILABLE_OFFSET + FORT, avail - destroyed)
+    return BattleReport(outcome, attack_total, defence_total, _count(defender_units), destroyed)
@@ -16,16 +16,16 @@ source.dir = .
 source.main = main.py
 
 # (list) Source files to include (let empty to include all the files)
-source.include_exts = py,png,jpg,kv,atlas,ttf,json
+source.include_exts = py,png,jpg,kv,atlas,ttf,json,lut,scn,lng
 
 # (list) Source files to exclude (let empty to not exclude anything)
-source.exclude_dirs = tests, bin, venv, docs, .github
+source.exclude_dirs = tests, bin, venv, docs, .github, tools
 
 # (str) Application version
 version = 0.1
 
 # (list) Application requirements
-requirements = python3,kivy==2.3.0,kivymd,pillow,openssl,requests,pyjnius==1.3.0,sdl2
+requirements = python3,kivy==2.3.0,kivymd,pillow,openssl,requests,pyjnius==1.3.0,sdl2,sqlite3
 p4a.bootstrap = sdl2
 
 # (str) Icon of the application
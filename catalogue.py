@@ -0,0 +1,25 @@
+"""
+Стороны и юниты: целые индексы и их имена.
+
+Логика игры работает только с индексами — ключи стеков, слоты буфера стороны,
+признаки хэша позиции. Имена ('СССР', 'Укреп') — формат на границе: в них записаны
+сценарии, журналы партий и дельты синхронизации и сохранений, а переводятся они
+туда и обратно по SIDE_NAMES/SIDE_INDEX и UNIT_NAMES/UNIT_INDEX. Текст для экрана —
+в i18n (side_text, unit_text) по тем же индексам.
+"""
+
+SIDE_NAMES = ('Германия', 'СССР')
+SIDE_INDEX = {name: i for i, name in enumerate(SIDE_NAMES)}
+SIDE_COUNT = len(SIDE_NAMES)
+GERMANY, USSR = range(SIDE_COUNT)
+
+# Фиксированный каталог юнитов: индекс юнита одинаков для обеих сторон
+UNIT_NAMES = ('Л. Пехота', 'Т. Пехота', 'Л. Танк', 'Т. Танк', 'Арта', 'Укреп')
+UNIT_INDEX = {name: i for i, name in enumerate(UNIT_NAMES)}
+UNIT_COUNT = len(UNIT_NAMES)
+LIGHT_INFANTRY, HEAVY_INFANTRY, LIGHT_TANK, HEAVY_TANK, ARTILLERY, FORT = range(UNIT_COUNT)
+COMBAT_UNITS = tuple(unit for unit in range(UNIT_COUNT) if unit != FORT)
+
+
+def opponent(side: int) -> int:
+    return USSR if side == GERMANY else GERMANY
@@ -0,0 +1,53 @@
+"""
+Ошибки правил и расчетов номерами, без текста.
+
+Логика возвращает или бросает GameError: код Error и именованные поля (unit и side —
+индексы catalogue, остальное — числа и имена провинций). Текст на языке игрока собирает
+UI через i18n.error_text(): у каждого кода свой идентификатор T.ERROR_<имя кода>.
+Модуль ничего не импортирует из игры, поэтому им пользуются все модули логики.
+"""
+from enum import IntEnum
+
+
+class Error(IntEnum):
+    NOT_MOVEMENT_PHASE = 0
+    NOT_PLACEMENT_PHASE = 1
+    NOT_ATTACK_PHASE = 2
+    DICE_BANKED = 3
+    UNKNOWN_SIDE = 4
+    UNKNOWN_UNIT = 5
+    UNKNOWN_ATTACKER_UNIT = 6
+    UNKNOWN_DEFENDER_UNIT = 7
+    UNKNOWN_PROVINCE = 8
+    NO_ATTACKERS = 9
+    TOO_MANY_ATTACKERS = 10
+    ATTACKER_LACKS = 11
+    DEFENDER_LACKS = 12
+    DEFENDER_LACKS_FORTS = 13
+    OUT_OF_REACH = 14
+    UNIT_OUT_OF_REACH = 15
+    REACH_LIMIT = 16
+    NEGATIVE_COUNT = 17
+    PLACEMENT_LIMIT = 18
+    NOT_ENOUGH_BANK = 19
+    UNIT_IMMOBILE = 20
+    COUNT_NOT_POSITIVE = 21
+    NOT_OWNED = 22
+    SAME_PROVINCE = 23
+    PROVINCE_OCCUPIED = 24
+    OUT_OF_MOVE_RANGE = 25
+    STACK_TOO_SMALL = 26
+
+
+class GameError(ValueError):
+    """Ошибка правил: код и поля для текста; str() — для журналов и инструментов, не для экрана"""
+
+    def __init__(self, error: Error, **fields):
+        super().__init__(error, fields)
+        self.error = error
+        self.fields = fields
+
+    def __str__(self):
+        fields = ', '.join(f'{name}={value}' for name, value in self.fields.items())
+        return f'{self.error.name}({fields})'
+
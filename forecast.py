@@ -0,0 +1,210 @@
+"""
+Прогноз экономики: что выгоднее сделать с выпавшим кубиком — положить в банк или атаковать.
+
+Модель хода на горизонте K ходов, в порядке фаз CHOICE -> MOVEMENT -> PLACEMENT -> ATTACK:
+  - кубик d (1-6, равновероятно) либо идет в банк, либо тратится на атаку на цель двумя
+    лучшими батальонами;
+  - в размещении можно докупить юниты, усиливающие атаку; покупка ценность не меняет
+    (ресурсы переходят в юниты по цене), но купленное в этот ход уже атакует;
+  - исход атаки — шансы раунда battle_engine.round_probabilities, те же, что показывает
+    калькулятор боя: уничтоженная оборона приносит стоимость защитников и укреплений,
+    отступление — retreat_value.
+Ценность — положенное в банк плюс стоимость уничтоженного у противника.
+Цель и ее защита считаются неизменными на весь горизонт.
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from battle_engine import DICE_FACES, round_probabilities
+from catalogue import FORT
+from tasks import checkpoint
+
+DEFAULT_HORIZON = 3
+MAX_ATTACKERS = 2
+# Раздел кэша result_store с версией модели: после правки прогноза старые советы не читаются
+ADVICE_NAMESPACE = 'advice-2'
+
+
+@dataclass
+class Advice:
+    """Совет числами; текст для экрана собирает UI"""
+    die: int
+    target: Optional[str]
+    bank_value: float
+    attack_value: float
+
+    @property
+    def attack_is_better(self) -> bool:
+        return self.attack_value > self.bank_value
+
+
+class EconomyForecast:
+    """
+    Динамика по состояниям (банк, осталось ходов, две лучшие атаки, остаток лимитов).
+    Состояния запоминаются, поэтому повторные вопросы в рамках хода мгновенны.
+    """
+
+    def __init__(self, shop: Sequence[Tuple[int, int]], defence_total: int, target_value: float,
+                 horizon: int = DEFAULT_HORIZON, retreat_value: float = 0.0):
+        # shop — (атака, цена) юнитов, которые можно купить для атаки
+        self.shop = tuple(shop)
+        self.defence_total = defence_total
+        self.target_value = target_value
+        self.horizon = horizon
+        self.retreat_value = retreat_value
+        self._values: Dict[tuple, float] = {}
+        self._placements: Dict[tuple, float] = {}
+
+    def attack_gain(self, army: Tuple[int, int]) -> float:
+        """Ожидаемая добыча атаки армией army по шансам раунда, как в калькуляторе боя"""
+        p_over, p_win, _ = round_probabilities(army[0] + army[1], self.defence_total)
+        return p_over * self.target_value + p_win * self.retreat_value
+
+    def value(self, bank: int, turns: int, army: Tuple[int, int], caps: Tuple[int, ...]) -> float:
+        """Ожидаемая ценность оставшихся ходов до броска кубика"""
+        if turns <= 0:
+            return 0.0
+        key = (bank, turns, army, caps)
+        cached = self._values.get(key)
+        if cached is not None:
+            return cached
+        # Новое состояние — точка отмены, если прогноз идет фоновой задачей
+        checkpoint()
+
+        total = 0.0
+        for die in DICE_FACES:
+            bank_value, attack_value = self.choices(bank, turns, army, caps, die)
+            total += max(bank_value, attack_value)
+        result = total / len(DICE_FACES)
+        self._values[key] = result
+        return result
+
+    def choices(self, bank: int, turns: int, army: Tuple[int, int], caps: Tuple[int, ...],
+                die: int) -> Tuple[float, float]:
+        """(ценность банка, ценность атаки) при известном кубике"""
+        bank_value = die + self.placement(bank + die, turns, army, caps, False)
+        attack_value = self.placement(bank, turns, army, caps, True)
+        return bank_value, attack_value
+
+    def placement(self, bank: int, turns: int, army: Tuple[int, int], caps: Tuple[int, ...],
+                  attack: bool) -> float:
+        """Лучшая докупка юнитов, затем атака уже с купленными (если attack) и следующий ход"""
+        key = (bank, turns, army, caps, attack)
+        cached = self._placements.get(key)
+        if cached is not None:
+            return cached
+
+        best = (self.attack_gain(army) if attack else 0.0) + self.value(bank, turns - 1, army, caps)
+        for i, (unit_attack, cost) in enumerate(self.shop):
+            # Юнит, не входящий в две лучшие атаки, атаку не усиливает
+            if caps[i] <= 0 or cost > bank or unit_attack <= army[1]:
+                continue
+            new_army = (unit_attack, army[0]) if unit_attack > army[0] else (army[0], unit_attack)
+            new_caps = caps[:i] + (caps[i] - 1,) + caps[i + 1:]
+            best = max(best, self.placement(bank - cost, turns, new_army, new_caps, attack))
+
+        self._placements[key] = best
+        return best
+
+
+def top_army(attacks: Sequence[int]) -> Tuple[int, int]:
+    best = sorted(attacks, reverse=True)[:MAX_ATTACKERS]
+    best += [0] * (MAX_ATTACKERS - len(best))
+    return best[0], best[1]
+
+
+class SideSnapshot(NamedTuple):
+    """То, что прогноз читает у стороны; снимок можно отдать в фоновый поток"""
+    units: Tuple[int, ...]
+    shop: Tuple[Tuple[int, int], ...]
+    caps: Tuple[int, ...]
+    bank: int
+
+
+class Target(NamedTuple):
+    province: Optional[str]
+    attacks: Tuple[int, ...]
+    defence_total: int
+    value: float
+
+
+def snapshot_side(side) -> SideSnapshot:
+    units = tuple(unit for unit, unit_type in enumerate(side.units) if unit_type.attack > 0)
+    shop = tuple((side.attack[unit], side.cost[unit]) for unit in units)
+    # Больше двух одинаковых юнитов две лучшие атаки не меняют
+    caps = tuple(min(side.max_placements[unit], MAX_ATTACKERS) for unit in units)
+    return SideSnapshot(units, shop, caps, side.bank)
+
+
+@lru_cache(maxsize=64)
+def _forecast(shop: Tuple[Tuple[int, int], ...], defence_total: int, target_value: float,
+              horizon: int) -> EconomyForecast:
+    return EconomyForecast(shop, defence_total, target_value, horizon)
+
+
+def _advise(snapshot: SideSnapshot, die: int, target: Target, horizon: int) -> Advice:
+    forecast = _forecast(snapshot.shop, target.defence_total, float(target.value), horizon)
+    bank_value, attack_value = forecast.choices(snapshot.bank, horizon, top_army(target.attacks),
+                                                snapshot.caps, die)
+    return Advice(die, target.province, bank_value, attack_value)
+
+
+def advise(side, die: int, attacker_attacks: Sequence[int], defence_total: int, target_value: float,
+           target: Optional[str] = None, horizon: int = DEFAULT_HORIZON) -> Advice:
+    """Совет для стороны: банк или атака с кубиком die"""
+    return _advise(snapshot_side(side), die, Target(target, tuple(attacker_attacks), defence_total, target_value),
+                   horizon)
+
+
+def current_targets(side: Optional[int] = None) -> List[Target]:
+    """Цели стороны из карты угроз; читает GameState, поэтому вызывается в главном потоке"""
+    from battle_logic import GameState
+
+    side = GameState._sides[side] if side is not None else GameState.get_current_side()
+    targets = []
+    for threat in GameState.get_threat_map(side.id).threats():
+        defender = GameState._sides[GameState._provinces[threat.province].owner]
+        target_value = (sum(defender.cost[unit] for unit in threat.defenders) +
+                        threat.forts * defender.cost[FORT])
+        attacks = tuple(side.attack[unit] for unit, _ in threat.attackers)
+        targets.append(Target(threat.province, attacks, threat.defence_total, target_value))
+    return targets
+
+
+def best_advice(snapshot: SideSnapshot, die: int, targets: Sequence[Target],
+                horizon: int = DEFAULT_HORIZON) -> Advice:
+    """Лучший совет по всем целям; работает только со снимками и годится для фонового потока"""
+    best = None
+    for i, target in enumerate(targets):
+        checkpoint(i / len(targets))
+        advice = _advise(snapshot, die, target, horizon)
+        if best is None or advice.attack_value > best.attack_value:
+            best = advice
+
+    if best is None:
+        # Атаковать некого — атака ничего не приносит
+        best = _advise(snapshot, die, Target(None, (), 0, 0), horizon)
+    return best
+
+
+def stored_best_advice(snapshot: SideSnapshot, die: int, targets: Sequence[Target],
+                       horizon: int = DEFAULT_HORIZON) -> Advice:
+    """best_advice через кэш на диске (result_store): та же позиция советуется сразу и после перезапуска"""
+    from result_store import get_store
+
+    store = get_store()
+    targets = tuple(targets)
+    return store.get_or_compute(ADVICE_NAMESPACE, store.make_key(snapshot, die, targets, horizon),
+                                lambda: best_advice(snapshot, die, targets, horizon))
+
+
+def advise_current_turn(horizon: int = DEFAULT_HORIZON) -> Optional[Advice]:
+    """Совет текущему игроку по лучшей цели из карты угроз; None, пока кубик не брошен"""
+    from battle_logic import GameState
+
+    die = GameState.get_current_dice()
+    if die <= 0:
+        return None
+    return best_advice(snapshot_side(GameState.get_current_side()), die, current_targets(), horizon)
+
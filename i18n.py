@@ -0,0 +1,394 @@
+"""
+Тексты интерфейса по целочисленным идентификаторам.
+
+Экраны и отчеты ссылаются на текст через T (IntEnum), а не через русские литералы:
+tr(T.GAME_PHASE, phase=...) — индекс в списке строк текущего языка и format()
+по именованным полям. Стороны и юниты в логике — индексы (catalogue), на экран они
+выводятся через side_text() и unit_text(). Фазы, действия, исходы боя и коды ошибок
+(errors.Error) — IntEnum, их текст тоже здесь; GameError на экран — error_text().
+Логика игры (battle_logic, forecast) i18n не импортирует: текст собирает UI.
+
+Исходник языка — locale/<язык>.json: {имя идентификатора T: текст}. Сборка —
+`python -m tools.build_strings`: исходник проверяется и сохраняется рядом в <язык>.lng:
+заголовок HEADER и тексты UTF-8 через '\\0' в порядке T. Таблица языка читается целиком
+при первом обращении к нему, так что лишние языки при запуске ничего не стоят; JSON
+при этом не читается. Если .lng нет или он собран для другого списка T, таблица
+собирается из JSON на месте. CRC32 исходника в заголовке сверяет только
+`tools.build_strings --check`: он сообщает о .lng, собранном из другой версии JSON.
+Непереведенные тексты берутся из русской таблицы.
+"""
+import json
+import os
+import struct
+import zlib
+from enum import IntEnum, auto
+from typing import Dict, List, Optional
+
+from battle_engine import BattleEnd, Outcome
+from catalogue import ARTILLERY, FORT, GERMANY, HEAVY_INFANTRY, HEAVY_TANK, LIGHT_INFANTRY, LIGHT_TANK, USSR
+from errors import Error, GameError
+from rules import Action, GamePhase
+
+MAGIC = b'STLN'
+VERSION = 1
+HEADER = struct.Struct('<4sHIII')  # магия, версия, CRC32 исходника, CRC32 имен T, число текстов
+
+LOCALE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'locale')
+DEFAULT_LANGUAGE = 'ru'
+
+
+class T(IntEnum):
+    def _generate_next_value_(name, start, count, last_values):
+        # Значение — порядковый номер: индекс текста в таблице языка
+        return count
+
+    # Стороны, юниты, фазы, действия, исходы
+    SIDE_GERMANY = auto()
+    SIDE_USSR = auto()
+    UNIT_LIGHT_INFANTRY = auto()
+    UNIT_HEAVY_INFANTRY = auto()
+    UNIT_LIGHT_TANK = auto()
+    UNIT_HEAVY_TANK = auto()
+    UNIT_ARTILLERY = auto()
+    UNIT_FORT = auto()
+    PHASE_CHOICE = auto()
+    PHASE_MOVEMENT = auto()
+    PHASE_PLACEMENT = auto()
+    PHASE_ATTACK = auto()
+    PHASE_COMPLETION = auto()
+    ACTION_ROLL = auto()
+    ACTION_CHOOSE_ATTACK = auto()
+    ACTION_CHOOSE_BANK = auto()
+    ACTION_MOVE = auto()
+    ACTION_PLACE = auto()
+    ACTION_ATTACK = auto()
+    ACTION_SKIP_ATTACK = auto()
+    ACTION_END_TURN = auto()
+    OUTCOME_OVERWHELM = auto()
+    OUTCOME_WIN = auto()
+    OUTCOME_LOSE = auto()
+    BATTLE_END_DESTROYED = auto()
+    BATTLE_END_BROKEN = auto()
+    BATTLE_END_REPELLED = auto()
+    BATTLE_END_STALLED = auto()
+
+    # Общее
+    APP_TITLE = auto()
+    SPLASH_TITLE = auto()
+    INFO = auto()
+    OK = auto()
+    CANCEL = auto()
+    CLOSE = auto()
+    BACK = auto()
+    SWAP = auto()
+    REFRESH = auto()
+    ERROR = auto()
+    MAIN_MENU = auto()
+
+    # Главное меню и игра по сети
+    MENU_TITLE = auto()
+    MENU_INDEPENDENT_CALC = auto()
+    MENU_CALC = auto()
+    MENU_SHOP = auto()
+    MENU_MAP = auto()
+    MENU_STATUS = auto()
+    MENU_STATS = auto()
+    MENU_NETWORK = auto()
+    MENU_TELEMETRY = auto()
+    MENU_RESTART = auto()
+    MENU_EXIT = auto()
+    NET_CONNECTED = auto()
+    NET_WAITING = auto()
+    NET_STATUS = auto()
+    NET_DISCONNECT = auto()
+    NET_ADDRESS = auto()
+    NET_HOST_ADDRESS = auto()
+    NET_HOST = auto()
+    NET_JOIN = auto()
+    NET_ERROR = auto()
+
+    # Стартовые наборы
+    SETS_TITLE = auto()
+    SETS_START = auto()
+
+    # Экран игры
+    GAME_PHASE = auto()
+    GAME_RESOURCES = auto()
+    GAME_DICE = auto()
+    GAME_ROLL = auto()
+    GAME_CHOOSE_ATTACK = auto()
+    GAME_CHOOSE_BANK = auto()
+    GAME_MOVE = auto()
+    GAME_PLACE = auto()
+    GAME_ATTACK = auto()
+    GAME_SKIP_ATTACK = auto()
+    GAME_END_TURN = auto()
+    GAME_ARMY = auto()
+    MOVE_TITLE = auto()
+    MOVE_NONE = auto()
+    MOVE_ERROR = auto()
+    MOVE_CONFIRM = auto()
+    ATTACK_TITLE = auto()
+    ATTACK_TARGET = auto()
+    ATTACK_NONE = auto()
+    ATTACK_UNITS_TITLE = auto()
+    ATTACK_SELECT = auto()
+    ATTACK_CONFIRM = auto()
+    ATTACK_ERROR = auto()
+    PLACE_TITLE = auto()
+    PLACE_ROW = auto()
+    PLACE_NONE = auto()
+    PLACE_CONFIRM = auto()
+    PLACE_SKIP = auto()
+    PLACE_DONE = auto()
+    FORECAST_ADVICE = auto()
+    FORECAST_ATTACK_ON = auto()
+    FORECAST_ATTACK = auto()
+    FORECAST_BANK = auto()
+
+    # Бой и калькуляторы
+    BATTLE_TOTALS = auto()
+    BATTLE_KILLED = auto()
+    BATTLE_ODDS = auto()
+    CALC_DEPENDENT_TITLE = auto()
+    CALC_INDEPENDENT_TITLE = auto()
+    CALC_ATTACKER = auto()
+    CALC_DEFENDER = auto()
+    CALC_ATTACKERS = auto()
+    CALC_DEFENDERS = auto()
+    CALC_ATTACKER_DIE = auto()
+    CALC_DEFENDER_DIE = auto()
+    CALC_FORTS = auto()
+    CALC_TERRAIN = auto()
+    CALC_PROVINCE = auto()
+    CALC_RUN = auto()
+
+    # Магазин
+    SHOP_TITLE = auto()
+    SHOP_SIDE = auto()
+    SHOP_BANK = auto()
+    SHOP_ADD = auto()
+    SHOP_ORDER = auto()
+    SHOP_BUY = auto()
+    SHOP_UNIT = auto()
+    SHOP_COST = auto()
+    SHOP_AVAILABLE = auto()
+    SHOP_COUNT = auto()
+    SHOP_ADD_TITLE = auto()
+    SHOP_ADD_PROMPT = auto()
+    SHOP_ADD_CONFIRM = auto()
+    SHOP_ADDED = auto()
+    SHOP_BOUGHT = auto()
+
+    # Карта, отчеты, телеметрия
+    MAP_TITLE = auto()
+    MAP_FIT = auto()
+    MAP_FORTS = auto()
+    STATUS_TITLE = auto()
+    STATUS_UNIT = auto()
+    STATS_TITLE = auto()
+    STATS_GAMES = auto()
+    STATS_WINS = auto()
+    STATS_BANK = auto()
+    STATS_LOSSES = auto()
+    STATS_SETS = auto()
+    STATS_OUTCOMES = auto()
+    STATS_OVERWHELM = auto()
+    STATS_WIN = auto()
+    STATS_LOSE = auto()
+    TELEMETRY_LINE = auto()
+    TELEMETRY_SAVE = auto()
+    TELEMETRY_SAVED = auto()
+
+    # Ошибки правил: ERROR_<код errors.Error>
+    ERROR_NOT_MOVEMENT_PHASE = auto()
+    ERROR_NOT_PLACEMENT_PHASE = auto()
+    ERROR_NOT_ATTACK_PHASE = auto()
+    ERROR_DICE_BANKED = auto()
+    ERROR_UNKNOWN_SIDE = auto()
+    ERROR_UNKNOWN_UNIT = auto()
+    ERROR_UNKNOWN_ATTACKER_UNIT = auto()
+    ERROR_UNKNOWN_DEFENDER_UNIT = auto()
+    ERROR_UNKNOWN_PROVINCE = auto()
+    ERROR_NO_ATTACKERS = auto()
+    ERROR_TOO_MANY_ATTACKERS = auto()
+    ERROR_ATTACKER_LACKS = auto()
+    ERROR_DEFENDER_LACKS = auto()
+    ERROR_DEFENDER_LACKS_FORTS = auto()
+    ERROR_OUT_OF_REACH = auto()
+    ERROR_UNIT_OUT_OF_REACH = auto()
+    ERROR_REACH_LIMIT = auto()
+    ERROR_NEGATIVE_COUNT = auto()
+    ERROR_PLACEMENT_LIMIT = auto()
+    ERROR_NOT_ENOUGH_BANK = auto()
+    ERROR_UNIT_IMMOBILE = auto()
+    ERROR_COUNT_NOT_POSITIVE = auto()
+    ERROR_NOT_OWNED = auto()
+    ERROR_SAME_PROVINCE = auto()
+    ERROR_PROVINCE_OCCUPIED = auto()
+    ERROR_OUT_OF_MOVE_RANGE = auto()
+    ERROR_STACK_TOO_SMALL = auto()
+
+
+# CRC32 имен T по порядку: .lng, собранный для другого списка, не читается
+IDS_CRC = zlib.crc32('\n'.join(T.__members__).encode('utf-8'))
+
+SIDE_TEXTS = {GERMANY: T.SIDE_GERMANY, USSR: T.SIDE_USSR}
+UNIT_TEXTS = {
+    LIGHT_INFANTRY: T.UNIT_LIGHT_INFANTRY,
+    HEAVY_INFANTRY: T.UNIT_HEAVY_INFANTRY,
+    LIGHT_TANK: T.UNIT_LIGHT_TANK,
+    HEAVY_TANK: T.UNIT_HEAVY_TANK,
+    ARTILLERY: T.UNIT_ARTILLERY,
+    FORT: T.UNIT_FORT,
+}
+PHASE_TEXTS = {phase: T[f'PHASE_{phase.name}'] for phase in GamePhase}
+ACTION_TEXTS = {action: T[f'ACTION_{action.name}'] for action in Action}
+OUTCOME_TEXTS = {outcome: T[f'OUTCOME_{outcome.name}'] for outcome in Outcome}
+BATTLE_END_TEXTS = {end: T[f'BATTLE_END_{end.name}'] for end in BattleEnd}
+ERROR_TEXTS = {error: T[f'ERROR_{error.name}'] for error in Error}
+
+_language = os.environ.get('STALINGAME_LANG', DEFAULT_LANGUAGE)
+_tables: Dict[str, List[str]] = {}
+_current: Optional[List[str]] = None
+
+
+def source_path(language: str) -> str:
+    return os.path.join(LOCALE_DIR, f'{language}.json')
+
+
+def compiled_path(language: str) -> str:
+    return os.path.join(LOCALE_DIR, f'{language}.lng')
+
+
+def languages() -> List[str]:
+    return sorted(name[:-5] for name in os.listdir(LOCALE_DIR) if name.endswith('.json'))
+
+
+def read_source(language: str) -> dict:
+    with open(source_path(language), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def source_crc(language: str) -> int:
+    with open(source_path(language), 'rb') as f:
+        return zlib.crc32(f.read())
+
+
+def validate(source) -> List[str]:
+    """Ошибки исходника языка; пропущенные тексты ошибкой не считаются — см. missing()"""
+    if not isinstance(source, dict):
+        return ['Исходник языка — не объект {идентификатор: текст}']
+    problems = []
+    for name, text in source.items():
+        if name not in T.__members__:
+            problems.append(f'Неизвестный идентификатор: {name}')
+        elif not isinstance(text, str):
+            problems.append(f'{name}: текст не строка')
+        elif '\0' in text:
+            problems.append(f'{name}: в тексте символ \\0')
+    return problems
+
+
+def missing(source: dict) -> List[str]:
+    return [name for name in T.__members__ if name not in source]
+
+
+def build_table(source: dict, fallback: Optional[List[str]] = None) -> List[str]:
+    """Тексты в порядке T; пропуски — из fallback, без него — имя идентификатора"""
+    return [source.get(name, fallback[i] if fallback is not None else name)
+            for i, name in enumerate(T.__members__)]
+
+
+def compile_table(texts: List[str], source_crc: int = 0) -> bytes:
+    return HEADER.pack(MAGIC, VERSION, source_crc, IDS_CRC, len(texts)) + '\0'.join(texts).encode('utf-8')
+
+
+def write_compiled(texts: List[str], path: str, source_crc: int = 0) -> int:
+    data = compile_table(texts, source_crc)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+def load_compiled(data: bytes, source_crc: Optional[int] = None) -> List[str]:
+    """Тексты из .lng; ValueError, если файл поврежден, устарел или собран для другого T"""
+    if len(data) < HEADER.size:
+        raise ValueError('Файл текстов обрезан')
+    magic, version, file_source_crc, ids_crc, count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Не файл текстов или другая версия формата')
+    if ids_crc != IDS_CRC or count != len(T):
+        raise ValueError('Тексты собраны для другого списка идентификаторов')
+    if source_crc is not None and file_source_crc != source_crc:
+        raise ValueError('Тексты собраны из другой версии исходника')
+    texts = data[HEADER.size:].decode('utf-8').split('\0')
+    if len(texts) != count:
+        raise ValueError('Число текстов не совпадает с заголовком')
+    return texts
+
+
+def table(language: str) -> List[str]:
+    """Тексты языка в порядке T; читаются один раз за запуск"""
+    texts = _tables.get(language)
+    if texts is None:
+        # Исходник при запуске не читается: устаревший .lng ловит tools.build_strings --check
+        try:
+            with open(compiled_path(language), 'rb') as f:
+                texts = load_compiled(f.read())
+        except (OSError, ValueError, struct.error):
+            fallback = None if language == DEFAULT_LANGUAGE else table(DEFAULT_LANGUAGE)
+            texts = build_table(read_source(language), fallback)
+        _tables[language] = texts
+    return texts
+
+
+def set_language(language: str):
+    """Язык для следующих tr(); разметка kv берет тексты при создании экранов"""
+    global _language, _current
+    _language = language
+    _current = None
+
+
+def get_language() -> str:
+    return _language
+
+
+def _load_current() -> List[str]:
+    global _current
+    try:
+        _current = table(_language)
+    except (OSError, ValueError):
+        _current = table(DEFAULT_LANGUAGE)
+    return _current
+
+
+def tr(text_id: T, **fields) -> str:
+    texts = _current if _current is not None else _load_current()
+    text = texts[text_id]
+    return text.format(**fields) if fields else text
+
+
+def side_text(side: int) -> str:
+    text_id = SIDE_TEXTS.get(side)
+    return str(side) if text_id is None else tr(text_id)
+
+
+def unit_text(unit: int) -> str:
+    text_id = UNIT_TEXTS.get(unit)
+    return str(unit) if text_id is None else tr(text_id)
+
+
+# Поля ошибок с индексами catalogue: на экран — текстом языка
+_FIELD_TEXTS = {'unit': unit_text, 'side': side_text}
+
+
+def error_text(error: Exception) -> str:
+    """Текст ошибки для экрана: GameError — по коду и полям, прочие исключения — str()"""
+    if not isinstance(error, GameError):
+        return str(error)
+    fields = {name: _FIELD_TEXTS[name](value) if name in _FIELD_TEXTS else value
+              for name, value in error.fields.items()}
+    return tr(ERROR_TEXTS[error.error], **fields)
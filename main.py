@@ -1,24 +1,268 @@
+import os
+import time
+
 from kivy.app import App
+from kivy.clock import Clock
+from kivy.factory import Factory
 from kivy.lang import Builder
-from kivy.core.window import Window
+from kivy.logger import Logger
+from kivy.properties import BooleanProperty, NumericProperty, StringProperty
+from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.screenmanager import ScreenManager, Screen
 from kivy.uix.popup import Popup
-from kivy.uix.label import Label
-from kivy.uix.button import Button
-from kivy.uix.boxlayout import BoxLayout
-from kivy.uix.spinner import Spinner
-from battle_logic import GameState, GamePhase, calculate_battle, independent_battle_calculation
+from kivy.uix.widget import Widget
+from battle_logic import GameState, calculate_battle, independent_battle_calculation, independent_win_probability
+from catalogue import COMBAT_UNITS, GERMANY, SIDE_NAMES, USSR, opponent
+from i18n import OUTCOME_TEXTS, PHASE_TEXTS, T, error_text, side_text, tr, unit_text
+from rules import Action
+from movement import Move
+from tasks import get_executor
+
+KV_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kv')
+_loaded_kv = set()
+
+
+def load_kv(filename):
+    """Файл из kv/ разбирается один раз за запуск"""
+    if filename in _loaded_kv:
+        return
+    _loaded_kv.add(filename)
+    start = time.perf_counter()
+    Builder.load_file(os.path.join(KV_DIR, filename))
+    Logger.info(f"KV: {filename} разобран за {(time.perf_counter() - start) * 1000:.1f} мс")
+
+
+class Dialog(Popup):
+    """Всплывающее окно со списком строк; разметка — шаблон <Dialog> в kv/common.kv"""
+
+    def add(self, widget):
+        self.ids.body.add_widget(widget)
+        return widget
+
+    def add_text(self, text):
+        return self.add(Factory.TextLabel(text=text))
+
+    def add_button(self, text, on_release, **kwargs):
+        return self.add(Factory.MenuButton(text=text, on_release=on_release, **kwargs))
+
+    def on_open(self):
+        from telemetry import mark
+        mark(f"окно: {self.title}")
+
+
+def show_message(message):
+    popup = Dialog(title=tr(T.INFO), size_hint=(0.7, 0.4))
+    popup.add_text(message)
+    popup.add_button(tr(T.OK), popup.dismiss, height='50dp')
+    popup.open()
+
+
+class BusyIndicator(Widget):
+    """
+    Крутящаяся дуга, пока идет фоновый расчет; разметка — kv/common.kv.
+    progress — доля выполненного из checkpoint() задачи, дуга растет до полного круга; -1 — неизвестно.
+    """
+    active = BooleanProperty(False)
+    angle = NumericProperty(0)
+    progress = NumericProperty(-1)
+    _event = None
+
+    def on_active(self, instance, active):
+        if active and self._event is None:
+            self._event = Clock.schedule_interval(self._spin, 1 / 30)
+        elif not active and self._event is not None:
+            self._event.cancel()
+            self._event = None
+
+    def _spin(self, dt):
+        self.angle = (self.angle - 360 * dt) % 360
+
+
+class TelemetryOverlay(BoxLayout):
+    """
+    Полоска телеметрии поверх всех экранов; разметка — kv/common.kv.
+    Длительность кадра меряется между соседними on_flip окна, отрисовка — от on_draw до on_flip.
+    Дерево виджетов и память опрашиваются дважды в секунду, а не на каждом кадре.
+    """
+    text = StringProperty('')
 
-Window.clearcolor = (0.06, 0.09, 0.06, 1)
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        from telemetry import get_recorder
+        self.recorder = get_recorder()
+        self._window = None
+        self._root = None
+        self._draw_start = None
+        self._last_flip = None
+        self._event = None
+
+    def attach(self, window, root):
+        self._window = window
+        self._root = root
+        window.bind(on_draw=self._on_draw, on_flip=self._on_flip)
+        root.bind(current=self._on_screen)
+        GameState.add_listener(self._on_game_event)
+        self.recorder.set_screen(root.current)
+        self.recorder.start()
+        self._event = Clock.schedule_interval(self._refresh, 0.5)
+        window.add_widget(self)
+
+    def detach(self):
+        window = self._window
+        window.remove_widget(self)
+        window.unbind(on_draw=self._on_draw, on_flip=self._on_flip)
+        self._root.unbind(current=self._on_screen)
+        GameState.remove_listener(self._on_game_event)
+        self._event.cancel()
+        self.recorder.stop()
+        self._window = self._last_flip = None
+
+    def _on_draw(self, window):
+        self._draw_start = time.perf_counter()
+
+    def _on_flip(self, window):
+        now = time.perf_counter()
+        if self._last_flip is not None and self._draw_start is not None:
+            self.recorder.frame((now - self._last_flip) * 1000, (now - self._draw_start) * 1000)
+        self._last_flip = now
+
+    def _on_screen(self, manager, name):
+        self.recorder.set_screen(name)
+        self.recorder.mark(f"экран: {name}")
+
+    def _on_game_event(self, event, data):
+        side = data.get('side', data.get('attacker'))
+        self.recorder.mark(f"{event}: {SIDE_NAMES[side]}" if side is not None else event)
+
+    def _refresh(self, dt):
+        from telemetry import percentile
+        recorder = self.recorder
+        recorder.set_widgets(sum(1 for child in self._window.children for _ in child.walk(restrict=True)))
+        recorder.sample_memory()
+        frames = sorted(sample.frame_ms for sample in recorder.recent(60))
+        gc_ms = sum(sample.gc_ms for sample in recorder.recent(60))
+        self.text = tr(T.TELEMETRY_LINE, screen=recorder.screen, p95=percentile(frames, 0.95),
+                       worst=frames[-1] if frames else 0, gc=gc_ms, widgets=recorder.widgets,
+                       heap=recorder.heap_blocks // 1000, rss=recorder.rss_kb // 1024, action=recorder.action)
+
+
+class BackgroundWork:
+    """
+    Примесь экрана: тяжелые расчеты идут в общем TaskExecutor, пока busy (BusyIndicator в kv).
+    progress — последний прогресс, о котором сообщила задача экрана, -1 — не сообщала.
+    Новая задача с тем же ключом отменяет прежнюю; уход с экрана отменяет все его задачи,
+    а on_enter при возвращении запускает прерванные заново, если экран не запустил их сам.
+    Экраны со своим on_enter вызывают super().on_enter() после обновления.
+    """
+    busy = BooleanProperty(False)
+    progress = NumericProperty(-1)
+    # Ключ задачи -> (key, func, args, on_result): запущенные и прерванные уходом с экрана
+    _jobs = None
+    _interrupted = None
+
+    def run_in_background(self, key, func, *args, on_result=None):
+        task_key = f"{self.name}:{key}"
+        if self._jobs is None:
+            self._jobs = {}
+        running = self._jobs
+        job = running[task_key] = (key, func, args, on_result)
+        self.busy = True
+        self.progress = -1
+
+        def current():
+            # Результат отмененной, замененной или брошенной уходом с экрана задачи не нужен:
+            # задача могла закончиться раньше отмены, и колбэк уже ждет главного потока
+            return self._jobs is running and running.get(task_key) is job
+
+        def done():
+            del running[task_key]
+            self.busy = bool(running)
+            self.progress = -1
+
+        def progressed(value):
+            if current():
+                self.progress = value
+
+        def finished(value):
+            if current():
+                done()
+                if on_result is not None:
+                    on_result(value)
+
+        def failed(error):
+            if current():
+                done()
+            Logger.warning(f"Tasks: {task_key}: {error!r}")
+
+        from telemetry import mark
+        mark(f"фон: {task_key}")
+        get_executor().submit(func, *args, key=task_key, on_result=finished, on_error=failed,
+                              on_progress=progressed)
+
+    def cancel_background(self, key):
+        task_key = f"{self.name}:{key}"
+        if self._interrupted:
+            self._interrupted.pop(task_key, None)
+        if self._jobs and task_key in self._jobs:
+            del self._jobs[task_key]
+            get_executor().cancel(task_key)
+            self.busy = bool(self._jobs)
+            self.progress = -1
+
+    def on_enter(self, *args):
+        interrupted, self._interrupted = self._interrupted or {}, None
+        for task_key, (key, func, job_args, on_result) in interrupted.items():
+            if not self._jobs or task_key not in self._jobs:
+                self.run_in_background(key, func, *job_args, on_result=on_result)
+
+    def on_leave(self, *args):
+        for task_key in self._jobs or ():
+            get_executor().cancel(task_key)
+        self._interrupted = self._jobs
+        self._jobs = None
+        self.busy = False
+        self.progress = -1
+
+
+def battle_report_text(report):
+    result = (tr(T.BATTLE_TOTALS, attack=report.attack_total, defence=report.defence_total) +
+              f"\n{tr(OUTCOME_TEXTS[report.outcome])}")
+    killed = [unit_text(unit) for unit, count in report.casualties.items() for _ in range(count)]
+    if report.forts_lost:
+        killed.append(f'{tr(T.UNIT_FORT)} x{report.forts_lost}')
+    if killed:
+        result += '\n' + tr(T.BATTLE_KILLED, units=', '.join(killed))
+    return result
+
+
+def battle_odds_text(attacker_side, defender_side, attacker_units, defender_units, forts, terrain_bonus):
+    p_over, p_win = independent_win_probability(attacker_side, defender_side, attacker_units, defender_units,
+                                                forts, terrain_bonus)
+    return tr(T.BATTLE_ODDS, win=p_over + p_win, overwhelm=p_over)
+
+
+def advice_text(advice):
+    if advice.attack_is_better:
+        best = tr(T.FORECAST_ATTACK_ON, target=advice.target) if advice.target else tr(T.FORECAST_ATTACK)
+    else:
+        best = tr(T.FORECAST_BANK)
+    return tr(T.FORECAST_ADVICE, best=best, bank=advice.bank_value, attack=advice.attack_value)
+
+
+def order_spinner(side, unit, **kwargs):
+    """Спиннер количества для заказа: не больше лимита размещения и того, на что хватает банка"""
+    cost = side.cost[unit]
+    limit = min(side.max_placements[unit], side.bank // cost if cost else 0, 30)
+    return Factory.FormSpinner(text='0', values=[str(i) for i in range(0, limit + 1)], **kwargs)
 
 
 class SplashScreen(Screen):
     def on_enter(self):
-        from kivy.clock import Clock
         Clock.schedule_once(self.go_to_starting_sets, 2)
 
     def go_to_starting_sets(self, dt):
-        self.manager.current = 'starting_sets'
+        # Восстановленная после перезапуска партия продолжается из меню
+        self.manager.current = 'menu' if App.get_running_app().resumed else 'starting_sets'
 
 
 class StartingSetsScreen(Screen):
@@ -31,13 +275,13 @@ class StartingSetsScreen(Screen):
         self.update_display()
 
     def update_display(self):
-        germany_sets = GameState.get_starting_sets('Германия')
-        ussr_sets = GameState.get_starting_sets('СССР')
+        germany_sets = GameState.get_starting_sets(GERMANY)
+        ussr_sets = GameState.get_starting_sets(USSR)
 
         if germany_sets:
-            self.ids.germany_set_label.text = f"Германия: {germany_sets[self.germany_set]['name']}"
+            self.ids.germany_set_label.text = f"{tr(T.SIDE_GERMANY)}: {germany_sets[self.germany_set]['name']}"
         if ussr_sets:
-            self.ids.ussr_set_label.text = f"СССР: {ussr_sets[self.ussr_set]['name']}"
+            self.ids.ussr_set_label.text = f"{tr(T.SIDE_USSR)}: {ussr_sets[self.ussr_set]['name']}"
 
         self.show_set_composition('germany_composition', germany_sets[self.germany_set] if germany_sets else {})
         self.show_set_composition('ussr_composition', ussr_sets[self.ussr_set] if ussr_sets else {})
@@ -49,9 +293,9 @@ class StartingSetsScreen(Screen):
         if not starting_set:
             return
 
-        for unit_name, count in starting_set.get('units', {}).items():
-            label = Label(
-                text=f"{unit_name}: {count}",
+        for unit, count in starting_set.get('units', {}).items():
+            label = Factory.Label(
+                text=f"{unit_text(unit)}: {count}",
                 size_hint_y=None,
                 height='30dp',
                 color=(1, 1, 1, 1),
@@ -60,20 +304,20 @@ class StartingSetsScreen(Screen):
             layout.add_widget(label)
 
     def change_germany_set(self, direction):
-        germany_sets = GameState.get_starting_sets('Германия')
+        germany_sets = GameState.get_starting_sets(GERMANY)
         if germany_sets:
             self.germany_set = (self.germany_set + direction) % len(germany_sets)
             self.update_display()
 
     def change_ussr_set(self, direction):
-        ussr_sets = GameState.get_starting_sets('СССР')
+        ussr_sets = GameState.get_starting_sets(USSR)
         if ussr_sets:
             self.ussr_set = (self.ussr_set + direction) % len(ussr_sets)
             self.update_display()
 
     def confirm_starting_sets(self):
-        GameState.set_starting_set('Германия', self.germany_set)
-        GameState.set_starting_set('СССР', self.ussr_set)
+        GameState.set_starting_set(GERMANY, self.germany_set)
+        GameState.set_starting_set(USSR, self.ussr_set)
         self.manager.current = 'menu'
 
 
@@ -82,8 +326,39 @@ class MainMenu(Screen):
         GameState.initialize()
         self.manager.current = 'starting_sets'
 
+    def show_network_dialog(self):
+        import netsync
+        app = App.get_running_app()
+        popup = Dialog(title=tr(T.MENU_NETWORK), size_hint=(0.8, 0.6))
+        if app.sync is not None:
+            state = tr(T.NET_CONNECTED if app.sync.connected else T.NET_WAITING)
+            popup.add_text(tr(T.NET_STATUS, role=app.sync.role, state=state, side=side_text(app.sync.local_side)))
+            popup.add_button(tr(T.NET_DISCONNECT), lambda x: (app.stop_sync(), popup.dismiss()))
+        else:
+            popup.add_text(tr(T.NET_ADDRESS, address=netsync.local_address()))
+            address = popup.add(Factory.TextInput(hint_text=tr(T.NET_HOST_ADDRESS), multiline=False,
+                                                  size_hint_y=None, height='40dp'))
+            popup.add_button(tr(T.NET_HOST, side=tr(T.SIDE_USSR)),
+                             lambda x: (app.start_sync('host'), popup.dismiss()))
+            popup.add_button(tr(T.NET_JOIN, side=tr(T.SIDE_GERMANY)),
+                             lambda x: (app.start_sync('guest', address.text.strip()), popup.dismiss()))
+        popup.add_button(tr(T.CLOSE), popup.dismiss)
+        popup.open()
+
+
+class GameScreen(BackgroundWork, Screen):
+    # Кнопка -> действие; доступность берется из таблицы правил (rules.TRANSITIONS)
+    ACTION_BUTTONS = {
+        'roll_dice_button': Action.ROLL,
+        'choose_attack_button': Action.CHOOSE_ATTACK,
+        'choose_bank_button': Action.CHOOSE_BANK,
+        'move_button': Action.MOVE,
+        'place_units_button': Action.PLACE,
+        'attack_button': Action.ATTACK,
+        'skip_attack_button': Action.SKIP_ATTACK,
+        'end_turn_button': Action.END_TURN,
+    }
 
-class GameScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.selected_unit = None
@@ -91,35 +366,47 @@ class GameScreen(Screen):
 
     def on_enter(self):
         self.update_display()
+        super().on_enter()
 
     def update_display(self):
         try:
             self.ids.current_player.text = f""
-            self.ids.phase_label.text = f"Фаза: {GameState.current_phase.value}"
-            self.ids.resources_label.text = f"Ресурсы: {GameState.get_current_side().bank}"
-            self.ids.dice_label.text = f"Кубик: {GameState.current_dice}"
+            self.ids.phase_label.text = tr(T.GAME_PHASE, phase=tr(PHASE_TEXTS[GameState.get_current_phase()]))
+            self.ids.resources_label.text = tr(T.GAME_RESOURCES, bank=GameState.get_current_side().bank)
+            self.ids.dice_label.text = tr(T.GAME_DICE, dice=GameState.get_current_dice())
+            self.update_forecast()
 
             self.update_buttons()
             self.update_army_status()
-        except Exception as e:
-            print(f"Error in update_display: {e}")
+        except Exception:
+            Logger.exception("GameScreen: ошибка в update_display")
+
+    def update_forecast(self):
+        """Совет считается в фоне по снимку стороны и целей, снятому здесь, в главном потоке"""
+        self.ids.forecast_label.text = ''
+        die = GameState.get_current_dice()
+        if not GameState.is_legal(Action.CHOOSE_ATTACK):
+            self.cancel_background('forecast')
+            return
 
-    def update_buttons(self):
-        try:
-            phase = GameState.current_phase
+        from forecast import current_targets, snapshot_side, stored_best_advice
+        self.run_in_background('forecast', stored_best_advice, snapshot_side(GameState.get_current_side()), die,
+                               current_targets(), on_result=self.show_forecast)
 
-            self.ids.roll_dice_button.disabled = (phase != GamePhase.CHOICE)
-            has_dice = GameState.current_dice > 0
-            self.ids.choose_attack_button.disabled = (phase != GamePhase.CHOICE or not has_dice)
-            self.ids.choose_bank_button.disabled = (phase != GamePhase.CHOICE or not has_dice)
+    def show_forecast(self, advice):
+        self.ids.forecast_label.text = advice_text(advice)
 
-            self.ids.move_button.disabled = (phase != GamePhase.MOVEMENT)
-            self.ids.attack_button.disabled = (phase != GamePhase.ATTACK)
-            self.ids.place_units_button.disabled = (phase != GamePhase.PLACEMENT)
-            self.ids.end_turn_button.disabled = (phase != GamePhase.COMPLETION)
+    def update_buttons(self):
+        try:
+            legal = GameState.legal_action_set()
+            # В сетевой игре чужой ход только наблюдаем
+            sync = App.get_running_app().sync
+            my_turn = sync is None or sync.can_act()
+            for button_id, action in self.ACTION_BUTTONS.items():
+                self.ids[button_id].disabled = not my_turn or action not in legal
 
-        except Exception as e:
-            print(f"Error in update_buttons: {e}")
+        except Exception:
+            Logger.exception("GameScreen: ошибка в update_buttons")
 
     def update_army_status(self):
         try:
@@ -127,199 +414,263 @@ class GameScreen(Screen):
             grid.clear_widgets()
 
             current_side = GameState.get_current_side()
-            for unit_name, unit_type in current_side.units.items():
-                if unit_name != 'Укреп':
-                    available = current_side.available.get(unit_name, 0)
-                    max_placement = current_side.max_placements.get(unit_name, 0)
+            for unit in COMBAT_UNITS:
+                available = current_side.available[unit]
+                max_placement = current_side.max_placements[unit]
 
-                    grid.add_widget(Label(text=unit_name, color=(1, 1, 1, 1), size_hint_y=None, height='30dp'))
-                    grid.add_widget(Label(text=str(available), color=(1, 1, 1, 1), size_hint_y=None, height='30dp'))
-                    grid.add_widget(Label(text='∞' if max_placement > 100 else str(max_placement),
-                                          color=(1, 1, 1, 1), size_hint_y=None, height='30dp'))
+                grid.add_widget(Factory.TextLabel(text=unit_text(unit), size_hint_y=None, height='30dp'))
+                grid.add_widget(Factory.TextLabel(text=str(available), size_hint_y=None, height='30dp'))
+                grid.add_widget(Factory.TextLabel(text='∞' if max_placement > 100 else str(max_placement),
+                                                  size_hint_y=None, height='30dp'))
 
-        except Exception as e:
-            print(f"Error in update_army_status: {e}")
+        except Exception:
+            Logger.exception("GameScreen: ошибка в update_army_status")
 
     def roll_dice(self):
         try:
-            if GameState.current_phase == GamePhase.CHOICE:
-                GameState.roll_dice()
+            if GameState.roll_dice():
                 self.update_display()
         except Exception as e:
-            self.show_message(f"Ошибка: {str(e)}")
+            show_message(tr(T.ERROR, error=error_text(e)))
 
     def choose_attack(self):
         try:
-            if GameState.current_phase == GamePhase.CHOICE and GameState.current_dice > 0:
-                GameState.choose_attack()
+            if GameState.choose_attack():
                 self.update_display()
         except Exception as e:
-            self.show_message(f"Ошибка: {str(e)}")
+            show_message(tr(T.ERROR, error=error_text(e)))
 
     def choose_bank(self):
         try:
-            if GameState.current_phase == GamePhase.CHOICE and GameState.current_dice > 0:
-                GameState.choose_bank()
+            if GameState.choose_bank():
                 self.update_display()
         except Exception as e:
-            self.show_message(f"Ошибка: {str(e)}")
+            show_message(tr(T.ERROR, error=error_text(e)))
 
     def end_turn(self):
         try:
-            if GameState.current_phase == GamePhase.COMPLETION:
-                GameState.end_turn()
+            if GameState.end_turn():
                 self.update_display()
         except Exception as e:
-            self.show_message(f"Ошибка: {str(e)}")
+            show_message(tr(T.ERROR, error=error_text(e)))
+
+    def skip_attack(self):
+        if GameState.skip_attack():
+            self.update_display()
 
     def show_move_dialog(self):
-        if GameState.current_phase == GamePhase.MOVEMENT:
-            self.show_message("Режим перемещения: выберите юнит и провинцию для перемещения")
+        if GameState.is_legal(Action.MOVE):
+            self.show_move_selection()
+
+    def show_move_selection(self):
+        popup = Dialog(title=tr(T.MOVE_TITLE), size_hint=(0.9, 0.8))
+
+        current_side = GameState.get_current_side()
+        # (юнит, откуда, спиннер куда, спиннер сколько) для каждого стека
+        rows = []
+
+        for province_name in current_side.provinces:
+            province = GameState._provinces[province_name]
+            for unit, count in province.units.items():
+                targets = GameState.reachable_provinces(unit, province_name)
+                if not targets or count <= 0:
+                    continue
+
+                row = popup.add(Factory.DialogRow())
+                row.add_widget(Factory.TextLabel(text=f"{province_name}: {unit_text(unit)} x{count}"))
+                target_spinner = Factory.Spinner(text='—', values=['—'] + targets, size_hint_x=0.35)
+                count_spinner = Factory.Spinner(text='1', values=[str(i) for i in range(1, count + 1)], size_hint_x=0.2)
+                row.add_widget(target_spinner)
+                row.add_widget(count_spinner)
+                rows.append((unit, province_name, target_spinner, count_spinner))
+
+        if not rows:
+            popup.add_text(tr(T.MOVE_NONE))
+
+        def confirm_moves():
+            moves = [Move(unit, province_name, target.text, int(count.text))
+                     for unit, province_name, target, count in rows if target.text != '—']
+            errors = GameState.move_units(moves)
+            if errors:
+                show_message('\n'.join(tr(T.MOVE_ERROR, number=i + 1, message=error_text(error))
+                                        for i, error in errors))
+                return
+            popup.dismiss()
+            self.update_display()
+
+        popup.add_button(tr(T.MOVE_CONFIRM), lambda x: confirm_moves())
+        popup.add_button(tr(T.CANCEL), popup.dismiss)
+        popup.open()
 
     def show_attack_dialog(self):
-        if GameState.current_phase == GamePhase.ATTACK:
-            self.show_attack_units_selection()
+        if GameState.is_legal(Action.ATTACK):
+            self.show_attack_targets()
 
-    def show_attack_units_selection(self):
-        content = BoxLayout(orientation='vertical', spacing=10, padding=10)
-        popup = Popup(title='Выберите атакующие юниты (макс. 2)', content=content, size_hint=(0.8, 0.7))
+    def show_attack_targets(self):
+        popup = Dialog(title=tr(T.ATTACK_TITLE), size_hint=(0.9, 0.8))
+
+        threats = GameState.get_threat_map().threats()
+        for threat in threats:
+            btn_text = tr(T.ATTACK_TARGET, province=threat.province, attack=threat.attack_total,
+                          defence=threat.defence_total, forts=threat.forts)
+            popup.add_button(btn_text, lambda instance, p=threat.province: (popup.dismiss(),
+                                                                            self.show_attack_units_selection(p)))
+
+        if not threats:
+            popup.add_text(tr(T.ATTACK_NONE))
+
+        popup.add_button(tr(T.CANCEL), popup.dismiss)
+        popup.open()
+
+    def show_attack_units_selection(self, target):
+        popup = Dialog(title=tr(T.ATTACK_UNITS_TITLE, province=target), size_hint=(0.8, 0.7))
 
-        current_side = GameState.get_current_side()
         selected_units = []
-        buttons = {}
 
-        def toggle_unit(unit_name, button):
-            if unit_name in selected_units:
-                selected_units.remove(unit_name)
+        def toggle_unit(unit, button):
+            if unit in selected_units:
+                selected_units.remove(unit)
                 button.background_color = (0.2, 0.2, 0.2, 1)
             else:
                 if len(selected_units) < 2:
-                    selected_units.append(unit_name)
+                    selected_units.append(unit)
                     button.background_color = (0, 0.5, 0, 1)
 
-        for unit_name in current_side.units.keys():
-            if unit_name != 'Укреп' and current_side.available.get(unit_name, 0) > 0:
-                btn = Button(text=unit_name, size_hint_y=None, height='60dp')
-                btn.background_color = (0.2, 0.2, 0.2, 1)
-                buttons[unit_name] = btn
-                btn.bind(on_release=lambda instance, u=unit_name: toggle_unit(u, buttons[u]))
-                content.add_widget(btn)
+        for unit in GameState.get_threat_map().attackers_for(target):
+            popup.add_button(unit_text(unit), lambda instance, u=unit: toggle_unit(u, instance),
+                             background_color=(0.2, 0.2, 0.2, 1))
 
         def confirm_attack():
             if len(selected_units) > 0:
                 popup.dismiss()
-                self.execute_attack(selected_units)
+                self.execute_attack(target, selected_units)
             else:
-                self.show_message("Выберите хотя бы одного юнита для атаки")
+                show_message(tr(T.ATTACK_SELECT))
 
-        content.add_widget(Button(text='Атаковать', size_hint_y=None, height='60dp',
-                                  on_release=lambda x: confirm_attack()))
-        content.add_widget(Button(text='Отмена', size_hint_y=None, height='60dp',
-                                  on_release=popup.dismiss))
+        popup.add_button(tr(T.ATTACK_CONFIRM), lambda x: confirm_attack())
+        popup.add_button(tr(T.CANCEL), popup.dismiss)
         popup.open()
 
-    def execute_attack(self, attacker_units):
+    def execute_attack(self, target, attacker_units):
         try:
-            defender_units = ['Л. Пехота']
-
-            outcome, attack_total, defence_total, killed = calculate_battle(
-                attacker=GameState.get_current_side(),
-                defender=GameState.get_enemy_side(),
-                attacker_unit_names=attacker_units,
-                defender_unit_names=defender_units,
-                atk_die=GameState.current_dice,
-                def_die=0,
-                forts=0,
-                consume=True
-            )
-
-            result = f"Атака: {attack_total}, Защита: {defence_total}\n{outcome}"
-            if killed:
-                result += f"\nУничтожено: {', '.join(killed)}"
-
-            self.show_message(result)
-
-            GameState._current_phase = GamePhase.COMPLETION
+            report = GameState.attack_province(target, attacker_units)
+            show_message(battle_report_text(report))
             self.update_display()
 
         except Exception as e:
-            self.show_message(f"Ошибка атаки: {str(e)}")
+            show_message(tr(T.ATTACK_ERROR, error=error_text(e)))
 
     def show_placement_dialog(self):
-        if GameState.current_phase == GamePhase.PLACEMENT:
-            content = BoxLayout(orientation='vertical', spacing=10, padding=10)
-            popup = Popup(title='Размещение новых юнитов', content=content, size_hint=(0.8, 0.7))
+        if GameState.is_legal(Action.PLACE):
+            popup = Dialog(title=tr(T.PLACE_TITLE), size_hint=(0.8, 0.7))
 
             current_side = GameState.get_current_side()
-            has_available = False
+            spinners = {}
+
+            for unit in COMBAT_UNITS:
+                max_place = current_side.max_placements[unit]
+                cost = current_side.cost[unit]
+
+                if max_place > 0 and current_side.bank >= cost:
+                    row = popup.add(Factory.DialogRow())
+                    row.add_widget(Factory.TextLabel(text=tr(T.PLACE_ROW, unit=unit_text(unit), cost=cost,
+                                                             limit=max_place)))
+                    spinners[unit] = order_spinner(current_side, unit, size_hint_x=0.3)
+                    row.add_widget(spinners[unit])
+
+            # Пустой заказ — отказ от размещения, ход переходит к атаке
+            if not spinners:
+                popup.add_text(tr(T.PLACE_NONE))
+            popup.add_button(tr(T.PLACE_CONFIRM if spinners else T.PLACE_SKIP), lambda x: self.place_units(
+                {u: int(sp.text) for u, sp in spinners.items()}, popup))
+
+            popup.add_button(tr(T.CANCEL), popup.dismiss)
+            popup.open()
 
-            for unit_name, unit_type in current_side.units.items():
-                if unit_name != 'Укреп':
-                    max_place = current_side.max_placements.get(unit_name, 0)
-                    cost = unit_type.cost
+    def place_units(self, order, popup):
+        errors = GameState.place_units(order)
+        if errors:
+            show_message('\n'.join(error_text(error) for _, error in errors))
+            return
 
-                    if max_place > 0 and current_side.bank >= cost:
-                        has_available = True
-                        btn_text = f"{unit_name} (цена: {cost}, можно: {max_place})"
-                        btn = Button(text=btn_text, size_hint_y=None, height='60dp')
-                        btn.bind(on_release=lambda instance, u=unit_name: self.place_unit(u, popup))
-                        content.add_widget(btn)
+        popup.dismiss()
+        placed = ', '.join(f"{unit_text(unit)} x{count}" for unit, count in order.items() if count)
+        if placed:
+            show_message(tr(T.PLACE_DONE, units=placed))
+        self.update_display()
 
-            if not has_available:
-                content.add_widget(Label(text="Нет доступных юнитов для размещения", color=(1, 1, 1, 1)))
 
-            content.add_widget(Button(text='Отмена', size_hint_y=None, height='60dp', on_release=popup.dismiss))
-            popup.open()
+class BattleCalculatorScreen(BackgroundWork, Screen):
+    """Общая часть калькуляторов; разметка — kv/calculator.kv"""
+    title = StringProperty('')
 
-    def place_unit(self, unit_name, popup):
-        current_side = GameState.get_current_side()
-        unit_type = current_side.units[unit_name]
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.attacker_side = USSR
+        self.defender_side = GERMANY
+        self._unit_by_text = {}
 
-        if current_side.bank >= unit_type.cost and current_side.max_placements.get(unit_name, 0) > 0:
-            current_side.bank -= unit_type.cost
-            current_side.available[unit_name] = current_side.available.get(unit_name, 0) + 1
-            current_side.max_placements[unit_name] -= 1
+    def on_enter(self):
+        self.update_display()
+        super().on_enter()
+
+    def select_province(self, province_name):
+        """Укрепления и бонус местности берутся из выбранной провинции"""
+        derived = province_name in GameState._provinces
+        if derived:
+            forts, terrain_bonus = GameState.get_province_modifiers().battle_modifiers(province_name)
+            self.ids.forts.text = str(forts)
+            self.ids.terrain_bonus.text = str(terrain_bonus)
+        self.ids.forts.disabled = derived
+        self.ids.terrain_bonus.disabled = derived
 
-            popup.dismiss()
-            self.show_message(f"Размещен {unit_name}")
-            self.update_display()
+    def switch_sides(self):
+        self.attacker_side, self.defender_side = self.defender_side, self.attacker_side
+        self.update_display()
 
-    def show_message(self, message):
-        content = BoxLayout(orientation='vertical', spacing=10, padding=10)
-        popup = Popup(title='Информация', content=content, size_hint=(0.7, 0.4))
+    def show_sides(self):
+        self.ids.atk_side_label.text = tr(T.CALC_ATTACKER, side=side_text(self.attacker_side))
+        self.ids.def_side_label.text = tr(T.CALC_DEFENDER, side=side_text(self.defender_side))
 
-        content.add_widget(Label(text=message, color=(1, 1, 1, 1)))
-        content.add_widget(Button(text='OK', size_hint_y=None, height='50dp', on_release=popup.dismiss))
-        popup.open()
+    def set_unit_choices(self, attacker_units, defender_units):
+        """В списках видны переводы; обратно к индексам юнитов ведёт _unit_by_text. Возвращает списки переводов"""
+        self._unit_by_text = {unit_text(unit): unit for unit in attacker_units + defender_units}
+        attacker_texts = [unit_text(unit) for unit in attacker_units]
+        defender_texts = [unit_text(unit) for unit in defender_units]
+        self.ids.atk_unit1.values = attacker_texts
+        self.ids.atk_unit2.values = ['—'] + attacker_texts
+        self.ids.def_unit1.values = defender_texts
+        self.ids.def_unit2.values = ['—'] + defender_texts
+        return attacker_texts, defender_texts
 
+    def picked_units(self, *spinners):
+        return [self._unit_by_text[spinner.text] for spinner in spinners if spinner.text in self._unit_by_text]
 
-class DependentBattleCalculatorScreen(Screen):
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.attacker_side = 'СССР'
-        self.defender_side = 'Германия'
+    def show_odds(self, attacker_units, defender_units, forts, terrain_bonus):
+        """Шансы при случайных кубиках считаются в фоне и дописываются к результату"""
+        self.run_in_background('odds', battle_odds_text, self.attacker_side, self.defender_side,
+                               list(attacker_units), list(defender_units), forts, terrain_bonus,
+                               on_result=self.append_result)
+
+    def append_result(self, text):
+        self.ids.result_label.text += f"\n{text}"
 
-    def on_enter(self):
-        self.update_display()
 
+class DependentBattleCalculatorScreen(BattleCalculatorScreen):
     def update_display(self):
         # Очищаем и обновляем метки сторон
-        self.ids.atk_side_label.text = f"Атакующий: {self.attacker_side}"
-        self.ids.def_side_label.text = f"Защитник: {self.defender_side}"
+        self.show_sides()
 
         attacker_side_obj = GameState._sides[self.attacker_side]
         defender_side_obj = GameState._sides[self.defender_side]
 
-        attacker_units = [name for name in attacker_side_obj.units.keys() if
-                          name != 'Укреп' and attacker_side_obj.available.get(name, 0) > 0]
-        defender_units = [name for name in defender_side_obj.units.keys() if
-                          name != 'Укреп' and defender_side_obj.available.get(name, 0) > 0]
+        attacker_units = [unit for unit in COMBAT_UNITS if attacker_side_obj.available[unit] > 0]
+        defender_units = [unit for unit in COMBAT_UNITS if defender_side_obj.available[unit] > 0]
+
+        self.ids.province.values = ['—'] + list(GameState._provinces)
 
         # Обновляем списки юнитов
-        self.ids.atk_unit1.values = attacker_units
-        self.ids.atk_unit2.values = ['—'] + attacker_units
-        self.ids.def_unit1.values = defender_units
-        self.ids.def_unit2.values = ['—'] + defender_units
+        attacker_units, defender_units = self.set_unit_choices(attacker_units, defender_units)
 
         # Установим значения по умолчанию, если текущие значения не в списке
         if attacker_units and (self.ids.atk_unit1.text not in attacker_units or self.ids.atk_unit1.text == ''):
@@ -333,30 +684,26 @@ class DependentBattleCalculatorScreen(Screen):
         if self.ids.def_unit2.text not in (['—'] + defender_units):
             self.ids.def_unit2.text = '—'
 
-    def switch_sides(self):
-        self.attacker_side, self.defender_side = self.defender_side, self.attacker_side
-        self.update_display()
-
     def do_calc(self):
         try:
-            atk1 = self.ids.atk_unit1.text
-            atk2 = self.ids.atk_unit2.text if self.ids.atk_unit2.text != '—' else None
-            def1 = self.ids.def_unit1.text
-            def2 = self.ids.def_unit2.text if self.ids.def_unit2.text != '—' else None
-
             atk_die = int(self.ids.atk_dice.text)
             def_die = int(self.ids.def_dice.text)
-            forts = int(self.ids.forts.text)
-            terrain_bonus = int(self.ids.terrain_bonus.text)
+            if self.ids.province.text in GameState._provinces:
+                forts, terrain_bonus = GameState.get_province_modifiers().battle_modifiers(self.ids.province.text)
+            else:
+                forts = int(self.ids.forts.text)
+                terrain_bonus = int(self.ids.terrain_bonus.text)
 
             attacker_side_obj = GameState._sides[self.attacker_side]
             defender_side_obj = GameState._sides[self.defender_side]
+            attacker_units = self.picked_units(self.ids.atk_unit1, self.ids.atk_unit2)
+            defender_units = self.picked_units(self.ids.def_unit1, self.ids.def_unit2)
 
-            outcome, attack_total, defence_total, killed = calculate_battle(
+            report = calculate_battle(
                 attacker=attacker_side_obj,
                 defender=defender_side_obj,
-                attacker_unit_names=[n for n in (atk1, atk2) if n and n != '—'],
-                defender_unit_names=[n for n in (def1, def2) if n and n != '—'],
+                attacker_units=attacker_units,
+                defender_units=defender_units,
                 atk_die=atk_die,
                 def_die=def_die,
                 forts=forts,
@@ -364,833 +711,340 @@ class DependentBattleCalculatorScreen(Screen):
                 consume=True
             )
 
-            result = f"Атака: {attack_total}, Защита: {defence_total}\n{outcome}"
-            if killed:
-                result += f"\nУничтожено: {', '.join(killed)}"
-
-            self.ids.result_label.text = result
+            self.ids.result_label.text = battle_report_text(report)
+            self.show_odds(attacker_units, defender_units, forts, terrain_bonus)
             self.update_display()
 
         except Exception as e:
-            self.ids.result_label.text = f"Ошибка: {str(e)}"
-
-    def show_message(self, message):
-        content = BoxLayout(orientation='vertical', spacing=10, padding=10)
-        popup = Popup(title='Информация', content=content, size_hint=(0.7, 0.4))
-
-        content.add_widget(Label(text=message, color=(1, 1, 1, 1)))
-        content.add_widget(Button(text='OK', size_hint_y=None, height='50dp', on_release=popup.dismiss))
-        popup.open()
-
-
-class IndependentBattleCalculatorScreen(Screen):
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.attacker_side = 'СССР'
-        self.defender_side = 'Германия'
+            self.ids.result_label.text = tr(T.ERROR, error=error_text(e))
 
-    def on_enter(self):
-        self.update_display()
 
+class IndependentBattleCalculatorScreen(BattleCalculatorScreen):
     def update_display(self):
-        self.ids.atk_side_label.text = f"Атакующий: {self.attacker_side}"
-        self.ids.def_side_label.text = f"Защитник: {self.defender_side}"
-
-        from battle_logic import get_all_unit_types
-        all_units = get_all_unit_types()
+        self.show_sides()
 
-        attacker_units = [name for name in all_units[self.attacker_side].keys() if name != 'Укреп']
-        defender_units = [name for name in all_units[self.defender_side].keys() if name != 'Укреп']
+        self.ids.province.values = ['—'] + list(GameState._provinces)
 
-        self.ids.atk_unit1.values = attacker_units
-        self.ids.atk_unit2.values = ['—'] + attacker_units
-        self.ids.def_unit1.values = defender_units
-        self.ids.def_unit2.values = ['—'] + defender_units
-
-    def switch_sides(self):
-        self.attacker_side, self.defender_side = self.defender_side, self.attacker_side
-        self.update_display()
+        # Каталог у обеих сторон один: все боевые юниты
+        self.set_unit_choices(list(COMBAT_UNITS), list(COMBAT_UNITS))
 
     def do_calc(self):
         try:
-            atk1 = self.ids.atk_unit1.text
-            atk2 = self.ids.atk_unit2.text if self.ids.atk_unit2.text != '—' else None
-            def1 = self.ids.def_unit1.text
-            def2 = self.ids.def_unit2.text if self.ids.def_unit2.text != '—' else None
-
             atk_die = int(self.ids.atk_dice.text)
             def_die = int(self.ids.def_dice.text)
-            forts = int(self.ids.forts.text)
-            terrain_bonus = int(self.ids.terrain_bonus.text)
+            if self.ids.province.text in GameState._provinces:
+                forts, terrain_bonus = GameState.get_province_modifiers().battle_modifiers(self.ids.province.text)
+            else:
+                forts = int(self.ids.forts.text)
+                terrain_bonus = int(self.ids.terrain_bonus.text)
 
-            outcome, attack_total, defence_total, killed = independent_battle_calculation(
+            attacker_units = self.picked_units(self.ids.atk_unit1, self.ids.atk_unit2)
+            defender_units = self.picked_units(self.ids.def_unit1, self.ids.def_unit2)
+
+            report = independent_battle_calculation(
                 attacker_side=self.attacker_side,
                 defender_side=self.defender_side,
-                attacker_units=[n for n in (atk1, atk2) if n and n != '—'],
-                defender_units=[n for n in (def1, def2) if n and n != '—'],
+                attacker_units=attacker_units,
+                defender_units=defender_units,
                 atk_die=atk_die,
                 def_die=def_die,
                 forts=forts,
                 terrain_bonus=terrain_bonus
             )
 
-            result = f"Атака: {attack_total}, Защита: {defence_total}\n{outcome}"
-            if killed:
-                result += f"\nУничтожено: {', '.join(killed)}"
-
-            self.ids.result_label.text = result
+            self.ids.result_label.text = battle_report_text(report)
+            self.show_odds(attacker_units, defender_units, forts, terrain_bonus)
 
         except Exception as e:
-            self.ids.result_label.text = f"Ошибка: {str(e)}"
+            self.ids.result_label.text = tr(T.ERROR, error=error_text(e))
 
 
 class ShopScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.current_side = 'СССР'  # Начальная сторона по умолчанию
+        self.current_side = USSR  # Начальная сторона по умолчанию
 
     def on_enter(self):
         self.update_display()
 
     def switch_side(self):
         """Переключение между сторонами СССР и Германия"""
-        self.current_side = 'Германия' if self.current_side == 'СССР' else 'СССР'
+        self.current_side = opponent(self.current_side)
         self.update_display()
 
     def update_display(self):
         """Обновление отображения магазина для текущей стороны"""
         current_side_obj = GameState._sides[self.current_side]
-        self.ids.bank_label.text = f"{self.current_side}: Ресурсы: {current_side_obj.bank}"
-        self.ids.current_side_label.text = f"Текущая сторона: {self.current_side}"
+        self.ids.bank_label.text = tr(T.SHOP_BANK, side=side_text(self.current_side), bank=current_side_obj.bank)
+        self.ids.current_side_label.text = tr(T.SHOP_SIDE, side=side_text(self.current_side))
 
         # Очищаем и обновляем список доступных юнитов
         shop_grid = self.ids.shop_grid
         shop_grid.clear_widgets()
 
         # Заголовки
-        shop_grid.add_widget(Label(text='Юнит', color=(1, 1, 1, 1), size_hint_y=None, height='40dp', bold=True))
-        shop_grid.add_widget(Label(text='Цена', color=(1, 1, 1, 1), size_hint_y=None, height='40dp', bold=True))
-        shop_grid.add_widget(Label(text='Доступно', color=(1, 1, 1, 1), size_hint_y=None, height='40dp', bold=True))
-        shop_grid.add_widget(Label(text='Купить', color=(1, 1, 1, 1), size_hint_y=None, height='40dp', bold=True))
-
-        # Список юнитов для покупки для текущей стороны
-        for unit_name, unit_type in current_side_obj.units.items():
-            if unit_name != 'Укреп':
-                available = current_side_obj.max_placements.get(unit_name, 0)
-                cost = unit_type.cost
-
-                shop_grid.add_widget(Label(text=unit_name, color=(1, 1, 1, 1), size_hint_y=None, height='40dp'))
-                shop_grid.add_widget(Label(text=str(cost), color=(1, 1, 1, 1), size_hint_y=None, height='40dp'))
-                shop_grid.add_widget(Label(text=str(available), color=(1, 1, 1, 1), size_hint_y=None, height='40dp'))
-
-                buy_btn = Button(
-                    text='Купить',
-                    size_hint_y=None,
-                    height='40dp',
-                    disabled=(current_side_obj.bank < cost or available <= 0)
-                )
-                buy_btn.bind(on_release=lambda instance, u=unit_name: self.buy_unit(u))
-                shop_grid.add_widget(buy_btn)
+        for header in (T.SHOP_UNIT, T.SHOP_COST, T.SHOP_AVAILABLE, T.SHOP_COUNT):
+            shop_grid.add_widget(Factory.TextLabel(text=tr(header), size_hint_y=None, height='40dp', bold=True))
+
+        # Корзина: по спиннеру количества на юнит, покупка — одним заказом
+        self.order_spinners = {}
+        for unit in COMBAT_UNITS:
+            available = current_side_obj.max_placements[unit]
+            cost = current_side_obj.cost[unit]
+
+            shop_grid.add_widget(Factory.TextLabel(text=unit_text(unit), size_hint_y=None, height='40dp'))
+            shop_grid.add_widget(Factory.TextLabel(text=str(cost), size_hint_y=None, height='40dp'))
+            shop_grid.add_widget(Factory.TextLabel(text=str(available), size_hint_y=None, height='40dp'))
+
+            count_spinner = order_spinner(current_side_obj, unit)
+            count_spinner.bind(text=lambda instance, value: self.update_order_total())
+            self.order_spinners[unit] = count_spinner
+            shop_grid.add_widget(count_spinner)
+
+        self.update_order_total()
+
+    def get_order(self):
+        return {unit: int(spinner.text) for unit, spinner in self.order_spinners.items()}
+
+    def update_order_total(self):
+        """Пересчет суммы заказа без перестройки сетки"""
+        current_side_obj = GameState._sides[self.current_side]
+        total = current_side_obj.order_cost(self.get_order())
+        self.ids.order_total_label.text = tr(T.SHOP_ORDER, total=total, bank=current_side_obj.bank)
+        self.ids.checkout_button.disabled = total == 0 or total > current_side_obj.bank
 
     def add_resources(self):
         """Добавление ресурсов для текущей стороны"""
-        content = BoxLayout(orientation='vertical', spacing=10, padding=10)
-        popup = Popup(title=f'Добавить ресурсы для {self.current_side}', content=content, size_hint=(0.6, 0.4))
-
-        content.add_widget(Label(text='Выберите количество ресурсов:', color=(1, 1, 1, 1)))
+        popup = Dialog(title=tr(T.SHOP_ADD_TITLE, side=side_text(self.current_side)), size_hint=(0.6, 0.4))
 
-        spinner = Spinner(
-            text='10',
-            values=[str(i) for i in range(1, 25)],
-            size_hint_y=None,
-            height='40dp'
-        )
-        content.add_widget(spinner)
+        popup.add_text(tr(T.SHOP_ADD_PROMPT))
+        spinner = popup.add(Factory.FormSpinner(text='10', values=[str(i) for i in range(1, 25)]))
 
         def confirm_add():
             amount = int(spinner.text)
-            GameState._sides[self.current_side].bank += amount
+            GameState.add_resources(self.current_side, amount)
             popup.dismiss()
             self.update_display()
-            self.show_message(f"Добавлено {amount} ресурсов для {self.current_side}")
+            show_message(tr(T.SHOP_ADDED, amount=amount, side=side_text(self.current_side)))
 
-        content.add_widget(Button(text='Добавить', size_hint_y=None, height='40dp', on_release=lambda x: confirm_add()))
-        content.add_widget(Button(text='Отмена', size_hint_y=None, height='40dp', on_release=popup.dismiss))
+        popup.add_button(tr(T.SHOP_ADD_CONFIRM), lambda x: confirm_add(), height='40dp')
+        popup.add_button(tr(T.CANCEL), popup.dismiss, height='40dp')
         popup.open()
 
-    def buy_unit(self, unit_name):
-        """Покупка юнита для текущей стороны"""
-        current_side_obj = GameState._sides[self.current_side]
-        unit_type = current_side_obj.units[unit_name]
+    def checkout(self):
+        """Покупка всего заказа одной транзакцией"""
+        order = self.get_order()
+        errors = GameState.purchase_units(self.current_side, order)
+        if errors:
+            show_message('\n'.join(error_text(error) for _, error in errors))
+            return
 
-        if current_side_obj.bank >= unit_type.cost and current_side_obj.max_placements.get(unit_name, 0) > 0:
-            current_side_obj.bank -= unit_type.cost
-            current_side_obj.available[unit_name] = current_side_obj.available.get(unit_name, 0) + 1
-            current_side_obj.max_placements[unit_name] -= 1
+        bought = ', '.join(f"{unit_text(unit)} x{count}" for unit, count in order.items() if count)
+        self.update_display()
+        show_message(tr(T.SHOP_BOUGHT, side=side_text(self.current_side), units=bought))
 
-            self.update_display()
-            self.show_message(f"Куплен {unit_name} для {self.current_side}")
-        else:
-            self.show_message("Недостаточно ресурсов или достигнут лимит")
 
-    def show_message(self, message):
-        content = BoxLayout(orientation='vertical', spacing=10, padding=10)
-        popup = Popup(title='Информация', content=content, size_hint=(0.7, 0.4))
+class MapScreen(BackgroundWork, Screen):
+    """Экран карты; разметка — kv/map.kv"""
+    _scenario = None
 
-        content.add_widget(Label(text=message, color=(1, 1, 1, 1)))
-        content.add_widget(Button(text='OK', size_hint_y=None, height='50dp', on_release=popup.dismiss))
-        popup.open()
+    def on_enter(self):
+        GameState.add_listener(self._on_game_event)
+        self._load_layout()
+        super().on_enter()
+
+    def on_leave(self, *args):
+        GameState.remove_listener(self._on_game_event)
+        super().on_leave(*args)
+
+    def _load_layout(self):
+        scenario = GameState._scenario
+        if scenario is self._scenario:
+            self.ids.map_view.refresh()
+            return
+
+        def ready(layout):
+            # Уход с экрана отменяет расчет, поэтому сценарий запоминается только здесь
+            if GameState._scenario is scenario:
+                self._scenario = scenario
+                self.ids.map_view.set_layout(layout)
+
+        # На больших картах индекс строится заметное время — не в главном потоке
+        from map_layout import MapLayout
+        self.run_in_background('layout', MapLayout, scenario, on_result=ready)
+
+    def _on_game_event(self, event, data):
+        if event == 'new_game':
+            self._load_layout()
+        else:
+            self.ids.map_view.refresh()
 
 
-class StatusScreen(Screen):
+class ReportScreen(Screen):
+    """Экран-список строк; разметка — kv/reports.kv"""
+    title = StringProperty('')
+
     def on_enter(self):
-        self.update_status()
+        self.update_report()
+
+    def lines(self):
+        return []
 
-    def update_status(self):
-        grid = self.ids.status_grid
+    def update_report(self):
+        grid = self.ids.report_grid
         grid.clear_widgets()
 
-        for line in GameState.get_full_status():
-            label = Label(text=line, size_hint_y=None, height='30dp', color=(1, 1, 1, 1))
+        for line in self.lines():
+            label = Factory.TextLabel(text=line, size_hint_y=None, height='30dp')
             grid.add_widget(label)
 
 
-KV = '''
-ScreenManager:
-    SplashScreen:
-    StartingSetsScreen:
-    MainMenu:
-    GameScreen:
-    DependentBattleCalculatorScreen:
-    IndependentBattleCalculatorScreen:
-    ShopScreen:
-    StatusScreen:
-
-<SplashScreen>:
-    name: 'splash'
-    BoxLayout:
-        orientation: 'vertical'
-        Label:
-            text: 'ИГРА ДЕСЯТЫЙ СТАЛИНСКИЙ УДАР'
-            font_size: '32sp'
-            bold: True
-            color: 1, 1, 1, 1
-
-<StartingSetsScreen>:
-    name: 'starting_sets'
-    BoxLayout:
-        orientation: 'vertical'
-        padding: 20
-        spacing: 20
-        Label:
-            text: 'ВЫБОР СТАРТОВЫХ НАБОРОВ'
-            size_hint_y: None
-            height: '50dp'
-            color: 1, 1, 1, 1
-            font_size: '20sp'
-            bold: True
-
-        BoxLayout:
-            orientation: 'horizontal'
-            spacing: 20
-
-            # Германия
-            BoxLayout:
-                orientation: 'vertical'
-                spacing: 10
-                Label:
-                    text: 'ГЕРМАНИЯ'
-                    size_hint_y: None
-                    height: '40dp'
-                    color: 1, 1, 1, 1
-                    font_size: '18sp'
-                    bold: True
-
-                BoxLayout:
-                    orientation: 'horizontal'
-                    size_hint_y: None
-                    height: '40dp'
-                    Label:
-                        id: germany_set_label
-                        text: ''
-                        color: 1, 1, 1, 1
-                    Button:
-                        text: '<'
-                        size_hint_x: 0.2
-                        on_release: root.change_germany_set(-1)
-                    Button:
-                        text: '>'
-                        size_hint_x: 0.2
-                        on_release: root.change_germany_set(1)
-
-                BoxLayout:
-                    orientation: 'vertical'
-                    id: germany_composition
-                    size_hint_y: None
-                    height: self.minimum_height
-
-            # СССР
-            BoxLayout:
-                orientation: 'vertical'
-                spacing: 10
-                Label:
-                    text: 'СССР'
-                    size_hint_y: None
-                    height: '40dp'
-                    color: 1, 1, 1, 1
-                    font_size: '18sp'
-                    bold: True
-
-                BoxLayout:
-                    orientation: 'horizontal'
-                    size_hint_y: None
-                    height: '40dp'
-                    Label:
-                        id: ussr_set_label
-                        text: ''
-                        color: 1, 1, 1, 1
-                    Button:
-                        text: '<'
-                        size_hint_x: 0.2
-                        on_release: root.change_ussr_set(-1)
-                    Button:
-                        text: '>'
-                        size_hint_x: 0.2
-                        on_release: root.change_ussr_set(1)
-
-                BoxLayout:
-                    orientation: 'vertical'
-                    id: ussr_composition
-                    size_hint_y: None
-                    height: self.minimum_height
-
-        Button:
-            text: 'Начать игру'
-            size_hint_y: None
-            height: '60dp'
-            on_release: root.confirm_starting_sets()
-
-<MainMenu>:
-    name: 'menu'
-    BoxLayout:
-        orientation: 'vertical'
-        padding: 20
-        spacing: 15
-        Label:
-            text: 'НАСТОЛЬНАЯ ВОЕННАЯ ИГРА'
-            size_hint_y: None
-            height: '60dp'
-            bold: True
-            color: 1, 1, 1, 1
-            font_size: '24sp'
-        Button:
-            text: 'Калькулятор боя (Независимый)'
-            size_hint_y: None
-            height: '60dp'
-            on_release: app.root.current = 'indep_calc'
-        Button:
-            text: 'Калькулятор боя'
-            size_hint_y: None
-            height: '60dp'
-            on_release: app.root.current = 'dep_calc'
-        Button:
-            text: 'Магазин'
-            size_hint_y: None
-            height: '60dp'
-            on_release: app.root.current = 'shop'
-        Button:
-            text: 'Статус игры'
-            size_hint_y: None
-            height: '60dp'
-            on_release: app.root.current = 'status'
-        Button:
-            text: 'Начать заново'
-            size_hint_y: None
-            height: '60dp'
-            on_release: root.restart_game()
-        Button:
-            text: 'Выход'
-            size_hint_y: None
-            height: '60dp'
-            on_release: app.stop()
-
-<GameScreen>:
-    name: 'game'
-    BoxLayout:
-        orientation: 'vertical'
-        padding: 15
-        spacing: 10
-
-        Label:
-            id: current_player
-            text: ''
-            size_hint_y: None
-            height: '40dp'
-            color: 1, 1, 1, 1
-            font_size: '18sp'
-        Label:
-            id: phase_label
-            text: ''
-            size_hint_y: None
-            height: '40dp'
-            color: 1, 1, 1, 1
-            font_size: '18sp'
-        Label:
-            id: resources_label
-            text: 'Ресурсы:'
-            size_hint_y: None
-            height: '40dp'
-            color: 1, 1, 1, 1
-            font_size: '18sp'
-        Label:
-            id: dice_label
-            text: ''
-            size_hint_y: None
-            height: '40dp'
-            color: 1, 1, 1, 1
-            font_size: '18sp'
-
-        BoxLayout:
-            size_hint_y: None
-            height: '60dp'
-            spacing: 5
-            Button:
-                id: roll_dice_button
-                text: 'Бросить кубик'
-                on_release: root.roll_dice()
-            Button:
-                id: choose_attack_button
-                text: 'Выбрать атаку'
-                on_release: root.choose_attack()
-            Button:
-                id: choose_bank_button
-                text: 'Положить в банк'
-                on_release: root.choose_bank()
-
-        BoxLayout:
-            size_hint_y: None
-            height: '60dp'
-            spacing: 5
-            Button:
-                id: move_button
-                text: 'Перемещение'
-                on_release: root.show_move_dialog()
-            Button:
-                id: attack_button
-                text: 'Атака'
-                on_release: root.show_attack_dialog()
-            Button:
-                id: place_units_button
-                text: 'Размещение'
-                on_release: root.show_placement_dialog()
-
-        BoxLayout:
-            size_hint_y: None
-            height: '60dp'
-            Button:
-                id: end_turn_button
-                text: 'Завершить ход'
-                on_release: root.end_turn()
-
-        Label:
-            text: 'ВАША АРМИЯ:'
-            size_hint_y: None
-            height: '40dp'
-            color: 1, 1, 1, 1
-            font_size: '16sp'
-            bold: True
-
-        ScrollView:
-            size_hint_y: 1
-            GridLayout:
-                id: army_grid
-                cols: 3
-                size_hint_y: None
-                height: self.minimum_height
-                spacing: 5
-
-        BoxLayout:
-            size_hint_y: None
-            height: '60dp'
-            Button:
-                text: 'Главное меню'
-                on_release: app.root.current = 'menu'
-
-<DependentBattleCalculatorScreen>:
-    name: 'dep_calc'
-    BoxLayout:
-        orientation: 'vertical'
-        padding: 15
-        spacing: 10
-
-        Label:
-            text: 'КАЛЬКУЛЯТОР БОЯ (ЗАВИСИМЫЙ)'
-            size_hint_y: None
-            height: '50dp'
-            color: 1, 1, 1, 1
-            font_size: '20sp'
-            bold: True
-
-        BoxLayout:
-            orientation: 'horizontal'
-            size_hint_y: None
-            height: '40dp'
-            spacing: 10
-            Label:
-                id: atk_side_label
-                text: 'Атакующий: СССР'
-                color: 1, 1, 1, 1
-                font_size: '16sp'
-            Button:
-                text: 'поменять'
-                size_hint_x: 0.4
-                on_release: root.switch_sides()
-            Label:
-                id: def_side_label
-                text: 'Защитник: Германия'
-                color: 1, 1, 1, 1
-                font_size: '16sp'
-
-        GridLayout:
-            cols: 2
-            size_hint_y: None
-            height: '350dp'
-            spacing: 10
-            padding: 10
-
-            Label:
-                text: 'Атакующие юниты'
-                color: 1, 1, 1, 1
-            Label:
-                text: 'Защищающиеся юниты'
-                color: 1, 1, 1, 1
-
-            Spinner:
-                id: atk_unit1
-                text: 'Л. Пехота'
-                values: []
-                size_hint_y: None
-                height: '40dp'
-            Spinner:
-                id: def_unit1
-                text: 'Л. Пехота'
-                values: []
-                size_hint_y: None
-                height: '40dp'
-
-            Spinner:
-                id: atk_unit2
-                text: '—'
-                values: ['—']
-                size_hint_y: None
-                height: '40dp'
-            Spinner:
-                id: def_unit2
-                text: '—'
-                values: ['—']
-                size_hint_y: None
-                height: '40dp'
-
-            Label:
-                text: 'Кубик атакующего'
-                color: 1, 1, 1, 1
-            Label:
-                text: 'Кубик защитника'
-                color: 1, 1, 1, 1
-
-            Spinner:
-                id: atk_dice
-                text: '0'
-                values: [str(i) for i in range(0, 25)]
-                size_hint_y: None
-                height: '40dp'
-            Spinner:
-                id: def_dice
-                text: '0'
-                values: [str(i) for i in range(0, 25)]
-                size_hint_y: None
-                height: '40dp'
-
-            Label:
-                text: 'Укрепления'
-                color: 1, 1, 1, 1
-            Label:
-                text: 'Бонус местности'
-                color: 1, 1, 1, 1
-
-            Spinner:
-                id: forts
-                text: '0'
-                values: [str(i) for i in range(0, 25)]
-                size_hint_y: None
-                height: '40dp'
-            Spinner:
-                id: terrain_bonus
-                text: '0'
-                values: [str(i) for i in range(0, 25)]
-                size_hint_y: None
-                height: '40dp'
-
-        Label:
-            id: result_label
-            text: ''
-            size_hint_y: None
-            height: '100dp'
-            color: 0.9, 0.9, 0.8, 1
-            text_size: self.width, None
-
-        BoxLayout:
-            size_hint_y: None
-            height: '60dp'
-            spacing: 10
-            Button:
-                text: 'Рассчитать'
-                on_release: root.do_calc()
-            Button:
-                text: 'Назад'
-                on_release: app.root.current = 'menu'
-
-<IndependentBattleCalculatorScreen>:
-    name: 'indep_calc'
-    BoxLayout:
-        orientation: 'vertical'
-        padding: 15
-        spacing: 10
-
-        Label:
-            text: 'КАЛЬКУЛЯТОР БОЯ (НЕЗАВИСИМЫЙ)'
-            size_hint_y: None
-            height: '50dp'
-            color: 1, 1, 1, 1
-            font_size: '20sp'
-            bold: True
-
-        BoxLayout:
-            orientation: 'horizontal'
-            size_hint_y: None
-            height: '40dp'
-            spacing: 10
-            Label:
-                id: atk_side_label
-                text: 'Атакующий: СССР'
-                color: 1, 1, 1, 1
-                font_size: '16sp'
-            Button:
-                text: 'поменять'
-                size_hint_x: 0.4
-                on_release: root.switch_sides()
-            Label:
-                id: def_side_label
-                text: 'Защитник: Германия'
-                color: 1, 1, 1, 1
-                font_size: '16sp'
-
-        GridLayout:
-            cols: 2
-            size_hint_y: None
-            height: '350dp'
-            spacing: 10
-            padding: 10
-
-            Label:
-                text: 'Атакующие юниты'
-                color: 1, 1, 1, 1
-            Label:
-                text: 'Защищающиеся юниты'
-                color: 1, 1, 1, 1
-
-            Spinner:
-                id: atk_unit1
-                text: 'Л. Пехота'
-                values: []
-                size_hint_y: None
-                height: '40dp'
-            Spinner:
-                id: def_unit1
-                text: 'Л. Пехота'
-                values: []
-                size_hint_y: None
-                height: '40dp'
-
-            Spinner:
-                id: atk_unit2
-                text: '—'
-                values: ['—']
-                size_hint_y: None
-                height: '40dp'
-            Spinner:
-                id: def_unit2
-                text: '—'
-                values: ['—']
-                size_hint_y: None
-                height: '40dp'
-
-            Label:
-                text: 'Кубик атакующего'
-                color: 1, 1, 1, 1
-            Label:
-                text: 'Кубик защитника'
-                color: 1, 1, 1, 1
-
-            Spinner:
-                id: atk_dice
-                text: '0'
-                values: [str(i) for i in range(0, 25)]
-                size_hint_y: None
-                height: '40dp'
-            Spinner:
-                id: def_dice
-                text: '0'
-                values: [str(i) for i in range(0, 25)]
-                size_hint_y: None
-                height: '40dp'
-
-            Label:
-                text: 'Укрепления'
-                color: 1, 1, 1, 1
-            Label:
-                text: 'Бонус местности'
-                color: 1, 1, 1, 1
-
-            Spinner:
-                id: forts
-                text: '0'
-                values: [str(i) for i in range(0, 25)]
-                size_hint_y: None
-                height: '40dp'
-            Spinner:
-                id: terrain_bonus
-                text: '0'
-                values: [str(i) for i in range(0, 25)]
-                size_hint_y: None
-                height: '40dp'
-
-        Label:
-            id: result_label
-            text: ''
-            size_hint_y: None
-            height: '100dp'
-            color: 0.9, 0.9, 0.8, 1
-            text_size: self.width, None
-
-        BoxLayout:
-            size_hint_y: None
-            height: '60dp'
-            spacing: 10
-            Button:
-                text: 'Рассчитать'
-                on_release: root.do_calc()
-            Button:
-                text: 'Назад'
-                on_release: app.root.current = 'menu'
-
-<ShopScreen>:
-    name: 'shop'
-    BoxLayout:
-        orientation: 'vertical'
-        padding: 15
-        spacing: 10
-
-        Label:
-            text: 'МАГАЗИН'
-            size_hint_y: None
-            height: '50dp'
-            color: 1, 1, 1, 1
-            font_size: '20sp'
-            bold: True
-
-        BoxLayout:
-            orientation: 'horizontal'
-            size_hint_y: None
-            height: '40dp'
-            spacing: 10
-            Label:
-                id: current_side_label
-                text: 'Текущая сторона: СССР'
-                color: 1, 1, 1, 1
-                font_size: '16sp'
-            Button:
-                text: 'поменять'
-                size_hint_x: 0.4
-                on_release: root.switch_side()
-
-        Label:
-            id: bank_label
-            text: 'СССР: Ресурсы: 0'
-            size_hint_y: None
-            height: '40dp'
-            color: 1, 1, 1, 1
-            font_size: '18sp'
-
-        Button:
-            text: 'Добавить ресурсы'
-            size_hint_y: None
-            height: '60dp'
-            on_release: root.add_resources()
-
-        ScrollView:
-            GridLayout:
-                id: shop_grid
-                cols: 4
-                size_hint_y: None
-                height: self.minimum_height
-                spacing: 5
-
-        BoxLayout:
-            size_hint_y: None
-            height: '60dp'
-            Button:
-                text: 'Назад'
-                on_release: app.root.current = 'menu'
-
-<StatusScreen>:
-    name: 'status'
-    BoxLayout:
-        orientation: 'vertical'
-        padding: 15
-        spacing: 10
-        Label:
-            text: 'СТАТУС ИГРЫ'
-            size_hint_y: None
-            height: '50dp'
-            color: 1, 1, 1, 1
-            font_size: '20sp'
-            bold: True
-
-        ScrollView:
-            GridLayout:
-                id: status_grid
-                cols: 1
-                size_hint_y: None
-                height: self.minimum_height
-                spacing: 5
-
-        BoxLayout:
-            size_hint_y: None
-            height: '60dp'
-            spacing: 10
-            Button:
-                text: 'Обновить'
-                on_release: root.update_status()
-            Button:
-                text: 'Назад'
-                on_release: app.root.current = 'menu'
-'''
-
-ROOT = Builder.load_string(KV)
+class StatusScreen(ReportScreen):
+    def lines(self):
+        for side in GameState._sides:
+            yield f"=== {side_text(side.id)} ==="
+            yield tr(T.GAME_RESOURCES, bank=side.bank)
+            for unit, count in side.available.items():
+                if count > 0:
+                    yield tr(T.STATUS_UNIT, unit=unit_text(unit), count=count, limit=side.max_placements[unit])
+
+
+class StatsScreen(ReportScreen):
+    def lines(self):
+        from analytics import update_summary
+        return update_summary().lines()
+
+
+# Имя экрана -> (класс, файл разметки в kv/). Экран и его правила создаются при первом показе.
+SCREENS = {
+    'splash': (SplashScreen, 'splash.kv'),
+    'starting_sets': (StartingSetsScreen, 'starting_sets.kv'),
+    'menu': (MainMenu, 'menu.kv'),
+    'game': (GameScreen, 'game.kv'),
+    'dep_calc': (DependentBattleCalculatorScreen, 'calculator.kv'),
+    'indep_calc': (IndependentBattleCalculatorScreen, 'calculator.kv'),
+    'shop': (ShopScreen, 'shop.kv'),
+    'status': (StatusScreen, 'reports.kv'),
+    'map': (MapScreen, 'map.kv'),
+    'stats': (StatsScreen, 'reports.kv'),
+}
+
+
+class LazyScreenManager(ScreenManager):
+    def get_screen(self, name):
+        if name not in self.screen_names and name in SCREENS:
+            screen_class, kv_file = SCREENS[name]
+            load_kv(kv_file)
+            self.add_widget(screen_class(name=name))
+        return super().get_screen(name)
+
+    def has_screen(self, name):
+        return name in SCREENS or super().has_screen(name)
+
 
 class TabletopApp(App):
     icon = 'icon.jpg'
+    telemetry_overlay = None
+    sync = None
+    _sync_event = None
+    resumed = False
+
     def build(self):
         GameState.initialize()
+        import analytics
+        import autosave
+        analytics.set_default_dir(os.path.join(self.user_data_dir, 'games'))
+        # Кэш прогнозов: повторный совет в той же позиции не пересчитывается и после перезапуска
+        import result_store
+        result_store.set_default_path(os.path.join(self.user_data_dir, 'results.sqlite3'))
+        self.autosave = autosave.Autosave(os.path.join(self.user_data_dir, 'autosave'),
+                                          on_error=lambda e: Logger.warning(f"Autosave: {e!r}"))
+        self.resumed = self.autosave.recover()
+        self.autosave.start()
+        Clock.schedule_interval(lambda dt: self.autosave.poll(), autosave.DEFAULT_INTERVAL)
+        self.game_log = analytics.GameLogWriter()
+        GameState.add_listener(self.game_log)
+
+        # Окно создается при первом обращении к kivy.core.window, а не при импорте модуля
+        from kivy.core.window import Window
+        Window.clearcolor = (0.06, 0.09, 0.06, 1)
         Window.set_icon('icon.jpg')
-        return ROOT
+
+        Window.bind(on_keyboard=self.on_keyboard)
+
+        load_kv('common.kv')
+        root = LazyScreenManager()
+        root.current = 'splash'
+        return root
+
+    def on_stop(self):
+        self.stop_sync()
+        self.autosave.close()
+        get_executor().shutdown()
+
+    def on_pause(self):
+        # Из фона приложение могут закрыть без on_stop
+        self.autosave.flush()
+        return True
+
+    def start_sync(self, role, address=''):
+        import netsync
+        self.stop_sync()
+        local_side = USSR if role == 'host' else GERMANY
+        self.sync = netsync.SyncPeer(role, address if role == 'guest' else '0.0.0.0',
+                                     local_side=local_side, on_change=self.on_remote_change)
+        try:
+            self.sync.start()
+        except OSError as e:
+            self.sync = None
+            show_message(tr(T.NET_ERROR, error=e))
+            return
+        self._sync_event = Clock.schedule_interval(lambda dt: self.sync.poll(), 0.1)
+
+    def stop_sync(self):
+        if self.sync is not None:
+            self._sync_event.cancel()
+            self.sync.close()
+            self.sync = None
+
+    def on_remote_change(self):
+        # Ход соперника пришел через apply_delta без событий — автосохранение отмечается само
+        self.autosave.mark_dirty()
+        screen = self.root.current_screen
+        if hasattr(screen, 'update_display'):
+            screen.update_display()
 
     def on_start(self):
         # Устанавливаем заголовок окна
         from kivy.core.window import Window
-        Window.set_title('Десятый Сталинский Удар')
+        Window.set_title(tr(T.APP_TITLE))
+        # Запись с самого старта, чтобы поймать и первые показы экранов
+        if os.environ.get('STALINGAME_TELEMETRY'):
+            self.toggle_telemetry()
+
+    def on_keyboard(self, window, key, *args):
+        if key == 293:  # F12
+            self.toggle_telemetry()
+            return True
 
+    def toggle_telemetry(self):
+        from kivy.core.window import Window
+        if self.telemetry_overlay is None:
+            self.telemetry_overlay = TelemetryOverlay()
+            self.telemetry_overlay.attach(Window, self.root)
+        else:
+            self.telemetry_overlay.detach()
+            self.telemetry_overlay = None
+
+    def export_telemetry(self):
+        path = os.path.join(self.user_data_dir, 'telemetry', f"telemetry-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        from telemetry import get_recorder
+        try:
+            get_recorder().export(path)
+        except OSError as e:
+            show_message(tr(T.ERROR, error=e))
+            return
+        show_message(tr(T.TELEMETRY_SAVED, path=path))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,85 @@
+"""
+Геометрия карты для экрана карты: координаты провинций в мировых пикселях,
+ребра соседства и сеточный индекс для выборки видимого.
+
+Экран не перебирает все провинции: плитки и оверлеи спрашивают у индекса только
+свой прямоугольник, поэтому стоимость кадра зависит от видимой части, а не от
+размера карты. Индекс строится за один проход по провинциям и ребрам.
+"""
+from array import array
+from typing import Dict, Iterator, List, Tuple
+
+from tasks import checkpoint
+
+SPACING = 120.0       # мировых пикселей на единицу координат сценария
+RADIUS = 28.0         # радиус кружка провинции
+CELL = 4 * SPACING    # сторона ячейки индекса
+CHECK_EVERY = 512     # провинций между точками отмены при построении
+
+
+class MapLayout:
+    def __init__(self, scenario):
+        self.names = [name for name, _, _ in scenario.provinces]
+        self.terrains = [terrain for _, terrain, _ in scenario.provinces]
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.xs = array('d', (x * SPACING for x, _ in scenario.positions))
+        self.ys = array('d', (y * SPACING for _, y in scenario.positions))
+        margin = RADIUS * 2
+        self.bounds = (min(self.xs) - margin, min(self.ys) - margin,
+                       max(self.xs) + margin, max(self.ys) + margin)
+
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        for i in range(len(self.names)):
+            self._cells.setdefault(self._cell(self.xs[i], self.ys[i]), []).append(i)
+
+        # Ребро (i, j) при i < j хранится в ячейке провинции i; при выборке прямоугольник
+        # расширяется на длину самого длинного ребра, чтобы не потерять пересекающие его
+        self._edges: Dict[Tuple[int, int], List[int]] = {}
+        self.max_edge = 0.0
+        for n, (name, neighbours) in enumerate(scenario.adjacency.items()):
+            if n % CHECK_EVERY == 0:
+                checkpoint(n / len(scenario.adjacency))
+            i = self.index[name]
+            for neighbour in neighbours:
+                j = self.index[neighbour]
+                if i < j:
+                    self._edges.setdefault(self._cell(self.xs[i], self.ys[i]), []).extend((i, j))
+                    self.max_edge = max(self.max_edge, abs(self.xs[i] - self.xs[j]),
+                                        abs(self.ys[i] - self.ys[j]))
+
+    @staticmethod
+    def _cell(x: float, y: float) -> Tuple[int, int]:
+        return int(x // CELL), int(y // CELL)
+
+    def _cells_in(self, table, x0, y0, x1, y1) -> Iterator[List[int]]:
+        cx0, cy0 = self._cell(x0, y0)
+        cx1, cy1 = self._cell(x1, y1)
+        # На сильном отдалении ячеек в прямоугольнике больше, чем непустых — идем по непустым
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(table):
+            for (cx, cy), items in table.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                    yield items
+            return
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                items = table.get((cx, cy))
+                if items:
+                    yield items
+
+    def iter_query(self, x0: float, y0: float, x1: float, y1: float) -> Iterator[List[int]]:
+        """Провинции, кружки которых задевают прямоугольник, порциями по ячейкам индекса"""
+        x0 -= RADIUS
+        y0 -= RADIUS
+        x1 += RADIUS
+        y1 += RADIUS
+        xs, ys = self.xs, self.ys
+        for items in self._cells_in(self._cells, x0, y0, x1, y1):
+            yield [i for i in items if x0 <= xs[i] <= x1 and y0 <= ys[i] <= y1]
+
+    def query(self, x0: float, y0: float, x1: float, y1: float) -> List[int]:
+        return [i for items in self.iter_query(x0, y0, x1, y1) for i in items]
+
+    def iter_edges(self, x0: float, y0: float, x1: float, y1: float) -> Iterator[List[int]]:
+        """Ребра, которые могут пересекать прямоугольник, порциями [i, j, i, j, ...]"""
+        reach = self.max_edge
+        return self._cells_in(self._edges, x0 - reach, y0 - reach, x1 + reach, y1 + reach)
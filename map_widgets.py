@@ -0,0 +1,343 @@
+"""
+Виджеты экрана карты: MapView и его слой MapPlane.
+
+Модуль импортирует kv/map.kv (#:import), поэтому Fbo, Mesh, Scatter и остальная графика
+карты подгружаются при первом открытии экрана карты, а не при запуске приложения.
+"""
+import math
+import time
+from collections import OrderedDict
+
+from kivy.clock import Clock
+from kivy.core.text import Label as CoreLabel
+from kivy.graphics import (ClearBuffers, ClearColor, Color, Ellipse, Fbo, InstructionGroup, Line, Mesh, Point,
+                           Rectangle, Scale, Translate)
+from kivy.graphics.transformation import Matrix
+from kivy.uix.scatter import Scatter
+from kivy.uix.stencilview import StencilView
+
+from battle_logic import GameState
+from catalogue import GERMANY, USSR
+from i18n import T, tr
+from map_layout import RADIUS, SPACING
+
+OWNER_COLORS = {USSR: (0.85, 0.15, 0.12, 1), GERMANY: (0.55, 0.6, 0.65, 1), None: (0.75, 0.75, 0.7, 1)}
+TERRAIN_COLORS = {'город': (0.45, 0.42, 0.35, 1), 'равнина': (0.25, 0.38, 0.2, 1)}
+EDGE_COLOR = (0.6, 0.6, 0.5, 1)
+
+
+def _chunks(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class MapPlane(Scatter):
+    """Слой карты в мировых координатах: панорама и масштаб меняют только его матрицу"""
+    ZOOM_STEP = 1.15
+
+    def collide_point(self, x, y):
+        # Слой бесконечный, ловит касания в пределах MapView
+        return self.parent is not None and self.parent.collide_point(x, y)
+
+    def on_touch_down(self, touch):
+        if touch.is_mouse_scrolling and self.collide_point(*touch.pos):
+            if touch.button in ('scrolldown', 'scrollup'):
+                self.zoom_at(self.ZOOM_STEP if touch.button == 'scrolldown' else 1 / self.ZOOM_STEP, touch.pos)
+            return True
+        return super().on_touch_down(touch)
+
+    def zoom_at(self, factor, anchor):
+        factor = max(self.scale_min, min(self.scale_max, self.scale * factor)) / self.scale
+        self.apply_transform(Matrix().scale(factor, factor, factor), anchor=anchor)
+
+
+class MapView(StencilView):
+    """
+    Карта провинций; разметка — kv/map.kv.
+    Статичная часть (ребра, кружки местности, названия) рисуется плитками TILE_PX x TILE_PX
+    в Fbo и кэшируется. Уровень плиток — степень двойки масштаба, так что на экран
+    приходится ограниченное число плиток, сколько бы провинций ни было на карте.
+    Панорама и масштаб меняют только матрицу слоя. Новые плитки и оверлей строятся
+    заданиями-генераторами не дольше FRAME_BUDGET_MS за кадр; пока плитки уровня
+    не готовы, видны плитки прежнего уровня. Владельцы и стеки — оверлей видимых
+    провинций: он строится заново при выходе за запас вокруг экрана или когда
+    у видимой провинции сменился хэш.
+    """
+    TILE_PX = 256
+    MAX_TILES = 96
+    MIN_LEVEL, MAX_LEVEL = -8, 2
+    FRAME_BUDGET_MS = 6
+    STEP = 2048
+    MAX_OVERLAYS = 1500
+    NAME_MIN_PX = 14
+    COUNT_MIN_PX = 10
+    EDGE_MIN_PX = 4
+    MESH_VERTICES = 16384
+    POINTS_PER_INSTRUCTION = 8192
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.layout = None
+        self.plane = MapPlane(do_rotation=False, auto_bring_to_front=False, size_hint=(None, None),
+                              scale_min=2.0 ** self.MIN_LEVEL, scale_max=2.0 ** (self.MAX_LEVEL + 1))
+        self.add_widget(self.plane)
+        self._tiles = OrderedDict()
+        self._tile_group = InstructionGroup()
+        self._overlay_group = InstructionGroup()
+        self.plane.canvas.add(self._tile_group)
+        self.plane.canvas.add(self._overlay_group)
+        self._overlay_rect = None
+        self._overlay_level = None
+        self._overlay_hashes = {}
+        self._count_textures = {}
+        self._jobs = OrderedDict()
+        self._work_event = None
+        self._update = Clock.create_trigger(self._update_view)
+        self.plane.bind(transform=self._update)
+        self.bind(pos=self._update, size=self._update)
+
+    def set_layout(self, layout):
+        self.layout = layout
+        self._jobs.clear()
+        self._tiles.clear()
+        self._tile_group.clear()
+        self._overlay_group.clear()
+        self._overlay_rect = None
+        self.fit()
+
+    def fit(self):
+        """Вся карта в окне"""
+        if self.layout is None:
+            return
+        x0, y0, x1, y1 = self.layout.bounds
+        plane = self.plane
+        scale = max(plane.scale_min, min(plane.scale_max, min(self.width / (x1 - x0), self.height / (y1 - y0))))
+        plane.transform = Matrix().translate(
+            self.center_x - (x0 + x1) / 2 * scale, self.center_y - (y0 + y1) / 2 * scale, 0).multiply(
+            Matrix().scale(scale, scale, scale))
+
+    def refresh(self):
+        """Позиция изменилась: оверлей перестраивается, если задело видимые провинции"""
+        if self._overlay_rect is not None:
+            self._start_job('check', self._check_job())
+
+    # Задания: генераторы, каждый next() — порция работы не больше STEP элементов
+
+    def _start_job(self, key, job):
+        self._jobs.pop(key, None)
+        self._jobs[key] = job
+        if self._work_event is None:
+            self._work_event = Clock.schedule_interval(self._work, 0)
+
+    def _work(self, dt):
+        deadline = time.perf_counter() + self.FRAME_BUDGET_MS / 1000
+        while self._jobs and time.perf_counter() < deadline:
+            key, job = next(iter(self._jobs.items()))
+            try:
+                next(job)
+            except StopIteration:
+                self._jobs.pop(key, None)
+        if not self._jobs:
+            self._work_event.cancel()
+            self._work_event = None
+
+    def _visible_rect(self):
+        x0, y0 = self.plane.to_local(self.x, self.y)
+        x1, y1 = self.plane.to_local(self.right, self.top)
+        return min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)
+
+    def _tile_rect(self, key):
+        level, tx, ty = key
+        world = self.TILE_PX / 2.0 ** level
+        return tx * world, ty * world, (tx + 1) * world, (ty + 1) * world
+
+    def _update_view(self, *args):
+        if self.layout is None:
+            return
+        level = max(self.MIN_LEVEL, min(self.MAX_LEVEL, math.floor(math.log2(self.plane.scale))))
+        x0, y0, x1, y1 = self._visible_rect()
+        bx0, by0, bx1, by1 = self.layout.bounds
+        world = self.TILE_PX / 2.0 ** level
+        wanted = [(level, tx, ty)
+                  for tx in range(math.floor(max(x0, bx0) / world), math.floor(min(x1, bx1) / world) + 1)
+                  for ty in range(math.floor(max(y0, by0) / world), math.floor(min(y1, by1) / world) + 1)]
+        missing = [key for key in wanted if key not in self._tiles]
+
+        for key in [key for key in self._jobs if isinstance(key, tuple) and key not in missing]:
+            del self._jobs[key]
+        for key in missing:
+            if key not in self._jobs:
+                self._start_job(key, self._tile_job(key))
+
+        self._tile_group.clear()
+        if missing:
+            # Пока плитки уровня строятся, под ними видны готовые плитки других уровней
+            for key, tile in self._tiles.items():
+                if key[0] != level:
+                    tx0, ty0, tx1, ty1 = self._tile_rect(key)
+                    if tx0 < x1 and x0 < tx1 and ty0 < y1 and y0 < ty1:
+                        self._tile_group.add(tile)
+        for key in wanted:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+                self._tile_group.add(tile)
+        while len(self._tiles) > max(self.MAX_TILES, len(wanted)):
+            self._tiles.popitem(last=False)
+
+        covered = self._overlay_rect
+        if (covered is None or level != self._overlay_level or
+                not (covered[0] <= x0 and covered[1] <= y0 and x1 <= covered[2] and y1 <= covered[3])):
+            # Запас в пол-экрана с каждой стороны: мелкая панорама оверлей не трогает
+            dx, dy = (x1 - x0) / 2, (y1 - y0) / 2
+            self._overlay_rect = (x0 - dx, y0 - dy, x1 + dx, y1 + dy)
+            self._overlay_level = level
+            self._start_job('overlay', self._overlay_job(self._overlay_rect, level))
+
+    def _tile_job(self, key):
+        layout = self.layout
+        xs, ys = layout.xs, layout.ys
+        level = key[0]
+        k = 2.0 ** level
+        x0, y0, x1, y1 = self._tile_rect(key)
+        radius_px = RADIUS * k
+
+        edges = []
+        if SPACING * k >= self.EDGE_MIN_PX:
+            for items in layout.iter_edges(x0, y0, x1, y1):
+                for i in items:
+                    edges.extend((xs[i], ys[i], 0, 0))
+                if len(edges) >= 4 * self.STEP:
+                    yield
+        by_terrain = {}
+        count = 0
+        for items in layout.iter_query(x0, y0, x1, y1):
+            for i in items:
+                by_terrain.setdefault(layout.terrains[i], []).append(i)
+            count += len(items)
+            if count >= self.STEP:
+                count = 0
+                yield
+        points = {}
+        if radius_px < 2:
+            for terrain, members in by_terrain.items():
+                vertices = points[terrain] = []
+                for n, i in enumerate(members):
+                    vertices.extend((xs[i], ys[i], 0, 0))
+                    if n % self.STEP == self.STEP - 1:
+                        yield
+
+        fbo = Fbo(size=(self.TILE_PX, self.TILE_PX))
+        with fbo:
+            ClearColor(0, 0, 0, 0)
+            ClearBuffers()
+            Scale(k, k, 1)
+            Translate(-x0, -y0, 0)
+            Color(*EDGE_COLOR)
+        # Индексы Mesh 16-битные, а сборка крупного Mesh — заметная доля кадра: по куску за шаг
+        for chunk in _chunks(edges, 4 * self.MESH_VERTICES):
+            fbo.add(Mesh(vertices=chunk, indices=list(range(len(chunk) // 4)), mode='lines'))
+            yield
+        segments = max(8, min(32, int(radius_px)))
+        for terrain, members in by_terrain.items():
+            fbo.add(Color(*TERRAIN_COLORS.get(terrain, EDGE_COLOR)))
+            if radius_px < 2:
+                for chunk in _chunks(points[terrain], 4 * self.MESH_VERTICES):
+                    fbo.add(Mesh(vertices=chunk, indices=list(range(len(chunk) // 4)), mode='points'))
+                    yield
+                continue
+            for i in members:
+                fbo.add(Ellipse(pos=(xs[i] - RADIUS, ys[i] - RADIUS), size=(2 * RADIUS, 2 * RADIUS),
+                                segments=segments))
+        if radius_px >= self.NAME_MIN_PX:
+            yield
+            with fbo:
+                Color(1, 1, 1, 1)
+                for members in by_terrain.values():
+                    for i in members:
+                        label = CoreLabel(text=layout.names[i], font_size=12)
+                        label.refresh()
+                        w, h = label.texture.size[0] / k, label.texture.size[1] / k
+                        Rectangle(texture=label.texture, pos=(xs[i] - w / 2, ys[i] - RADIUS - h - 4 / k),
+                                  size=(w, h))
+        fbo.draw()
+
+        # Fbo лежит в группе плитки: после потери GL-контекста он перерисуется сам
+        tile = InstructionGroup()
+        tile.add(fbo)
+        tile.add(Color(1, 1, 1, 1))
+        tile.add(Rectangle(texture=fbo.texture, pos=(x0, y0), size=(x1 - x0, y1 - y0)))
+        self._tiles[key] = tile
+        self._update()
+
+    def _count_texture(self, text):
+        texture = self._count_textures.get(text)
+        if texture is None:
+            label = CoreLabel(text=text, font_size=13, bold=True)
+            label.refresh()
+            texture = self._count_textures[text] = label.texture
+        return texture
+
+    def _overlay_job(self, rect, level):
+        layout = self.layout
+        provinces = GameState._provinces
+        hashes = GameState._province_hashes
+        xs, ys = layout.xs, layout.ys
+        visible = []
+        count = 0
+        for items in layout.iter_query(*rect):
+            visible.extend(items)
+            count += len(items)
+            if count >= self.STEP:
+                count = 0
+                yield
+        snapshot = {}
+        group = InstructionGroup()
+        k = 2.0 ** level
+
+        if len(visible) > self.MAX_OVERLAYS:
+            # Издалека — только цвет владельца точками, по инструкции на сторону
+            by_owner = {}
+            for n, i in enumerate(visible):
+                name = layout.names[i]
+                snapshot[i] = hashes.get(name)
+                by_owner.setdefault(provinces[name].owner, []).extend((xs[i], ys[i]))
+                if n % self.STEP == self.STEP - 1:
+                    yield
+            size = max(RADIUS * 0.7, 1 / k)
+            for owner, points in by_owner.items():
+                group.add(Color(*OWNER_COLORS.get(owner, OWNER_COLORS[None])))
+                for chunk in _chunks(points, 2 * self.POINTS_PER_INSTRUCTION):
+                    group.add(Point(points=chunk, pointsize=size))
+                    yield
+        else:
+            show_counts = RADIUS * k >= self.COUNT_MIN_PX
+            for n, i in enumerate(visible):
+                if n % 256 == 255:
+                    yield
+                province = provinces[layout.names[i]]
+                snapshot[i] = hashes.get(province.name)
+                group.add(Color(*OWNER_COLORS.get(province.owner, OWNER_COLORS[None])))
+                group.add(Line(circle=(xs[i], ys[i], RADIUS + 3), width=2.5))
+                units = sum(province.units.values())
+                if show_counts and (units or province.forts):
+                    texture = self._count_texture(f"{units}" + (tr(T.MAP_FORTS, forts=province.forts) if province.forts else ''))
+                    w, h = texture.size[0] / k, texture.size[1] / k
+                    group.add(Color(1, 1, 1, 1))
+                    group.add(Rectangle(texture=texture, pos=(xs[i] - w / 2, ys[i] - h / 2), size=(w, h)))
+
+        # Готовый оверлей подменяет прежний целиком, без кадра с пустой картой
+        self.plane.canvas.remove(self._overlay_group)
+        self.plane.canvas.add(group)
+        self._overlay_group = group
+        self._overlay_hashes = snapshot
+
+    def _check_job(self):
+        hashes = GameState._province_hashes
+        names = self.layout.names
+        for n, (i, h) in enumerate(list(self._overlay_hashes.items())):
+            if hashes.get(names[i]) != h:
+                self._start_job('overlay', self._overlay_job(self._overlay_rect, self._overlay_level))
+                return
+            if n % self.STEP == self.STEP - 1:
+                yield
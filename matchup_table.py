@@ -0,0 +1,130 @@
+"""
+Заранее посчитанная таблица шансов для независимого калькулятора.
+
+Таблица собирается командой `python -m tools.build_matchup_table` и кладется рядом
+с этим модулем (matchups.lut, попадает в APK через source.include_exts).
+На устройстве файл отображается в память, ответ — чтение двух байт по индексу, который
+строится из составов, укреплений и местности до всякого расчета сумм и без каталога юнитов.
+Исход одного боя с известными кубиками таблица не дает: суммы атаки и защиты нужны
+для отчета все равно, а compare() по ним дешевле чтения. Если файла нет, он собран под
+другие характеристики юнитов или запрос вне диапазона таблицы, dice_odds() возвращает
+None и калькулятор считает сам.
+
+Формат: заголовок HEADER, затем записи по RECORD_SIZE байт, одна на
+(направление, атакующие, защитники, укрепления, бонус местности): сколько из 36 бросков
+d6 x d6 дают подавляющую атаку и успешную атаку.
+"""
+import hashlib
+import mmap
+import os
+import struct
+from itertools import combinations_with_replacement
+from typing import List, Optional, Tuple
+
+from catalogue import COMBAT_UNITS, SIDE_COUNT, SIDE_NAMES, UNIT_COUNT, UNIT_NAMES
+
+MAGIC = b'STLT'
+VERSION = 2
+HEADER = struct.Struct('<4sH16s')
+
+MAX_FORTS = 3
+MAX_TERRAIN = 5
+MAX_DEFENDERS = 2
+
+RECORD_SIZE = 2
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'matchups.lut')
+
+# Составы: 1-2 атакующих и 0-2 защитников из боевых юнитов, без учета порядка
+ATTACKER_COMBOS = ([(i,) for i in COMBAT_UNITS] +
+                   list(combinations_with_replacement(COMBAT_UNITS, 2)))
+DEFENDER_COMBOS = [()] + ATTACKER_COMBOS
+ATTACKER_INDEX = {combo: i for i, combo in enumerate(ATTACKER_COMBOS)}
+DEFENDER_INDEX = {combo: i for i, combo in enumerate(DEFENDER_COMBOS)}
+
+
+def units_fingerprint(all_units) -> bytes:
+    """Отпечаток атак и защит всех юнитов (get_all_unit_types): таблица годится только для них"""
+    parts = [f"{SIDE_NAMES[side]}:{UNIT_NAMES[unit]}:{units[unit].attack}:{units[unit].defence}"
+             for side, units in enumerate(all_units) for unit in range(UNIT_COUNT)]
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).digest()[:16]
+
+
+def record_index(direction: int, attackers: int, defenders: int, forts: int, terrain: int) -> int:
+    return ((((direction * len(ATTACKER_COMBOS) + attackers) * len(DEFENDER_COMBOS) + defenders)
+             * (MAX_FORTS + 1) + forts) * (MAX_TERRAIN + 1) + terrain)
+
+
+RECORD_COUNT = record_index(SIDE_COUNT, 0, 0, 0, 0)
+
+
+class MatchupTable:
+    def __init__(self, path: str, fingerprint: bytes):
+        self._file = open(path, 'rb')
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise
+        try:
+            magic, version, table_fingerprint = HEADER.unpack_from(self._data, 0)
+        except struct.error:
+            self.close()
+            raise
+        self.valid = (magic == MAGIC and version == VERSION and table_fingerprint == fingerprint and
+                      len(self._data) == HEADER.size + RECORD_COUNT * RECORD_SIZE)
+
+    def _record_offset(self, attacker_side: int, defender_side: int, attacker_units: List[int],
+                       defender_units: List[int], forts: int, terrain: int) -> Optional[int]:
+        if (attacker_side == defender_side or attacker_side not in range(SIDE_COUNT) or
+                defender_side not in range(SIDE_COUNT)):
+            return None
+        attackers = ATTACKER_INDEX.get(_combo(attacker_units))
+        defenders = DEFENDER_INDEX.get(_combo(defender_units))
+        if attackers is None or defenders is None:
+            return None
+        if not (0 <= forts <= MAX_FORTS and 0 <= terrain <= MAX_TERRAIN):
+            return None
+        index = record_index(attacker_side, attackers, defenders, forts, terrain)
+        return HEADER.size + index * RECORD_SIZE
+
+    def dice_odds(self, attacker_side, defender_side, attacker_units, defender_units,
+                  forts: int, terrain: int) -> Optional[Tuple[int, int]]:
+        """(подавляющих, успешных) из 36 бросков d6 x d6 или None вне таблицы"""
+        if not self.valid:
+            return None
+        offset = self._record_offset(attacker_side, defender_side, attacker_units, defender_units, forts, terrain)
+        if offset is None:
+            return None
+        return self._data[offset], self._data[offset + 1]
+
+    def close(self):
+        self._data.close()
+        self._file.close()
+
+
+_table = None
+_table_loaded = False
+
+
+def get_table() -> Optional[MatchupTable]:
+    """Таблица из DEFAULT_PATH, открытая один раз; None, если ее нет или она устарела"""
+    global _table, _table_loaded
+    if not _table_loaded:
+        _table_loaded = True
+        from battle_logic import get_all_unit_types
+        try:
+            table = MatchupTable(DEFAULT_PATH, units_fingerprint(get_all_unit_types()))
+        except (OSError, ValueError, struct.error):
+            table = None
+        if table is not None and not table.valid:
+            # Устаревшая таблица не нужна: mmap и файл не должны жить до конца процесса
+            table.close()
+            table = None
+        _table = table
+    return _table
+
+
+def _combo(units: List[int]) -> tuple:
+    # Неверный индекс дает -1, такого состава в таблице нет
+    return tuple(sorted(unit if unit in range(UNIT_COUNT) else -1 for unit in units))
@@ -0,0 +1,130 @@
+"""
+Генератор допустимых ходов текущего игрока.
+
+generate_moves() лениво перечисляет все, что игрок может сделать прямо сейчас:
+действия выбираются по таблице правил (GameState.legal_actions), а варианты каждого
+действия строятся по готовым индексам — DistanceIndex для передвижения и ThreatMap
+для атак. Потребитель может остановиться на первом подходящем ходе, и остальные
+варианты не строятся. apply_move() выполняет ход через GameState.
+
+Ход — LegalMove(действие, аргументы):
+  - ROLL, CHOOSE_ATTACK, CHOOSE_BANK, SKIP_ATTACK, END_TURN — без аргументов;
+  - MOVE — пакет из одного Move; пустой пакет — отказ от передвижения;
+  - PLACE — заказ ((юнит, количество), ...) по порядку индексов юнитов; пустой — отказ;
+  - ATTACK — (цель, (юнит,) или (юнит, юнит)); пары неупорядочены, поэтому
+    (А, Б) и (Б, А) — один ход.
+"""
+from typing import Iterator, NamedTuple, Tuple
+
+from battle_logic import GameState
+from catalogue import UNIT_COUNT
+from movement import Move, reachable
+from rules import Action
+
+
+class LegalMove(NamedTuple):
+    action: Action
+    args: Tuple = ()
+
+
+_SIMPLE = {action: LegalMove(action) for action in
+           (Action.ROLL, Action.CHOOSE_ATTACK, Action.CHOOSE_BANK, Action.SKIP_ATTACK, Action.END_TURN)}
+_SKIP_MOVE = LegalMove(Action.MOVE, ())
+_SKIP_PLACE = LegalMove(Action.PLACE, ())
+
+
+def _movement_moves() -> Iterator[LegalMove]:
+    yield _SKIP_MOVE
+    side = GameState.get_current_side()
+    provinces = GameState._provinces
+    index = GameState._distance_index
+    for from_province in list(side.provinces):
+        units = provinces[from_province].units
+        # Куда дойти, зависит только от дальности — общий список для всех стеков провинции
+        targets_by_range = {}
+        for unit, count in list(units.items()):
+            unit_type = side.units[unit]
+            if unit_type.movement_range <= 0 or count <= 0:
+                continue
+            targets = targets_by_range.get(unit_type.movement_range)
+            if targets is None:
+                targets = reachable(side.id, from_province, unit_type.movement_range, provinces, index)
+                targets_by_range[unit_type.movement_range] = targets
+            for to_province in targets:
+                for moved in range(count, 0, -1):
+                    yield LegalMove(Action.MOVE, (Move(unit, from_province, to_province, moved),))
+
+
+def _orders(costs, limits, bank: int, start: int) -> Iterator[Tuple]:
+    """Непустые заказы из юнитов начиная с индекса start, которые укладываются в bank"""
+    for unit in range(start, UNIT_COUNT):
+        cost = costs[unit]
+        most = min(limits[unit], bank // cost) if cost else 0
+        for count in range(1, most + 1):
+            item = ((unit, count),)
+            yield item
+            for rest in _orders(costs, limits, bank - cost * count, unit + 1):
+                yield item + rest
+
+
+def _placement_moves() -> Iterator[LegalMove]:
+    yield _SKIP_PLACE
+    side = GameState.get_current_side()
+    for order in _orders(side.cost, side.max_placements.values(), side.bank, 0):
+        yield LegalMove(Action.PLACE, order)
+
+
+def _attack_moves() -> Iterator[LegalMove]:
+    side = GameState.get_current_side()
+    threat_map = GameState.get_threat_map()
+    for threat in threat_map.threats():
+        counts = threat_map.attacker_counts(threat.province)
+        # Кто-то из достающих может быть уже израсходован в боях
+        units = [unit for unit in range(UNIT_COUNT) if counts.get(unit) and side.available[unit] > 0]
+        for i, first in enumerate(units):
+            yield LegalMove(Action.ATTACK, (threat.province, (first,)))
+            # Только пары i <= j: симметричные перестановки не повторяются
+            if counts[first] >= 2:
+                yield LegalMove(Action.ATTACK, (threat.province, (first, first)))
+            for second in units[i + 1:]:
+                yield LegalMove(Action.ATTACK, (threat.province, (first, second)))
+
+
+_GENERATORS = {
+    Action.MOVE: _movement_moves,
+    Action.PLACE: _placement_moves,
+    Action.ATTACK: _attack_moves,
+}
+
+
+def generate_moves() -> Iterator[LegalMove]:
+    """Все допустимые сейчас ходы; перечисление ленивое"""
+    for action in GameState.legal_actions():
+        generator = _GENERATORS.get(action)
+        if generator is None:
+            yield _SIMPLE[action]
+        else:
+            yield from generator()
+
+
+def apply_move(move: LegalMove):
+    """Выполняет ход из generate_moves(); для ATTACK возвращает результат attack_province"""
+    action, args = move
+    if action is Action.ROLL:
+        return GameState.roll_dice()
+    if action is Action.CHOOSE_ATTACK:
+        return GameState.choose_attack()
+    if action is Action.CHOOSE_BANK:
+        return GameState.choose_bank()
+    if action is Action.MOVE:
+        return not GameState.move_units(list(args))
+    if action is Action.PLACE:
+        return not GameState.place_units(dict(args))
+    if action is Action.ATTACK:
+        target, attackers = args
+        return GameState.attack_province(target, list(attackers))
+    if action is Action.SKIP_ATTACK:
+        return GameState.skip_attack()
+    if action is Action.END_TURN:
+        return GameState.end_turn()
+    raise ValueError(f'Неизвестное действие: {action}')
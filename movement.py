@@ -0,0 +1,156 @@
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from errors import Error, GameError
+
+
+@dataclass
+class Move:
+    unit: int
+    from_province: str
+    to_province: str
+    count: int = 1
+
+
+class DistanceIndex:
+    """Заранее посчитанные расстояния между провинциями в пределах радиуса"""
+
+    def __init__(self, game_map: Dict[str, List[str]], radius: int):
+        self.game_map = game_map
+        self.radius = radius
+        # Для каждой провинции: {соседняя провинция: число шагов} не дальше radius
+        self._rows: Dict[str, Dict[str, int]] = {}
+        for name in game_map:
+            self._rows[name] = self._bfs(name, radius)
+
+    def _bfs(self, start: str, radius: int,
+             passable: Optional[Callable[[str], bool]] = None) -> Dict[str, int]:
+        dist = {start: 0}
+        queue = deque([start])
+        while queue:
+            current = queue.popleft()
+            d = dist[current]
+            if d >= radius:
+                continue
+            for neighbour in self.game_map.get(current, ()):
+                if neighbour in dist:
+                    continue
+                dist[neighbour] = d + 1
+                # Через непроходимую провинцию можно только зайти, но не пройти дальше
+                if passable is None or passable(neighbour):
+                    queue.append(neighbour)
+        return dist
+
+    def distance(self, from_province: str, to_province: str) -> Optional[int]:
+        """Число шагов между провинциями или None, если дальше радиуса индекса"""
+        row = self._rows.get(from_province)
+        if row is None:
+            return None
+        return row.get(to_province)
+
+    def within(self, from_province: str, max_distance: int) -> List[str]:
+        """Провинции в пределах max_distance шагов (без самой исходной)"""
+        row = self._rows.get(from_province, {})
+        return [name for name, d in row.items() if 0 < d <= max_distance]
+
+    def path_exists(self, from_province: str, to_province: str, max_distance: int,
+                    passable: Callable[[str], bool]) -> bool:
+        """Есть ли путь не длиннее max_distance через проходимые провинции"""
+        d = self.distance(from_province, to_province)
+        if d is None or d > max_distance:
+            return False
+        if d <= 1:
+            return True
+        return to_province in self._bfs(from_province, max_distance, passable)
+
+
+def validate_moves(side: int, moves: List[Move], provinces, units,
+                   index: DistanceIndex) -> List[Tuple[int, GameError]]:
+    """
+    Проверяет пакет ходов целиком; units — типы юнитов стороны по индексам.
+    Возвращает список (номер хода, GameError); пустой список — пакет корректен.
+    Все ходы пакета выполняются одновременно: юнит, пришедший в провинцию,
+    в этом же пакете дальше не идет.
+    """
+    errors = []
+    # Сколько юнитов каждого типа уже забрано из провинции предыдущими ходами пакета
+    taken: Dict[Tuple[str, int], int] = {}
+
+    def passable(name: str) -> bool:
+        return provinces[name].owner in (side, None)
+
+    for i, move in enumerate(moves):
+        source = provinces.get(move.from_province)
+        target = provinces.get(move.to_province)
+
+        if source is None:
+            errors.append((i, GameError(Error.UNKNOWN_PROVINCE, province=move.from_province)))
+            continue
+        if target is None:
+            errors.append((i, GameError(Error.UNKNOWN_PROVINCE, province=move.to_province)))
+            continue
+
+        if move.unit not in range(len(units)):
+            errors.append((i, GameError(Error.UNKNOWN_UNIT, unit=move.unit)))
+            continue
+        unit_type = units[move.unit]
+        if unit_type.movement_range <= 0:
+            errors.append((i, GameError(Error.UNIT_IMMOBILE, unit=move.unit)))
+            continue
+        if move.count < 1:
+            errors.append((i, GameError(Error.COUNT_NOT_POSITIVE)))
+            continue
+
+        if source.owner != side:
+            errors.append((i, GameError(Error.NOT_OWNED, province=move.from_province, side=side)))
+            continue
+        if move.from_province == move.to_province:
+            errors.append((i, GameError(Error.SAME_PROVINCE, province=move.from_province)))
+            continue
+        if not passable(move.to_province):
+            errors.append((i, GameError(Error.PROVINCE_OCCUPIED, province=move.to_province)))
+            continue
+
+        if not index.path_exists(move.from_province, move.to_province,
+                                 unit_type.movement_range, passable):
+            errors.append((i, GameError(Error.OUT_OF_MOVE_RANGE, province=move.to_province, unit=move.unit,
+                                        range=unit_type.movement_range)))
+            continue
+
+        key = (move.from_province, move.unit)
+        in_stack = source.units.get(move.unit, 0)
+        if taken.get(key, 0) + move.count > in_stack:
+            errors.append((i, GameError(Error.STACK_TOO_SMALL, province=move.from_province, unit=move.unit,
+                                        count=in_stack)))
+            continue
+        taken[key] = taken.get(key, 0) + move.count
+
+    return errors
+
+
+def reachable(side: int, from_province: str, movement_range: int, provinces,
+              index: DistanceIndex) -> List[str]:
+    """Куда юнит с такой дальностью дойдет из провинции: проверка пути как в validate_moves, без стеков"""
+    def passable(name: str) -> bool:
+        return provinces[name].owner in (side, None)
+
+    return [name for name in index.within(from_province, movement_range)
+            if passable(name) and index.path_exists(from_province, name, movement_range, passable)]
+
+
+def apply_moves(side, moves: List[Move], provinces):
+    """Применяет уже проверенный пакет ходов"""
+    for move in moves:
+        source = provinces[move.from_province]
+        target = provinces[move.to_province]
+
+        source.units[move.unit] -= move.count
+        if source.units[move.unit] == 0:
+            del source.units[move.unit]
+        target.units[move.unit] = target.units.get(move.unit, 0) + move.count
+
+        # Нейтральная провинция переходит к тому, кто в нее вошел
+        if target.owner is None:
+            target.owner = side.id
+            side.provinces.append(target.name)
@@ -0,0 +1,289 @@
+"""
+Игра вдвоем на двух устройствах в локальной сети.
+
+Каждое устройство ведет свою копию GameState. После каждого действия SyncPeer
+отправляет второму устройству только изменения (GameState.delta_since): несколько
+ячеек буфера стороны, затронутые провинции и ход — десятки байт, сколько бы провинций
+ни было на карте.
+
+Протокол — строки JSON по TCP:
+  hello    {seq, hash}              при каждом подключении с обеих сторон;
+  delta    {seq, base, hash, d}     действие: base — хэш позиции до, hash — после;
+  snapshot {seq, hash, d}           вся позиция, когда дельтами не восстановить;
+  resync   {}                       гость просит снимок.
+Номера seq общие для пары. Дельта применяется, только если ее seq следующий и base
+совпадает с текущей позицией; иначе это конфликт (оба сходили одновременно или
+копии разошлись). Хозяин (host) главный: при конфликте он рассылает свой снимок,
+гость просит снимок. После переподключения стороны обмениваются hello и досылают
+пропущенные дельты из журнала; если журнал уже не покрывает разрыв, хозяин шлет снимок.
+
+Сеть работает в отдельных потоках, а GameState меняется только в poll(), который
+вызывается из главного потока (в приложении — по таймеру Clock).
+"""
+import json
+import queue
+import socket
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from battle_logic import GameState
+
+DEFAULT_PORT = 50007
+LOG_SIZE = 512
+RECONNECT_DELAY = 1.0
+
+
+class SyncStats:
+    __slots__ = ('bytes_sent', 'bytes_received', 'deltas_sent', 'deltas_applied', 'snapshots',
+                 'conflicts', 'connects')
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class SyncPeer:
+    def __init__(self, role: str, host: str = '0.0.0.0', port: int = DEFAULT_PORT,
+                 local_side: Optional[int] = None, on_change: Optional[Callable] = None):
+        """
+        role — 'host' (слушает порт) или 'guest' (подключается к host:port и переподключается).
+        local_side — индекс стороны, за которую играют на этом устройстве; None — обе.
+        on_change() вызывается из poll() после применения чужих изменений.
+        """
+        if role not in ('host', 'guest'):
+            raise ValueError(f'Неизвестная роль: {role}')
+        self.role = role
+        self.address = (host, port)
+        self.local_side = local_side
+        self.on_change = on_change
+        self.seq = 0
+        self.stats = SyncStats()
+        self._log = deque(maxlen=LOG_SIZE)
+        self._baseline = None
+        self._baseline_digest = None
+        self._inbox = queue.Queue()
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._server = None
+
+    # Главный поток
+
+    def start(self):
+        self._baseline = GameState.baseline()
+        self._baseline_digest = GameState.position_digest()
+        GameState.add_listener(self._on_game_event)
+        target = self._serve if self.role == 'host' else self._connect_loop
+        threading.Thread(target=target, name=f'sync-{self.role}', daemon=True).start()
+
+    def close(self):
+        self._stopped.set()
+        GameState.remove_listener(self._on_game_event)
+        if self._sock is not None:
+            self._drop(self._sock)
+        if self._server is not None:
+            self._server.close()
+
+    @property
+    def connected(self) -> bool:
+        return self._sock is not None
+
+    def can_act(self) -> bool:
+        """Ходит ли сейчас сторона этого устройства"""
+        return self.local_side is None or GameState._current_player == self.local_side
+
+    def _on_game_event(self, event, data):
+        self.publish()
+
+    def publish(self):
+        """Отправляет изменения позиции с прошлой синхронизации; пустые изменения не шлются"""
+        delta = GameState.delta_since(self._baseline)
+        if not delta:
+            return
+        message = {'t': 'delta', 'seq': self.seq + 1, 'base': self._baseline_digest, 'd': delta,
+                   'hash': GameState.position_digest()}
+        self._commit(message)
+        self.stats.deltas_sent += 1
+        self._send(message)
+
+    def poll(self) -> int:
+        """Обрабатывает полученные сообщения; возвращает число примененных изменений"""
+        applied = 0
+        while True:
+            try:
+                message = self._inbox.get_nowait()
+            except queue.Empty:
+                break
+            kind = message.get('t')
+            if kind == 'connected':
+                self._send({'t': 'hello', 'seq': self.seq, 'hash': GameState.position_digest()})
+            elif kind == 'hello':
+                self._on_hello(message)
+            elif kind == 'delta':
+                applied += self._on_delta(message)
+            elif kind == 'snapshot':
+                self._apply(message)
+                self._log.clear()
+                self.stats.snapshots += 1
+                applied += 1
+            elif kind == 'resync' and self.role == 'host':
+                self._send_snapshot()
+        if applied and self.on_change is not None:
+            self.on_change()
+        return applied
+
+    def _commit(self, message: dict):
+        self.seq = message['seq']
+        self._log.append(message)
+        self._baseline = GameState.baseline()
+        self._baseline_digest = message['hash']
+
+    def _apply(self, message: dict):
+        GameState.apply_delta(message['d'])
+        self.seq = message['seq']
+        self._baseline = GameState.baseline()
+        self._baseline_digest = GameState.position_digest()
+        if self._baseline_digest != message['hash']:
+            self._conflict()
+
+    def _logged(self, seq: int) -> Optional[dict]:
+        if not self._log or seq < self._log[0]['seq'] or seq > self._log[-1]['seq']:
+            return None
+        return self._log[seq - self._log[0]['seq']]
+
+    def _on_hello(self, message: dict):
+        # Кто впереди, тот досылает; у отстающего hello ничего не делает
+        their_seq = message['seq']
+        if their_seq < self.seq:
+            first = self._logged(their_seq + 1)
+            if first is not None and first['base'] == message['hash']:
+                for seq in range(their_seq + 1, self.seq + 1):
+                    self._send(self._logged(seq))
+            else:
+                self._conflict()
+        elif their_seq == self.seq and message['hash'] != GameState.position_digest():
+            # В том числе новая пара с разными позициями: гость принимает позицию хозяина
+            self._conflict()
+
+    def _on_delta(self, message: dict) -> int:
+        seq = message['seq']
+        if seq <= self.seq:
+            logged = self._logged(seq)
+            if logged is not None and logged['hash'] != message['hash']:
+                self._conflict()
+            return 0
+        if seq > self.seq + 1:
+            # Пропуск: просим дослать с нашего номера
+            self._send({'t': 'hello', 'seq': self.seq, 'hash': GameState.position_digest()})
+            return 0
+        if message['base'] != GameState.position_digest():
+            self._conflict()
+            return 0
+        self._apply(message)
+        self._log.append(message)
+        self.stats.deltas_applied += 1
+        return 1
+
+    def _conflict(self):
+        self.stats.conflicts += 1
+        if self.role == 'host':
+            self._send_snapshot()
+        else:
+            self._send({'t': 'resync'})
+
+    def _send_snapshot(self):
+        # Снимок тоже получает номер: после него обе стороны продолжают с одного seq
+        message = {'t': 'snapshot', 'seq': self.seq + 1, 'd': GameState.delta_since(),
+                   'hash': GameState.position_digest()}
+        self.seq = message['seq']
+        self._log.clear()
+        self._baseline = GameState.baseline()
+        self._baseline_digest = message['hash']
+        self._send(message)
+
+    # Сетевые потоки
+
+    def _send(self, message: dict):
+        sock = self._sock
+        if sock is None:
+            return
+        data = (json.dumps(message, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        try:
+            with self._send_lock:
+                sock.sendall(data)
+            self.stats.bytes_sent += len(data)
+        except OSError:
+            self._drop(sock)
+
+    def _drop(self, sock):
+        if self._sock is sock:
+            self._sock = None
+        try:
+            # shutdown будит поток, читающий через makefile(): один close() сокет не закрывает
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+
+    def _read(self, sock):
+        self._sock = sock
+        self.stats.connects += 1
+        self._inbox.put({'t': 'connected'})
+        try:
+            for line in sock.makefile('rb'):
+                self.stats.bytes_received += len(line)
+                try:
+                    self._inbox.put(json.loads(line))
+                except ValueError:
+                    continue
+        except OSError:
+            pass
+        self._drop(sock)
+
+    def _serve(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(self.address)
+        server.listen(1)
+        self._server = server
+        while not self._stopped.is_set():
+            try:
+                sock, _ = server.accept()
+            except OSError:
+                break
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            # Новое подключение гостя заменяет старое
+            if self._sock is not None:
+                self._drop(self._sock)
+            threading.Thread(target=self._read, args=(sock,), name='sync-reader', daemon=True).start()
+
+    def _connect_loop(self):
+        while not self._stopped.is_set():
+            try:
+                sock = socket.create_connection(self.address, timeout=5)
+            except OSError:
+                time.sleep(RECONNECT_DELAY)
+                continue
+            sock.settimeout(None)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._read(sock)
+            if not self._stopped.is_set():
+                time.sleep(RECONNECT_DELAY)
+
+
+def local_address() -> str:
+    """Адрес устройства в локальной сети, который гость вводит для подключения"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        # Пакет не отправляется: connect() для UDP только выбирает интерфейс
+        sock.connect(('10.255.255.255', 1))
+        return sock.getsockname()[0]
+    except OSError:
+        return '127.0.0.1'
+    finally:
+        sock.close()
@@ -0,0 +1,158 @@
+"""
+Кэш результатов тяжелых расчетов на диске (SQLite).
+
+Каждая запись помечена отпечатком данных игры — хэшем каталога юнитов, карты
+и стартовых наборов. При открытии хранилища записи с чужим отпечатком удаляются,
+так что после правки get_all_unit_types старые таблицы не всплывут.
+Размер ограничен: сверх max_bytes удаляются давно не читанные записи.
+Через хранилище идут советы прогноза в приложении (forecast.stored_best_advice, файл
+в user_data_dir) и базовые таблицы tools.sweep.
+"""
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from dataclasses import asdict
+from functools import wraps
+from typing import Any, Callable, Optional
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+_MISSING = object()
+
+
+def content_fingerprint() -> str:
+    """
+    Хэш неизменных данных игры: юниты, местность и соседство провинций, стартовые наборы.
+    Берется из каталога и сценария напрямую — партия ради хэша не начинается.
+    """
+    from battle_logic import GameState, get_all_unit_types
+    from catalogue import SIDE_NAMES
+    import scenario
+
+    game_scenario = GameState._scenario or scenario.load()
+    data = {
+        'units': {SIDE_NAMES[side]: {unit.name: asdict(unit) for unit in units}
+                  for side, units in enumerate(get_all_unit_types())},
+        'terrain': {name: terrain for name, terrain, _ in game_scenario.provinces},
+        'map': game_scenario.adjacency,
+        'sets': game_scenario.starting_sets,
+    }
+    raw = json.dumps(data, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ResultStore:
+    def __init__(self, path: str, fingerprint: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.fingerprint = fingerprint or content_fingerprint()
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS results (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)')
+        # Данные игры поменялись — все посчитанное раньше недействительно
+        self._db.execute('DELETE FROM results WHERE fingerprint != ?', (self.fingerprint,))
+        self._db.commit()
+
+    @staticmethod
+    def make_key(*args, **kwargs) -> str:
+        raw = repr((args, sorted(kwargs.items())))
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        with self._lock:
+            row = self._db.execute('SELECT value FROM results WHERE namespace = ? AND key = ?',
+                                   (namespace, key)).fetchone()
+            if row is None:
+                return default
+            self._db.execute('UPDATE results SET last_used = ? WHERE namespace = ? AND key = ?',
+                             (time.time(), namespace, key))
+            self._db.commit()
+        return pickle.loads(row[0])
+
+    def put(self, namespace: str, key: str, value: Any):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)',
+                             (namespace, key, self.fingerprint, blob, len(blob), time.time()))
+            self._evict()
+            self._db.commit()
+
+    def get_or_compute(self, namespace: str, key: str, compute: Callable[[], Any]) -> Any:
+        value = self.get(namespace, key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(namespace, key, value)
+        return value
+
+    def _evict(self):
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute('SELECT namespace, key, size FROM results ORDER BY last_used').fetchall()
+        for namespace, key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._db.execute('DELETE FROM results WHERE namespace = ? AND key = ?', (namespace, key))
+            total -= size
+
+    def clear(self, namespace: Optional[str] = None):
+        with self._lock:
+            if namespace is None:
+                self._db.execute('DELETE FROM results')
+            else:
+                self._db.execute('DELETE FROM results WHERE namespace = ?', (namespace,))
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_default_path = os.environ.get('STALINGAME_RESULTS',
+                               os.path.join(os.path.expanduser('~'), '.stalingame', 'results.sqlite3'))
+_default_store = None
+
+
+def set_default_path(path: str):
+    """Куда класть кэш (на Android — в user_data_dir приложения)"""
+    global _default_path, _default_store
+    if _default_store is not None and _default_store.path != path:
+        _default_store.close()
+        _default_store = None
+    _default_path = path
+
+
+def get_store() -> ResultStore:
+    global _default_store
+    if _default_store is None:
+        _default_store = ResultStore(_default_path)
+    return _default_store
+
+
+def cached_result(namespace: str):
+    """Декоратор: результат функции хранится на диске по ее аргументам"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            store = get_store()
+            return store.get_or_compute(namespace, store.make_key(*args, **kwargs),
+                                        lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
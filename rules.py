@@ -0,0 +1,90 @@
+"""
+Правила очередности хода: какие действия разрешены в какой фазе и куда они ведут.
+
+Вся очередность задана одной таблицей TRANSITIONS. При импорте она компилируется
+в словари по ключу (фаза, выпал ли кубик), поэтому проверка действия и список
+разрешенных действий — один поиск в словаре без перебора и без выделения памяти.
+Этим пользуются и GameState, и кнопки GameScreen, и циклы симуляции.
+"""
+from enum import IntEnum
+from typing import Dict, FrozenSet, Tuple
+
+
+class GamePhase(IntEnum):
+    # Значения — номера, а не тексты: текст фаз и действий в i18n (PHASE_TEXTS, ACTION_TEXTS)
+    CHOICE = 0
+    MOVEMENT = 1
+    PLACEMENT = 2
+    ATTACK = 3
+    COMPLETION = 4
+
+
+class Action(IntEnum):
+    ROLL = 0
+    CHOOSE_ATTACK = 1
+    CHOOSE_BANK = 2
+    MOVE = 3
+    PLACE = 4
+    ATTACK = 5
+    SKIP_ATTACK = 6
+    END_TURN = 7
+
+
+# Фаза -> {действие: (следующая фаза, нужен ли выпавший кубик)}.
+# Пустой пакет ходов или пустой заказ — отказ от передвижения или размещения.
+# После «в банк» кубик обнулен, поэтому атаковать в этот ход нечем — остается только отказ.
+TRANSITIONS = {
+    GamePhase.CHOICE: {
+        Action.ROLL: (GamePhase.CHOICE, False),
+        Action.CHOOSE_ATTACK: (GamePhase.MOVEMENT, True),
+        Action.CHOOSE_BANK: (GamePhase.MOVEMENT, True),
+    },
+    GamePhase.MOVEMENT: {
+        Action.MOVE: (GamePhase.PLACEMENT, False),
+    },
+    GamePhase.PLACEMENT: {
+        Action.PLACE: (GamePhase.ATTACK, False),
+    },
+    GamePhase.ATTACK: {
+        Action.ATTACK: (GamePhase.COMPLETION, True),
+        Action.SKIP_ATTACK: (GamePhase.COMPLETION, False),
+    },
+    GamePhase.COMPLETION: {
+        Action.END_TURN: (GamePhase.CHOICE, False),
+    },
+}
+
+
+def _compile():
+    legal: Dict[Tuple[GamePhase, bool], Tuple[Action, ...]] = {}
+    legal_sets: Dict[Tuple[GamePhase, bool], FrozenSet[Action]] = {}
+    next_phases: Dict[Tuple[GamePhase, Action], GamePhase] = {}
+    for phase in GamePhase:
+        rules = TRANSITIONS.get(phase, {})
+        for has_dice in (False, True):
+            actions = tuple(action for action, (_, needs_dice) in rules.items() if has_dice or not needs_dice)
+            legal[phase, has_dice] = actions
+            legal_sets[phase, has_dice] = frozenset(actions)
+        for action, (next_phase, _) in rules.items():
+            next_phases[phase, action] = next_phase
+    return legal, legal_sets, next_phases
+
+
+_LEGAL, _LEGAL_SETS, _NEXT_PHASE = _compile()
+
+
+def legal_actions(phase: GamePhase, has_dice: bool) -> Tuple[Action, ...]:
+    return _LEGAL[phase, has_dice]
+
+
+def legal_action_set(phase: GamePhase, has_dice: bool) -> FrozenSet[Action]:
+    return _LEGAL_SETS[phase, has_dice]
+
+
+def is_legal(phase: GamePhase, has_dice: bool, action: Action) -> bool:
+    return action in _LEGAL_SETS[phase, has_dice]
+
+
+def next_phase(phase: GamePhase, action: Action) -> GamePhase:
+    """Фаза после действия; недопустимое действие — KeyError, проверяйте is_legal заранее"""
+    return _NEXT_PHASE[phase, action]
@@ -0,0 +1,335 @@
+"""
+Сценарии: карта провинций и стартовые наборы сторон.
+
+Исходник сценария пишется вручную в JSON:
+  {"name": ..., "provinces": [{"name", "terrain", "owner", "adjacent": [...], "pos": [x, y]}, ...],
+   "starting_sets": {сторона: [{"name", "units": {юнит: число}}, ...]}}
+Первая провинция стороны в списке — ее столица. Соседство задается в обе стороны:
+если Варшава граничит со Смоленском, Смоленск обязан перечислить Варшаву.
+Координаты pos для экрана карты (соседи — примерно в единице друг от друга) задаются
+у всех провинций или ни у одной; без них карта раскладывается auto_layout().
+
+validate() проверяет исходник за линейное время от числа провинций и границ:
+имена, местность, владельцев, симметричность соседства, связность карты и юниты
+стартовых наборов. Сборка — `python -m tools.build_scenario`: исходник проверяется
+и сохраняется в двоичном виде (.scn рядом с исходником), который игра читает без
+разбора JSON и без повторной проверки.
+
+Формат .scn: заголовок HEADER, затем
+  - строки UTF-8 через '\\0': имя сценария, местности, провинции, имена наборов;
+  - местность и владелец провинций — по байту (NO_OWNER — ничья);
+  - координаты провинций, пары float32;
+  - соседство в виде CSR: смещения (провинций + 1) и соседи, uint32;
+  - наборы: индекс стороны и число каждого юнита из UNIT_NAMES, uint16.
+В заголовке CRC32 исходника (устаревший .scn не читается) и CRC32 данных.
+"""
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from catalogue import SIDE_NAMES, UNIT_INDEX, UNIT_NAMES
+from terrain import TERRAIN_RULES
+
+MAGIC = b'STSC'
+VERSION = 2
+HEADER = struct.Struct('<4sHIIIIIII')
+NO_OWNER = 255
+MAX_REPORTED = 5
+
+SIDES = SIDE_NAMES
+SCENARIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scenarios')
+DEFAULT_SOURCE = os.path.join(SCENARIO_DIR, 'default.json')
+
+
+class Scenario(NamedTuple):
+    name: str
+    provinces: List[Tuple[str, str, Optional[str]]]  # (имя, местность, владелец) в порядке карты
+    adjacency: Dict[str, List[str]]
+    starting_sets: Dict[str, List[dict]]
+    positions: List[Tuple[float, float]]  # в порядке provinces
+
+
+def compiled_path(source_path: str) -> str:
+    return os.path.splitext(source_path)[0] + '.scn'
+
+
+def _names(items) -> str:
+    items = list(items)
+    shown = ', '.join(items[:MAX_REPORTED])
+    return shown + (f" и еще {len(items) - MAX_REPORTED}" if len(items) > MAX_REPORTED else '')
+
+
+def validate(source) -> List[str]:
+    """Ошибки исходника сценария; пустой список — сценарий корректен"""
+    provinces = source.get('provinces') if isinstance(source, dict) else None
+    if not isinstance(provinces, list) or not provinces:
+        return ['Нет списка провинций']
+    problems = []
+
+    index = {}
+    for i, province in enumerate(provinces):
+        name = province.get('name') if isinstance(province, dict) else None
+        if not isinstance(name, str) or not name or '\0' in name:
+            problems.append(f'Провинция №{i + 1}: нет имени')
+        elif name in index:
+            problems.append(f'{name}: имя повторяется')
+        else:
+            index[name] = i
+
+    # Граница i -> j хранится числом i * n + j: проверка обратной границы — один поиск в set
+    n = len(provinces)
+    edges = set()
+    neighbours = [[] for _ in range(n)]
+    owned = set()
+    positioned = any(isinstance(p, dict) and 'pos' in p for p in provinces)
+    for name, i in index.items():
+        province = provinces[i]
+        if positioned:
+            pos = province.get('pos')
+            if not (isinstance(pos, list) and len(pos) == 2 and
+                    all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in pos)):
+                problems.append(f'{name}: координаты pos должны быть парой чисел [x, y]')
+        if province.get('terrain') not in TERRAIN_RULES:
+            problems.append(f"{name}: неизвестная местность {province.get('terrain')!r}")
+        owner = province.get('owner')
+        if owner is not None and owner not in SIDES:
+            problems.append(f'{name}: неизвестный владелец {owner!r}')
+        owned.add(owner)
+        adjacent = province.get('adjacent', [])
+        if not isinstance(adjacent, list):
+            problems.append(f'{name}: соседи должны быть списком')
+            continue
+        for neighbour in adjacent:
+            j = index.get(neighbour) if isinstance(neighbour, str) else None
+            if j is None:
+                problems.append(f'{name}: неизвестный сосед {neighbour!r}')
+            elif j == i:
+                problems.append(f'{name}: граничит сама с собой')
+            elif i * n + j in edges:
+                problems.append(f'{name}: сосед {neighbour} указан дважды')
+            else:
+                edges.add(i * n + j)
+                neighbours[i].append(j)
+
+    for i in range(n):
+        for j in neighbours[i]:
+            if j * n + i not in edges:
+                problems.append(f"{provinces[i]['name']} граничит с {provinces[j]['name']}, "
+                                f"но {provinces[j]['name']} не граничит с {provinces[i]['name']}")
+
+    if index and not problems:
+        seen = bytearray(n)
+        seen[0] = 1
+        queue = deque([0])
+        while queue:
+            for j in neighbours[queue.popleft()]:
+                if not seen[j]:
+                    seen[j] = 1
+                    queue.append(j)
+        unreachable = [provinces[i]['name'] for i in range(n) if not seen[i]]
+        if unreachable:
+            problems.append(f"Из {provinces[0]['name']} не дойти до {len(unreachable)} провинций: "
+                            f"{_names(unreachable)}")
+
+    sets = source.get('starting_sets')
+    if not isinstance(sets, dict):
+        return problems + ['Нет стартовых наборов']
+    for side in SIDES:
+        if side not in owned:
+            problems.append(f'{side}: нет ни одной провинции для столицы')
+        if not sets.get(side):
+            problems.append(f'{side}: нет стартовых наборов')
+    for side, side_sets in sets.items():
+        if side not in SIDES:
+            problems.append(f'Стартовые наборы неизвестной стороны {side!r}')
+            continue
+        if not isinstance(side_sets, list):
+            problems.append(f'{side}: наборы должны быть списком')
+            continue
+        for k, starting_set in enumerate(side_sets):
+            if not isinstance(starting_set, dict):
+                problems.append(f'{side}, набор №{k + 1}: ожидается объект')
+                continue
+            title = f"{side}, набор {starting_set.get('name') or f'№{k + 1}'}"
+            if not isinstance(starting_set.get('name'), str) or '\0' in starting_set['name']:
+                problems.append(f'{title}: нет имени')
+            units = starting_set.get('units')
+            if not isinstance(units, dict):
+                problems.append(f'{title}: нет списка юнитов')
+                continue
+            for unit_name, count in units.items():
+                if unit_name not in UNIT_INDEX:
+                    problems.append(f'{title}: неизвестный юнит {unit_name!r}')
+                elif not isinstance(count, int) or not 0 <= count <= 0xFFFF:
+                    problems.append(f'{title}: неверное число {unit_name}: {count!r}')
+    return problems
+
+
+def from_source(source: dict) -> Scenario:
+    """Сценарий из проверенного исходника; ValueError со списком ошибок, если он некорректен"""
+    problems = validate(source)
+    if problems:
+        raise ValueError('\n'.join(problems[:MAX_REPORTED]) +
+                         (f'\n... всего ошибок: {len(problems)}' if len(problems) > MAX_REPORTED else ''))
+    provinces = [(p['name'], p['terrain'], p.get('owner')) for p in source['provinces']]
+    adjacency = {p['name']: list(p.get('adjacent', [])) for p in source['provinces']}
+    # Юниты наборов — в порядке UNIT_NAMES, как и после чтения .scn
+    starting_sets = {side: [{'name': s['name'],
+                             'units': {name: s['units'][name] for name in UNIT_NAMES if s['units'].get(name)}}
+                            for s in source['starting_sets'][side]]
+                     for side in SIDES}
+    if 'pos' in source['provinces'][0]:
+        positions = [(float(p['pos'][0]), float(p['pos'][1])) for p in source['provinces']]
+    else:
+        positions = auto_layout(provinces, adjacency)
+    return Scenario(source.get('name', ''), provinces, adjacency, starting_sets, positions)
+
+
+def auto_layout(provinces, adjacency) -> List[Tuple[float, float]]:
+    """Раскладка без координат: столбец — число шагов от первой провинции, в столбце по порядку обхода"""
+    names = [name for name, _, _ in provinces]
+    column = {names[0]: 0}
+    queue = deque([names[0]])
+    while queue:
+        current = queue.popleft()
+        for neighbour in adjacency.get(current, ()):
+            if neighbour not in column:
+                column[neighbour] = column[current] + 1
+                queue.append(neighbour)
+    heights = {}
+    rows = []
+    for name in names:
+        x = column.get(name, 0)
+        rows.append(heights.get(x, 0))
+        heights[x] = rows[-1] + 1
+    return [(float(column.get(name, 0)), row - (heights[column.get(name, 0)] - 1) / 2)
+            for name, row in zip(names, rows)]
+
+
+def read_source(path: str) -> dict:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _native(values: array) -> bytes:
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_native(typecode: str, data) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def compile_scenario(scenario: Scenario, source_crc: int = 0) -> bytes:
+    terrains = sorted({terrain for _, terrain, _ in scenario.provinces})
+    terrain_index = {terrain: i for i, terrain in enumerate(terrains)}
+    province_index = {name: i for i, (name, _, _) in enumerate(scenario.provinces)}
+    sets = [(side, s) for side in SIDES for s in scenario.starting_sets[side]]
+
+    strings = ([scenario.name] + terrains + [name for name, _, _ in scenario.provinces] +
+               [s['name'] for _, s in sets])
+    blob = '\0'.join(strings).encode('utf-8')
+    terrain = bytes(terrain_index[t] for _, t, _ in scenario.provinces)
+    owner = bytes(NO_OWNER if o is None else SIDES.index(o) for _, _, o in scenario.provinces)
+    positions = array('f', [v for xy in scenario.positions for v in xy])
+    offsets = array('I', [0])
+    targets = array('I')
+    for name, _, _ in scenario.provinces:
+        targets.extend(province_index[neighbour] for neighbour in scenario.adjacency.get(name, ()))
+        offsets.append(len(targets))
+    units = array('H')
+    for side, s in sets:
+        units.append(SIDES.index(side))
+        units.extend(s['units'].get(unit_name, 0) for unit_name in UNIT_NAMES)
+
+    payload = blob + terrain + owner + _native(positions) + _native(offsets) + _native(targets) + _native(units)
+    header = HEADER.pack(MAGIC, VERSION, source_crc, zlib.crc32(payload), len(terrains),
+                         len(scenario.provinces), len(targets), len(sets), len(blob))
+    return header + payload
+
+
+def write_compiled(scenario: Scenario, path: str, source_crc: int = 0) -> int:
+    data = compile_scenario(scenario, source_crc)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+def load_compiled(data: bytes, source_crc: Optional[int] = None) -> Scenario:
+    """Сценарий из .scn; ValueError, если файл поврежден, другой версии или собран из другого исходника"""
+    if len(data) < HEADER.size:
+        raise ValueError('Файл сценария обрезан')
+    (magic, version, file_source_crc, payload_crc, terrain_count, province_count,
+     edge_count, set_count, blob_size) = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Не файл сценария или другая версия формата')
+    if source_crc is not None and file_source_crc != source_crc:
+        raise ValueError('Сценарий собран из другой версии исходника')
+    payload = memoryview(data)[HEADER.size:]
+    record = 1 + len(UNIT_NAMES)
+    expected = (blob_size + 2 * province_count + 8 * province_count + 4 * (province_count + 1 + edge_count) +
+                2 * set_count * record)
+    if len(payload) != expected or zlib.crc32(payload) != payload_crc:
+        raise ValueError('Файл сценария поврежден')
+
+    strings = bytes(payload[:blob_size]).decode('utf-8').split('\0')
+    name = strings[0]
+    terrains = strings[1:1 + terrain_count]
+    names = strings[1 + terrain_count:1 + terrain_count + province_count]
+    set_names = strings[1 + terrain_count + province_count:]
+    pos = blob_size
+    terrain = payload[pos:pos + province_count]
+    owner = payload[pos + province_count:pos + 2 * province_count]
+    pos += 2 * province_count
+    coords = _from_native('f', payload[pos:pos + 8 * province_count])
+    pos += 8 * province_count
+    offsets = _from_native('I', payload[pos:pos + 4 * (province_count + 1)])
+    pos += 4 * (province_count + 1)
+    targets = _from_native('I', payload[pos:pos + 4 * edge_count])
+    pos += 4 * edge_count
+    units = _from_native('H', payload[pos:])
+
+    provinces = [(names[i], terrains[terrain[i]], None if owner[i] == NO_OWNER else SIDES[owner[i]])
+                 for i in range(province_count)]
+    adjacency = {names[i]: [names[j] for j in targets[offsets[i]:offsets[i + 1]]]
+                 for i in range(province_count)}
+    starting_sets = {side: [] for side in SIDES}
+    for k in range(set_count):
+        row = units[k * record:(k + 1) * record]
+        starting_sets[SIDES[row[0]]].append({
+            'name': set_names[k],
+            'units': {unit_name: count for unit_name, count in zip(UNIT_NAMES, row[1:]) if count},
+        })
+    positions = list(zip(coords[::2], coords[1::2]))
+    return Scenario(name, provinces, adjacency, starting_sets, positions)
+
+
+def source_crc(path: str) -> int:
+    with open(path, 'rb') as f:
+        return zlib.crc32(f.read())
+
+
+def load(source_path: str = DEFAULT_SOURCE) -> Scenario:
+    """
+    Сценарий для игры: собранный .scn рядом с исходником, если он есть и соответствует
+    исходнику, иначе исходник проверяется и разбирается на месте.
+    """
+    crc = source_crc(source_path)
+    try:
+        with open(compiled_path(source_path), 'rb') as f:
+            return load_compiled(f.read(), crc)
+    except (OSError, ValueError, struct.error):
+        return from_source(read_source(source_path))
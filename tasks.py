@@ -0,0 +1,162 @@
+"""
+Фоновые расчеты для экранов.
+
+TaskExecutor выполняет задачи на рабочих потоках (или процессах) и возвращает результат,
+ошибку и прогресс в главный поток через Clock.schedule_once, так что колбэки
+спокойно трогают виджеты. Kivy подгружается только при первой доставке колбэка,
+поэтому модуль можно использовать и из инструментов без UI (scheduler=...).
+
+Отмена кооперативная: задача вызывает checkpoint(), который сообщает прогресс
+и бросает TaskCancelled, если задачу отменили. Результат отмененной задачи
+никогда не доставляется. Задачи с одинаковым key вытесняют друг друга — повторное
+нажатие «Рассчитать» отменяет предыдущий расчет.
+"""
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+_local = threading.local()
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class Task:
+    def __init__(self, key: Optional[str], on_result, on_error, on_progress):
+        self.key = key
+        self.on_result = on_result
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.future = None
+        self._executor = None
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def checkpoint(self, progress: Optional[float] = None):
+        if self.cancelled:
+            raise TaskCancelled()
+        if progress is not None and self.on_progress is not None:
+            self._executor._deliver(self, self.on_progress, progress)
+
+
+def current_task() -> Optional[Task]:
+    return getattr(_local, 'task', None)
+
+
+def checkpoint(progress: Optional[float] = None):
+    """Точка отмены и отчета о прогрессе; вне задачи ничего не делает"""
+    task = current_task()
+    if task is not None:
+        task.checkpoint(progress)
+
+
+def _run(task: Task, func: Callable, args, kwargs):
+    _local.task = task
+    try:
+        task.checkpoint()
+        return func(*args, **kwargs)
+    finally:
+        _local.task = None
+
+
+def _kivy_scheduler(callback):
+    from kivy.clock import Clock
+    Clock.schedule_once(lambda dt: callback())
+
+
+class TaskExecutor:
+    def __init__(self, max_workers: int = 1, processes: bool = False, scheduler: Callable = None):
+        """
+        processes=True — пул процессов для тяжелого чистого Python: функция и аргументы
+        должны сериализоваться pickle, а прогресс и checkpoint() внутри задачи не работают.
+        scheduler(callback) переносит колбэк в главный поток; по умолчанию Clock.schedule_once.
+        """
+        self.processes = processes
+        self._pool = (ProcessPoolExecutor if processes else ThreadPoolExecutor)(max_workers=max_workers)
+        self._schedule = scheduler or _kivy_scheduler
+        self._lock = threading.Lock()
+        self._by_key: Dict[str, Task] = {}
+        self._running = set()
+
+    def submit(self, func: Callable, *args, key: Optional[str] = None, on_result: Callable = None,
+               on_error: Callable = None, on_progress: Callable = None, **kwargs) -> Task:
+        task = Task(key, on_result, on_error, on_progress)
+        task._executor = self
+        previous = None
+        with self._lock:
+            self._running.add(task)
+            if key is not None:
+                previous = self._by_key.get(key)
+                self._by_key[key] = task
+        # Отмена еще не начатой задачи сразу вызывает _finished, который берет тот же замок
+        if previous is not None:
+            previous.cancel()
+        if self.processes:
+            task.future = self._pool.submit(func, *args, **kwargs)
+        else:
+            task.future = self._pool.submit(_run, task, func, args, kwargs)
+        task.future.add_done_callback(lambda future: self._finished(task, future))
+        return task
+
+    def cancel(self, key: str):
+        with self._lock:
+            task = self._by_key.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    def is_busy(self, key: Optional[str] = None) -> bool:
+        with self._lock:
+            if key is not None:
+                return key in self._by_key
+            return bool(self._running)
+
+    def _finished(self, task: Task, future):
+        with self._lock:
+            self._running.discard(task)
+            if self._by_key.get(task.key) is task:
+                del self._by_key[task.key]
+        if task.cancelled or future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            self._deliver(task, task.on_result, future.result())
+        elif not isinstance(error, TaskCancelled):
+            self._deliver(task, task.on_error, error)
+
+    def _deliver(self, task: Task, callback: Optional[Callable], value):
+        if callback is None:
+            return
+
+        def deliver():
+            # Отмену могли запросить, пока колбэк ждал главного потока
+            if not task.cancelled:
+                callback(value)
+        self._schedule(deliver)
+
+    def shutdown(self):
+        with self._lock:
+            tasks = list(self._running)
+            self._by_key.clear()
+        for task in tasks:
+            task.cancel()
+        self._pool.shutdown(wait=False)
+
+
+_default_executor = None
+
+
+def get_executor() -> TaskExecutor:
+    """Общий исполнитель экранов: один рабочий поток, задачи идут по очереди"""
+    global _default_executor
+    if _default_executor is None:
+        _default_executor = TaskExecutor()
+    return _default_executor
@@ -0,0 +1,190 @@
+"""
+Телеметрия кадров: ищем, где и после чего подтормаживает интерфейс.
+
+Recorder хранит кольцевой буфер кадров: длительность кадра и отрисовки, размер дерева
+виджетов, кучу Python, паузы сборщика мусора за кадр, активный экран и последнее
+действие пользователя. Сам модуль от Kivy не зависит: кадры и размер дерева ему
+сообщает оверлей в main.py, паузы GC ловятся через gc.callbacks.
+Экспорт — один JSON со сводкой по экранам и сырыми кадрами; две выгрузки разных
+сборок сравнивает tools/telemetry_diff.py.
+"""
+import gc
+import json
+import os
+import platform
+import sys
+import time
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional
+
+EXPORT_VERSION = 1
+DEFAULT_CAPACITY = 6000
+# Кадр длиннее этого заметен глазом как рывок (два пропущенных кадра при 60 Гц)
+JANK_MS = 33.4
+
+
+class FrameSample(NamedTuple):
+    time: float
+    frame_ms: float
+    render_ms: float
+    gc_ms: float
+    widgets: int
+    heap_blocks: int
+    rss_kb: int
+    screen: str
+    action: str
+
+
+def rss_kb() -> int:
+    """Резидентная память процесса; /proc есть и на Linux, и на Android"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Recorder:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.samples = deque(maxlen=capacity)
+        self.screen = ''
+        self.action = ''
+        self.widgets = 0
+        self.heap_blocks = 0
+        self.rss_kb = 0
+        self.recording = False
+        self.started = 0.0
+        self._gc_start = None
+        self._gc_ms = 0.0
+
+    def start(self):
+        if self.recording:
+            return
+        self.recording = True
+        self.started = time.time()
+        self._gc_ms = 0.0
+        gc.callbacks.append(self._on_gc)
+        self.sample_memory()
+
+    def stop(self):
+        if not self.recording:
+            return
+        self.recording = False
+        gc.callbacks.remove(self._on_gc)
+
+    def clear(self):
+        self.samples.clear()
+
+    def _on_gc(self, phase: str, info: dict):
+        if phase == 'start':
+            self._gc_start = time.perf_counter()
+        elif self._gc_start is not None:
+            self._gc_ms += (time.perf_counter() - self._gc_start) * 1000
+            self._gc_start = None
+
+    def set_screen(self, name: str):
+        self.screen = name
+
+    def mark(self, action: str):
+        self.action = action
+
+    def set_widgets(self, count: int):
+        self.widgets = count
+
+    def sample_memory(self):
+        """Куча и RSS снимаются реже, чем кадры: чтение /proc не бесплатно"""
+        self.heap_blocks = sys.getallocatedblocks()
+        self.rss_kb = rss_kb()
+
+    def frame(self, frame_ms: float, render_ms: float = 0.0):
+        if not self.recording:
+            return
+        self.samples.append(FrameSample(time.time(), frame_ms, render_ms, self._gc_ms, self.widgets,
+                                        self.heap_blocks, self.rss_kb, self.screen, self.action))
+        self._gc_ms = 0.0
+
+    def recent(self, count: int = 60) -> List[FrameSample]:
+        start = max(0, len(self.samples) - count)
+        return [self.samples[i] for i in range(start, len(self.samples))]
+
+    def summary(self) -> Dict[str, dict]:
+        """Экран -> агрегаты его кадров"""
+        by_screen: Dict[str, List[FrameSample]] = {}
+        for sample in self.samples:
+            by_screen.setdefault(sample.screen, []).append(sample)
+        return {screen: summarize(samples) for screen, samples in by_screen.items()}
+
+    def export(self, path: str, build: Optional[str] = None) -> str:
+        """Пишет выгрузку атомарно: незаконченный файл не перепутать с готовым"""
+        data = {
+            'version': EXPORT_VERSION,
+            'meta': {
+                'build': build or os.environ.get('STALINGAME_BUILD', ''),
+                'started': self.started,
+                'exported': time.time(),
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+            },
+            'summary': self.summary(),
+            'fields': list(FrameSample._fields),
+            'samples': [list(sample) for sample in self.samples],
+        }
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return path
+
+
+def summarize(samples: List[FrameSample]) -> dict:
+    frames = sorted(sample.frame_ms for sample in samples)
+    renders = sorted(sample.render_ms for sample in samples)
+    janky = [sample for sample in samples if sample.frame_ms > JANK_MS]
+    actions = {}
+    for sample in janky:
+        actions[sample.action] = actions.get(sample.action, 0) + 1
+    return {
+        'frames': len(samples),
+        'frame_p50': percentile(frames, 0.5),
+        'frame_p95': percentile(frames, 0.95),
+        'frame_max': frames[-1] if frames else 0.0,
+        'render_p95': percentile(renders, 0.95),
+        'janky': len(janky),
+        'gc_ms': sum(sample.gc_ms for sample in samples),
+        'widgets_max': max((sample.widgets for sample in samples), default=0),
+        'heap_blocks_max': max((sample.heap_blocks for sample in samples), default=0),
+        'rss_kb_max': max((sample.rss_kb for sample in samples), default=0),
+        # После каких действий случались рывки
+        'janky_actions': dict(sorted(actions.items(), key=lambda item: -item[1])),
+    }
+
+
+def load_export(path: str) -> dict:
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('version') != EXPORT_VERSION:
+        raise ValueError(f'{path}: неизвестная версия выгрузки {data.get("version")}')
+    return data
+
+
+_recorder = None
+
+
+def get_recorder() -> Recorder:
+    global _recorder
+    if _recorder is None:
+        _recorder = Recorder()
+    return _recorder
+
+
+def mark(action: str):
+    """Отметка действия для текущих кадров; без записи почти ничего не стоит"""
+    if _recorder is not None and _recorder.recording:
+        _recorder.action = action
@@ -0,0 +1,44 @@
+from array import array
+from typing import Dict, NamedTuple, Tuple
+
+
+class TerrainRule(NamedTuple):
+    defence_bonus: int  # бонус к защите провинции
+
+
+# Правила местности; неизвестная местность бонусов не дает
+TERRAIN_RULES: Dict[str, TerrainRule] = {
+    'город': TerrainRule(defence_bonus=2),
+    'равнина': TerrainRule(defence_bonus=0),
+}
+
+NO_TERRAIN = TerrainRule(0)
+
+
+class ProvinceModifiers:
+    """
+    Модификаторы защиты, заранее разложенные по массивам с индексом провинции
+    (Province.index — порядок провинций сценария). Движки боя читают массивы по этому
+    индексу без словарей; index по имени — для экранов, где провинцию выбирают по имени.
+    """
+
+    def __init__(self, provinces, rules: Dict[str, TerrainRule] = None):
+        self.rules = TERRAIN_RULES if rules is None else rules
+        self.names = list(provinces)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self._provinces = provinces
+
+        # Бонус местности для calculate_battle и число укреплений
+        self.terrain_bonus = array('i', [self.rules.get(provinces[name].terrain, NO_TERRAIN).defence_bonus
+                                         for name in self.names])
+        self.forts = array('i', [provinces[name].forts for name in self.names])
+
+    def refresh(self, province_name: str):
+        """Перечитывает изменяемые данные провинции (число укреплений)"""
+        province = self._provinces[province_name]
+        self.forts[province.index] = province.forts
+
+    def battle_modifiers(self, province_name: str) -> Tuple[int, int]:
+        """(укрепления, бонус местности) для расчета боя за провинцию"""
+        i = self.index[province_name]
+        return self.forts[i], self.terrain_bonus[i]
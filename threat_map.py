@@ -0,0 +1,127 @@
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from catalogue import FORT
+
+
+@dataclass
+class Threat:
+    province: str
+    # Лучшая пара атакующих: (индекс юнита, из какой провинции)
+    attackers: List[Tuple[int, str]] = field(default_factory=list)
+    attack_total: int = 0
+    defenders: List[int] = field(default_factory=list)
+    forts: int = 0
+    terrain_bonus: int = 0
+    defence_total: int = 0
+
+
+class ThreatMap:
+    """
+    Вражеские провинции в досягаемости атаки стороны с лучшими суммами атаки и защиты.
+    Пересчитываются только провинции, помеченные invalidate().
+    Стороны и юниты — индексы: sides — список сторон, стеки провинций — {юнит: число}.
+    terrain_bonus — бонус местности по Province.index (ProvinceModifiers.terrain_bonus).
+    """
+
+    MAX_ATTACKERS = 2
+
+    def __init__(self, side: int, sides, provinces, index,
+                 terrain_bonus: Sequence[int]):
+        self.side = side
+        self._sides = sides
+        self._provinces = provinces
+        self._index = index
+        self._terrain_bonus = terrain_bonus
+        # Ключи заранее в порядке карты: пересчет идет по множеству, и от порядка вставки
+        # зависел бы порядок равных угроз в threats() — он менялся бы от запуска к запуску
+        self._threats: Dict[str, Optional[Threat]] = dict.fromkeys(provinces)
+        self._dirty = set(provinces)
+
+    def invalidate(self, province_names: Iterable[str]):
+        """Помечает провинции и всех, кого они могут задеть, к пересчету"""
+        for name in province_names:
+            self._dirty.add(name)
+            self._dirty.update(self._index.within(name, self._index.radius))
+
+    def invalidate_all(self):
+        self._dirty = set(self._provinces)
+
+    def _refresh(self):
+        for name in self._dirty:
+            self._threats[name] = self._compute(name)
+        self._dirty.clear()
+
+    def _compute(self, target_name: str) -> Optional[Threat]:
+        target = self._provinces.get(target_name)
+        if target is None or target.owner in (self.side, None):
+            return None
+
+        side = self._sides[self.side]
+        candidates = []
+        for source_name in self._index.within(target_name, self._index.radius):
+            source = self._provinces[source_name]
+            if source.owner != self.side:
+                continue
+            distance = self._index.distance(source_name, target_name)
+            for unit, count in source.units.items():
+                unit_type = side.units[unit]
+                if unit_type.attack <= 0 or unit_type.attack_range < distance:
+                    continue
+                # Каждый батальон стека — отдельный кандидат, лучших все равно не больше двух
+                for _ in range(min(count, self.MAX_ATTACKERS)):
+                    candidates.append((unit_type.attack, unit, source_name))
+
+        if not candidates:
+            return None
+
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        best = candidates[:self.MAX_ATTACKERS]
+
+        defender_side = self._sides[target.owner]
+        defenders = [unit for unit, count in target.units.items() for _ in range(count)]
+        terrain_bonus = self._terrain_bonus[target.index]
+        defence_total = (sum(defender_side.units[unit].defence for unit in defenders) +
+                         target.forts * defender_side.units[FORT].defence +
+                         terrain_bonus)
+
+        return Threat(
+            province=target_name,
+            attackers=[(unit, source_name) for _, unit, source_name in best],
+            attack_total=sum(attack for attack, _, _ in best),
+            defenders=defenders,
+            forts=target.forts,
+            terrain_bonus=terrain_bonus,
+            defence_total=defence_total,
+        )
+
+    def get(self, province_name: str) -> Optional[Threat]:
+        if province_name in self._dirty:
+            self._refresh()
+        return self._threats.get(province_name)
+
+    def threats(self) -> List[Threat]:
+        """Все цели, отсортированные по перевесу атаки над защитой"""
+        self._refresh()
+        result = [t for t in self._threats.values() if t is not None]
+        result.sort(key=lambda t: t.attack_total - t.defence_total, reverse=True)
+        return result
+
+    def attacker_counts(self, province_name: str) -> Dict[int, int]:
+        """Индекс юнита -> сколько его батальонов достает до провинции (не больше MAX_ATTACKERS)"""
+        side = self._sides[self.side]
+        result = {}
+        for source_name in self._index.within(province_name, self._index.radius):
+            source = self._provinces[source_name]
+            if source.owner != self.side:
+                continue
+            distance = self._index.distance(source_name, province_name)
+            for unit, count in source.units.items():
+                unit_type = side.units[unit]
+                if count > 0 and unit_type.attack > 0 and unit_type.attack_range >= distance:
+                    result[unit] = min(self.MAX_ATTACKERS, result.get(unit, 0) + count)
+        return result
+
+    def attackers_for(self, province_name: str) -> List[int]:
+        """Типы юнитов стороны, которые достают до провинции"""
+        return list(self.attacker_counts(province_name))
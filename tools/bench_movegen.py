@@ -0,0 +1,71 @@
+"""
+Скорость генератора ходов: сколько допустимых ходов в секунду выдает generate_moves().
+
+Партии играются случайными ходами из самого генератора; в каждом состоянии
+замеряется полное перечисление ходов (время выполнения ходов не учитывается).
+Таблица транспозиций по хэшу позиции показывает, как часто партии повторяют позиции —
+столько перечислений поиск мог бы взять из кэша.
+
+    python -m tools.bench_movegen --games 20 --seed 1
+"""
+import argparse
+import random
+import time
+from collections import Counter
+
+from battle_logic import GameState
+from catalogue import SIDE_COUNT
+from movegen import apply_move, generate_moves
+from zobrist import TranspositionTable
+
+MAX_STEPS = 400
+
+
+def bench(games: int, seed: int):
+    rng = random.Random(seed)
+    GameState.seed(seed)
+    generated = Counter()
+    elapsed = Counter()
+    states = Counter()
+    table = TranspositionTable()
+    for _ in range(games):
+        GameState.initialize()
+        for side in range(SIDE_COUNT):
+            GameState.set_starting_set(side, rng.randrange(len(GameState.get_starting_sets(side))))
+        for _ in range(MAX_STEPS):
+            phase = GameState.get_current_phase().name
+            position = GameState.position_hash()
+            if table.get(position) is None:
+                table.put(position, True)
+            start = time.perf_counter()
+            moves = list(generate_moves())
+            elapsed[phase] += time.perf_counter() - start
+            generated[phase] += len(moves)
+            states[phase] += 1
+            apply_move(rng.choice(moves))
+            if GameState.get_winner() is not None:
+                break
+    return generated, elapsed, states, table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Скорость генератора допустимых ходов')
+    parser.add_argument('--games', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    generated, elapsed, states, table = bench(args.games, args.seed)
+    for phase in sorted(states, key=lambda name: -generated[name]):
+        rate = generated[phase] / elapsed[phase] if elapsed[phase] else 0
+        print(f"{phase:>11}: {states[phase]:6d} состояний, {generated[phase] / states[phase]:7.1f} ходов "
+              f"на состояние, {rate:12,.0f} ходов/с")
+    total = sum(elapsed.values())
+    print(f"{'всего':>11}: {sum(states.values()):6d} состояний, {sum(generated.values())} ходов, "
+          f"{sum(generated.values()) / total:,.0f} ходов/с")
+    stats = table.stats()
+    print(f"Повторные позиции: {stats['hits']} из {stats['probes']} ({stats['hit_rate']:.1%}), "
+          f"занято {stats['filled']} из {stats['size']} слотов, вытеснено {stats['replaced']}")
+
+
+if __name__ == '__main__':
+    main()
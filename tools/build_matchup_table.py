@@ -0,0 +1,70 @@
+"""
+Сборка таблицы шансов matchups.lut для независимого калькулятора.
+
+Запуск перед сборкой APK:
+    python -m tools.build_matchup_table
+"""
+import argparse
+import os
+
+from battle_engine import DICE_FACES, OVERWHELM, WIN, compare
+from battle_logic import get_all_unit_types
+from catalogue import FORT, SIDE_COUNT, opponent
+from matchup_table import (ATTACKER_COMBOS, DEFAULT_PATH, DEFENDER_COMBOS, HEADER, MAGIC, MAX_FORTS,
+                           MAX_TERRAIN, RECORD_COUNT, VERSION, units_fingerprint)
+
+
+def build_record(attack: int, defence: int) -> bytes:
+    overwhelm = win = 0
+    for atk_die in DICE_FACES:
+        for def_die in DICE_FACES:
+            result = compare(attack + atk_die, defence + def_die)
+            overwhelm += result == OVERWHELM
+            win += result == WIN
+    return bytes((overwhelm, win))
+
+
+def build_table(path: str = DEFAULT_PATH) -> int:
+    all_units = get_all_unit_types()
+    # Записи с одинаковыми суммами атаки и защиты совпадают — считаем каждую пару один раз
+    cache = {}
+    count = 0
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, units_fingerprint(all_units)))
+        for attacker_side in range(SIDE_COUNT):
+            attacker = all_units[attacker_side]
+            defender = all_units[opponent(attacker_side)]
+
+            for atk_combo in ATTACKER_COMBOS:
+                attack = sum(attacker[i].attack for i in atk_combo)
+                for def_combo in DEFENDER_COMBOS:
+                    defence_units = sum(defender[i].defence for i in def_combo)
+                    for forts in range(MAX_FORTS + 1):
+                        for terrain in range(MAX_TERRAIN + 1):
+                            defence = defence_units + forts * defender[FORT].defence + terrain
+                            record = cache.get((attack, defence))
+                            if record is None:
+                                record = cache[(attack, defence)] = build_record(attack, defence)
+                            f.write(record)
+                            count += 1
+
+    if count != RECORD_COUNT:
+        os.remove(tmp_path)
+        raise RuntimeError(f'Записано {count} записей вместо {RECORD_COUNT}')
+    os.replace(tmp_path, path)
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Сборка таблицы шансов боя')
+    parser.add_argument('--output', default=DEFAULT_PATH)
+    args = parser.parse_args(argv)
+
+    count = build_table(args.output)
+    print(f"{args.output}: {count} записей, {os.path.getsize(args.output)} байт")
+
+
+if __name__ == '__main__':
+    main()
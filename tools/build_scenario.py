@@ -0,0 +1,159 @@
+"""
+Проверка и сборка сценариев.
+
+Каждый исходник проверяется (scenario.validate) и, если ошибок нет, собирается
+в .scn рядом с ним. Запуск перед сборкой APK:
+    python -m tools.build_scenario
+Только проверка:
+    python -m tools.build_scenario scenarios/my_map.json --check
+Время проверки, сборки и чтения на сгенерированной карте-решетке:
+    python -m tools.build_scenario --synthetic 100000
+Проверка отчета на заведомо испорченных исходниках (BROKEN_SOURCES):
+    python -m tools.build_scenario --self-check
+"""
+import argparse
+import copy
+import math
+import sys
+import time
+
+from scenario import (DEFAULT_SOURCE, SIDES, compile_scenario, compiled_path, from_source, load_compiled,
+                      read_source, source_crc, validate, write_compiled)
+
+MAX_PRINTED = 20
+
+
+def synthetic_source(count: int, asymmetric: int = 0) -> dict:
+    """Карта-решетка из count провинций: левая половина СССР, правая Германия"""
+    width = max(2, math.isqrt(count))
+    names = [f'П{i}' for i in range(count)]
+    provinces = []
+    for i, name in enumerate(names):
+        row, col = divmod(i, width)
+        adjacent = [names[j] for j in (i - width, i + width) if 0 <= j < count]
+        adjacent += [names[j] for j in (i - 1, i + 1) if 0 <= j < count and j // width == row]
+        provinces.append({'name': name, 'terrain': 'город' if i % 7 == 0 else 'равнина',
+                          'owner': SIDES[1] if col < width // 2 else SIDES[0], 'adjacent': adjacent,
+                          'pos': [col, row]})
+    # Порча для проверки отчета: у первых провинций пропадает обратная граница
+    for province in provinces[:asymmetric]:
+        province['adjacent'].pop()
+    sets = {side: [{'name': 'Стандарт', 'units': {'Л. Пехота': 4, 'Укреп': 1}}] for side in SIDES}
+    return {'name': f'Решетка {count}', 'provinces': provinces, 'starting_sets': sets}
+
+
+def _set_path(source: dict, path: tuple, value):
+    for key in path[:-1]:
+        source = source[key]
+    source[path[-1]] = value
+
+
+# (что испорчено, путь в исходнике решетки, новое значение, ожидаемая часть ошибки)
+BROKEN_SOURCES = [
+    ('провинции не списком', ('provinces',), {}, 'Нет списка провинций'),
+    ('провинция без имени', ('provinces', 1, 'name'), '', 'нет имени'),
+    ('неизвестная местность', ('provinces', 1, 'terrain'), 'болото', 'неизвестная местность'),
+    ('координаты не парой', ('provinces', 1, 'pos'), [1], 'координаты pos'),
+    ('граница в одну сторону', ('provinces', 0, 'adjacent'), ['П1'], 'не граничит'),
+    ('наборы не объектом', ('starting_sets',), [], 'Нет стартовых наборов'),
+    ('наборы стороны объектом', ('starting_sets', SIDES[1]), {'name': 'x', 'units': {}}, 'должны быть списком'),
+    ('наборы стороны строкой', ('starting_sets', SIDES[0]), 'Стандарт', 'должны быть списком'),
+    ('набор не объектом', ('starting_sets', SIDES[0], 0), 'Стандарт', 'ожидается объект'),
+    ('юниты не объектом', ('starting_sets', SIDES[0], 0, 'units'), [], 'нет списка юнитов'),
+    ('неизвестный юнит', ('starting_sets', SIDES[0], 0, 'units', 'Кавалерия'), 1, 'неизвестный юнит'),
+    ('отрицательное число', ('starting_sets', SIDES[0], 0, 'units', 'Арта'), -1, 'неверное число'),
+]
+
+
+def self_check() -> bool:
+    """Каждая порча находится validate(), а from_source() отвечает на нее ValueError, а не падением"""
+    ok = True
+    for title, path, value, expected in BROKEN_SOURCES:
+        source = copy.deepcopy(synthetic_source(16))
+        _set_path(source, path, value)
+        problems = validate(source)
+        if not any(expected in problem for problem in problems):
+            print(f"{title}: нет ошибки «{expected}», получено {problems}")
+            ok = False
+            continue
+        try:
+            from_source(source)
+        except ValueError:
+            continue
+        except Exception as e:
+            print(f"{title}: from_source упал с {e!r}")
+        else:
+            print(f"{title}: from_source принял испорченный исходник")
+        ok = False
+    print(f"Испорченных исходников {len(BROKEN_SOURCES)}: {'все найдены' if ok else 'есть пропуски'}")
+    return ok
+
+
+def report(title: str, problems) -> bool:
+    if not problems:
+        return True
+    print(f"{title}: ошибок {len(problems)}")
+    for problem in problems[:MAX_PRINTED]:
+        print(f"  {problem}")
+    if len(problems) > MAX_PRINTED:
+        print(f"  ... и еще {len(problems) - MAX_PRINTED}")
+    return False
+
+
+def build(path: str, check_only: bool) -> bool:
+    try:
+        source = read_source(path)
+    except (OSError, ValueError) as e:
+        print(f"{path}: не читается: {e}")
+        return False
+    if not report(path, validate(source)):
+        return False
+    if check_only:
+        print(f"{path}: ошибок нет, провинций {len(source['provinces'])}")
+        return True
+    output = compiled_path(path)
+    size = write_compiled(from_source(source), output, source_crc(path))
+    print(f"{output}: провинций {len(source['provinces'])}, {size} байт")
+    return True
+
+
+def bench(count: int, asymmetric: int):
+    source = synthetic_source(count, asymmetric)
+    edges = sum(len(p['adjacent']) for p in source['provinces'])
+    start = time.perf_counter()
+    problems = validate(source)
+    validated = time.perf_counter()
+    print(f"Провинций {count}, границ {edges}: проверка {(validated - start) * 1000:.0f} мс")
+    if not report('Решетка', problems):
+        return
+    start = time.perf_counter()
+    compiled = from_source(source)
+    data = compile_scenario(compiled)
+    built = time.perf_counter()
+    loaded = load_compiled(data)
+    read = time.perf_counter()
+    assert loaded == compiled
+    print(f"разбор и сборка {(built - start) * 1000:.0f} мс, {len(data)} байт; "
+          f"чтение .scn {(read - built) * 1000:.0f} мс")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Проверка и сборка сценариев')
+    parser.add_argument('sources', nargs='*', default=[DEFAULT_SOURCE])
+    parser.add_argument('--check', action='store_true', help='только проверить, .scn не писать')
+    parser.add_argument('--synthetic', type=int, metavar='N', help='замер на решетке из N провинций')
+    parser.add_argument('--asymmetric', type=int, default=0, help='сколько границ решетки испортить')
+    parser.add_argument('--self-check', action='store_true', help='проверить отчет на испорченных исходниках')
+    args = parser.parse_args(argv)
+
+    if args.self_check:
+        sys.exit(0 if self_check() else 1)
+    if args.synthetic:
+        bench(args.synthetic, args.asymmetric)
+        return
+    ok = all([build(path, args.check) for path in args.sources])
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
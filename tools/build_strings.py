@@ -0,0 +1,64 @@
+"""
+Проверка и сборка текстов интерфейса.
+
+Каждый locale/<язык>.json проверяется (i18n.validate), пропущенные тексты
+перечисляются — они возьмутся из русской таблицы — и язык собирается в .lng рядом
+с исходником. Запуск перед сборкой APK:
+    python -m tools.build_strings
+Только проверка, пропуски считаются ошибкой; .lng должен быть собран из текущего
+исходника — приложение сам JSON при запуске не сверяет:
+    python -m tools.build_strings en --check --strict
+"""
+import argparse
+import sys
+
+from i18n import (DEFAULT_LANGUAGE, build_table, compiled_path, languages, load_compiled, missing, read_source,
+                  source_crc, validate, write_compiled)
+from tools.build_scenario import report
+
+
+def build(language: str, check_only: bool, strict: bool) -> bool:
+    try:
+        source = read_source(language)
+    except (OSError, ValueError) as e:
+        print(f"{language}: не читается: {e}")
+        return False
+    if not report(language, validate(source)):
+        return False
+    absent = missing(source)
+    if absent:
+        print(f"{language}: без перевода {len(absent)}: {', '.join(absent[:10])}"
+              + (' ...' if len(absent) > 10 else ''))
+        if strict:
+            return False
+    if check_only:
+        try:
+            with open(compiled_path(language), 'rb') as f:
+                load_compiled(f.read(), source_crc(language))
+        except (OSError, ValueError) as e:
+            print(f"{language}: .lng устарел, пересоберите без --check: {e}")
+            return False
+        print(f"{language}: ошибок нет, текстов {len(source)}")
+        return True
+    fallback = None
+    if language != DEFAULT_LANGUAGE:
+        fallback = build_table(read_source(DEFAULT_LANGUAGE))
+    output = compiled_path(language)
+    size = write_compiled(build_table(source, fallback), output, source_crc(language))
+    print(f"{output}: текстов {len(source)}, {size} байт")
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Проверка и сборка текстов интерфейса')
+    parser.add_argument('languages', nargs='*', help='по умолчанию все locale/*.json')
+    parser.add_argument('--check', action='store_true', help='только проверить, .lng не писать')
+    parser.add_argument('--strict', action='store_true', help='пропущенные тексты — ошибка')
+    args = parser.parse_args(argv)
+
+    ok = all([build(language, args.check, args.strict) for language in args.languages or languages()])
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
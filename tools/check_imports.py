@@ -0,0 +1,92 @@
+"""
+Проверка импорта модулей логики: быстро, без побочных эффектов и без Kivy.
+
+Каждый модуль импортируется в отдельном чистом интерпретаторе. Проверяется, что
+  - импорт укладывается в бюджет времени;
+  - kivy не подгружается;
+  - GameState не инициализируется (партия создается только явно).
+Если установлен Kivy, дополнительно проверяется, что импорт main не создает окно
+и не подгружает виджеты экрана карты (они приходят с kv/map.kv).
+
+    python -m tools.check_imports --budget-ms 150
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOGIC_MODULES = ('catalogue', 'errors', 'battle_engine', 'movement', 'terrain', 'threat_map',
+                 'battle_logic', 'forecast', 'matchup_table', 'result_store', 'analytics', 'tasks',
+                 'telemetry', 'rules', 'movegen', 'zobrist', 'netsync', 'scenario', 'map_layout', 'i18n',
+                 'autosave')
+DEFAULT_BUDGET_MS = 150
+MAP_ONLY_MODULES = ('map_widgets', 'kivy.uix.scatter', 'kivy.uix.stencilview')
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+__import__({module!r})
+elapsed = (time.perf_counter() - start) * 1000
+battle_logic = sys.modules.get('battle_logic')
+print(json.dumps({{
+    'ms': elapsed,
+    'kivy': sorted(name for name in sys.modules if name == 'kivy' or name.startswith('kivy.')),
+    'map': [name for name in {map_only!r} if name in sys.modules],
+    'initialized': bool(battle_logic and battle_logic.GameState._sides),
+}}))
+'''
+
+
+def probe(module: str) -> dict:
+    env = dict(os.environ, KIVY_NO_ARGS='1', KIVY_NO_CONSOLELOG='1')
+    code = PROBE.format(module=module, map_only=MAP_ONLY_MODULES)
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env,
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def kivy_installed() -> bool:
+    return subprocess.run([sys.executable, '-c', 'import kivy'], capture_output=True,
+                          env=dict(os.environ, KIVY_NO_ARGS='1', KIVY_NO_CONSOLELOG='1')).returncode == 0
+
+
+def check(budget_ms: float):
+    """Список нарушений: (модуль, текст)"""
+    problems = []
+    for module in LOGIC_MODULES:
+        result = probe(module)
+        print(f"{module}: {result['ms']:.1f} мс")
+        if result['ms'] > budget_ms:
+            problems.append((module, f"импорт {result['ms']:.1f} мс, бюджет {budget_ms} мс"))
+        if result['kivy']:
+            problems.append((module, f"подгружает Kivy: {', '.join(result['kivy'][:3])}"))
+        if result['initialized']:
+            problems.append((module, 'инициализирует GameState при импорте'))
+
+    if kivy_installed():
+        result = probe('main')
+        print(f"main: {result['ms']:.1f} мс")
+        if 'kivy.core.window' in result['kivy']:
+            problems.append(('main', 'создает окно при импорте'))
+        if result['map']:
+            problems.append(('main', f"подгружает модули экрана карты: {', '.join(result['map'])}"))
+        if result['initialized']:
+            problems.append(('main', 'инициализирует GameState при импорте'))
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Время и побочные эффекты импорта модулей логики')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS)
+    args = parser.parse_args(argv)
+
+    problems = check(args.budget_ms)
+    for module, message in problems:
+        print(f"ОШИБКА {module}: {message}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Проверка автосохранения обрывом процесса.
+
+Дочерний процесс играет партию харнесса (tools.harness) с Autosave и после каждого окна
+печатает хэш позиции, а на случайном ходу обрывается через os._exit — без close(),
+возможно посреди записи. Родитель восстанавливает партию из каталога сохранения
+и проверяет, что позиция — одно из напечатанных окон и потеряно не больше одного.
+
+    python -m tools.crash_autosave --runs 50
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from autosave import Autosave
+from battle_logic import GameState
+from movegen import apply_move, generate_moves
+from tools.harness import new_game
+
+MOVES_PER_WINDOW = 5
+
+
+def child(save_dir: str, seed: int, crash_at: int, interval: float, checkpoint_every: int):
+    rng = random.Random(seed)
+    saver = Autosave(save_dir, checkpoint_every=checkpoint_every)
+    saver.start()
+    new_game(seed, rng)
+    for step in range(1, crash_at + 1):
+        moves = list(generate_moves())
+        if not moves or GameState.get_winner() is not None:
+            break
+        apply_move(rng.choice(moves))
+        if step % MOVES_PER_WINDOW == 0:
+            saver.poll()
+            print(GameState.position_digest(), flush=True)
+            time.sleep(interval)
+    os._exit(0)
+
+
+def check(run: int, seed: int, interval: float, checkpoint_every: int) -> str:
+    """Пустая строка — восстановление в пределах окна, иначе описание ошибки"""
+    crash_at = random.Random(seed).randrange(MOVES_PER_WINDOW, 400)
+    with tempfile.TemporaryDirectory() as save_dir:
+        output = subprocess.run([sys.executable, '-m', 'tools.crash_autosave', '--child', save_dir,
+                                 '--seed', str(seed), '--crash-at', str(crash_at), '--interval', str(interval),
+                                 '--checkpoint-every', str(checkpoint_every)],
+                                capture_output=True, text=True, check=True).stdout.split()
+        GameState.initialize()
+        recovered = Autosave(save_dir).recover()
+        digest = GameState.position_digest()
+    if not output:
+        return '' if not recovered else f"прогон {run}: восстановлено без единого окна"
+    if not recovered:
+        return f"прогон {run} (seed {seed}): сохранение не восстановлено, окон {len(output)}"
+    if digest not in output:
+        return f"прогон {run} (seed {seed}): позиция {digest} не совпала ни с одним окном"
+    lost = output[::-1].index(digest)
+    if lost > 1:
+        return f"прогон {run} (seed {seed}): потеряно окон {lost}"
+    return ''
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Проверка автосохранения обрывом процесса')
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--interval', type=float, default=0.02, help='пауза между окнами, с')
+    parser.add_argument('--checkpoint-every', type=int, default=7, help='дельт между опорными точками')
+    parser.add_argument('--child', metavar='DIR', help=argparse.SUPPRESS)
+    parser.add_argument('--crash-at', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child(args.child, args.seed, args.crash_at, args.interval, args.checkpoint_every)
+        return
+    start = time.perf_counter()
+    errors = [error for error in (check(run, args.seed + run, args.interval, args.checkpoint_every)
+                                  for run in range(args.runs)) if error]
+    for error in errors:
+        print(error)
+    print(f"Обрывов {args.runs} за {time.perf_counter() - start:.1f} с, ошибок {len(errors)}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+"""
+Воспроизводимые прогоны партий для поиска нарушений инвариантов.
+
+Каждая партия задается одним seed: от него идут кубик GameState (GameState.seed),
+стартовые наборы и выбор хода из generate_moves(), так что партия с тем же seed
+повторяется ход в ход. Ходы проходят весь цикл фаз CHOICE -> MOVEMENT -> PLACEMENT ->
+ATTACK -> COMPLETION, после каждого проверяется check_invariants():
+  - банк, доступные юниты и лимиты размещения не уходят в минус;
+  - доступные юниты стороны совпадают с ее стеками и укреплениями на карте;
+  - провинции принадлежат сторонам и числятся в их списках, стеки не отрицательные;
+  - кубик 0..6, инкрементальные хэши сторон и провинций равны пересчету с нуля;
+  - провинция после подавляющей атаки принадлежит атакующему.
+Нарушение печатается с seed и номером хода, повтор одной партии с журналом ходов:
+    python -m tools.harness --seed 1234 --games 1 --verbose
+Тысячи партий в нескольких процессах:
+    python -m tools.harness --games 5000 --workers 4
+Итоговый отпечаток — хэш позиций в конце всех партий: при тех же seed он совпадает
+при любом числе процессов.
+
+С --screens партии идут через GameScreen (нужен Kivy, один процесс): простые действия
+нажимаются обработчиками экрана, а после каждого хода доступность кнопок сверяется
+с таблицей правил.
+"""
+import argparse
+import hashlib
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple, Optional
+
+from battle_engine import OVERWHELM
+from battle_logic import PHASES, GameState
+from catalogue import FORT, SIDE_COUNT, SIDE_NAMES, UNIT_COUNT, UNIT_NAMES
+from movegen import apply_move, generate_moves
+from rules import Action
+import zobrist
+
+MAX_STEPS = 600
+
+
+class GameResult(NamedTuple):
+    seed: int
+    steps: int
+    winner: Optional[int]
+    captures: int
+    digest: str
+    violations: List[str]
+
+
+def check_invariants() -> List[str]:
+    problems = []
+    sides = GameState._sides
+    on_map = [[0] * UNIT_COUNT for _ in sides]
+    for name, province in GameState._provinces.items():
+        if province.owner is None:
+            if province.units or province.forts:
+                problems.append(f"{name}: войска в ничьей провинции")
+            continue
+        if province.owner not in range(SIDE_COUNT):
+            problems.append(f"{name}: неизвестный владелец {province.owner}")
+            continue
+        owner = SIDE_NAMES[province.owner]
+        if name not in sides[province.owner].provinces:
+            problems.append(f"{name}: нет в списке провинций {owner}")
+        counts = on_map[province.owner]
+        for unit, count in province.units.items():
+            if unit not in range(UNIT_COUNT) or unit == FORT:
+                problems.append(f"{name}: неизвестный юнит {unit} в стеке")
+                continue
+            if count < 0:
+                problems.append(f"{name}: {UNIT_NAMES[unit]} {count}")
+            counts[unit] += count
+        if province.forts < 0:
+            problems.append(f"{name}: укреплений {province.forts}")
+        counts[FORT] += province.forts
+
+    for side in sides:
+        side_name = side.name
+        if side.bank < 0:
+            problems.append(f"{side_name}: банк {side.bank}")
+        for unit, unit_name in enumerate(UNIT_NAMES):
+            available = side.available[unit]
+            if available < 0:
+                problems.append(f"{side_name}: доступно {unit_name} {available}")
+            if side.max_placements[unit] < 0:
+                problems.append(f"{side_name}: лимит {unit_name} {side.max_placements[unit]}")
+            if available != on_map[side.id][unit]:
+                problems.append(f"{side_name}: доступно {unit_name} {available}, "
+                                f"на карте {on_map[side.id][unit]}")
+        for province_name in side.provinces:
+            if GameState._provinces[province_name].owner != side.id:
+                problems.append(f"{side_name}: чужая провинция {province_name} в списке")
+        incremental = side.hash
+        side._rehash()
+        if side.hash != incremental:
+            problems.append(f"{side_name}: хэш стороны разошелся с пересчетом")
+
+    provinces_hash = 0
+    for province in GameState._provinces.values():
+        provinces_hash ^= zobrist.province_hash(province)
+    if provinces_hash != GameState._provinces_hash:
+        problems.append("хэш провинций разошелся с пересчетом")
+    if not 0 <= GameState.get_current_dice() <= 6:
+        problems.append(f"кубик {GameState.get_current_dice()}")
+    if GameState.get_current_phase() not in PHASES:
+        problems.append(f"фаза {GameState.get_current_phase()}")
+    return problems
+
+
+def new_game(seed: int, rng: random.Random):
+    GameState.seed(seed)
+    GameState.initialize()
+    for side in range(SIDE_COUNT):
+        GameState.set_starting_set(side, rng.randrange(len(GameState.get_starting_sets(side))))
+
+
+def capture_problems(battles: List[dict]) -> List[str]:
+    """Бои последнего хода: после подавляющей атаки провинция должна перейти атакующему"""
+    return [f"{battle['province']}: подавляющая атака не взяла провинцию"
+            for battle in battles
+            if battle['outcome'] is OVERWHELM
+            and GameState._provinces[battle['province']].owner != battle['attacker']]
+
+
+def play(seed: int, verbose: bool = False, screen=None) -> GameResult:
+    """Одна партия; screen — GameScreen, через обработчики которого идут простые действия"""
+    battles = []
+
+    def on_event(event, data):
+        if event == 'battle':
+            battles.append(data)
+
+    GameState.add_listener(on_event)
+    try:
+        return _play(seed, verbose, screen, battles)
+    finally:
+        GameState.remove_listener(on_event)
+
+
+def _play(seed: int, verbose: bool, screen, battles: List[dict]) -> GameResult:
+    rng = random.Random(seed)
+    new_game(seed, rng)
+    violations = check_invariants()
+    step = 0
+    captures = 0
+    while not violations and step < MAX_STEPS and GameState.get_winner() is None:
+        step += 1
+        moves = list(generate_moves())
+        if not moves:
+            violations.append(f"ход {step}: нет допустимых ходов в фазе {GameState.get_current_phase().name}")
+            break
+        move = rng.choice(moves)
+        phase = GameState.get_current_phase().name
+        try:
+            if screen is not None and not move.args and move.action in SCREEN_HANDLERS:
+                getattr(screen, SCREEN_HANDLERS[move.action])()
+            else:
+                apply_move(move)
+                if screen is not None:
+                    screen.update_display()
+        except Exception as e:
+            violations.append(f"ход {step} ({phase}): {move.action.name} {move.args}: {e!r}")
+            break
+        if verbose:
+            print(f"{step:4d} {phase:>10} {move.action.name} {move.args} -> {GameState.position_digest()}")
+        captures += sum(battle['outcome'] is OVERWHELM for battle in battles)
+        problems = check_invariants() + capture_problems(battles) + (screen_problems(screen) if screen else [])
+        battles.clear()
+        violations.extend(f"ход {step} ({phase}, {move.action.name}): {problem}" for problem in problems)
+    return GameResult(seed, step, GameState.get_winner(), captures, GameState.position_digest(), violations)
+
+
+def play_many(seeds) -> List[GameResult]:
+    return [play(seed) for seed in seeds]
+
+
+# Действия без аргументов, у которых на экране игры есть свой обработчик кнопки
+SCREEN_HANDLERS = {
+    Action.ROLL: 'roll_dice',
+    Action.CHOOSE_ATTACK: 'choose_attack',
+    Action.CHOOSE_BANK: 'choose_bank',
+    Action.SKIP_ATTACK: 'skip_attack',
+    Action.END_TURN: 'end_turn',
+}
+
+
+def screen_problems(screen) -> List[str]:
+    legal = GameState.legal_action_set()
+    return [f"кнопка {button_id}: {'выключена' if action in legal else 'включена'} вопреки правилам"
+            for button_id, action in screen.ACTION_BUTTONS.items()
+            if screen.ids[button_id].disabled == (action in legal)]
+
+
+def open_game_screen():
+    # Kivy не должен разбирать аргументы инструмента; окно нужно только для разметки экранов
+    os.environ.setdefault('KIVY_NO_ARGS', '1')
+    import main
+    from kivy.base import EventLoop
+
+    app = main.TabletopApp()
+    app._run_prepare()
+    GameState.remove_listener(app.game_log)
+    app.autosave.close()
+    screen = app.root.get_screen('game')
+    EventLoop.idle()
+    return app, screen
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Воспроизводимые случайные партии с проверкой инвариантов')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=1, help='seed первой партии, дальше по порядку')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--verbose', action='store_true', help='журнал ходов (только в одном процессе)')
+    parser.add_argument('--screens', action='store_true', help='через GameScreen, нужен Kivy')
+    args = parser.parse_args(argv)
+
+    seeds = list(range(args.seed, args.seed + args.games))
+    start = time.perf_counter()
+    if args.screens:
+        app, screen = open_game_screen()
+        results = [play(seed, args.verbose, screen) for seed in seeds]
+        app.stop()
+    elif args.workers <= 1 or args.verbose:
+        results = [play(seed, args.verbose) for seed in seeds]
+    else:
+        chunk = max(1, len(seeds) // (args.workers * 4))
+        with ProcessPoolExecutor(args.workers) as pool:
+            parts = pool.map(play_many, [seeds[i:i + chunk] for i in range(0, len(seeds), chunk)])
+            results = [result for part in parts for result in part]
+    elapsed = time.perf_counter() - start
+
+    failed = [result for result in results if result.violations]
+    for result in failed[:20]:
+        print(f"seed {result.seed}: {result.violations[0]}" +
+              (f" (и еще {len(result.violations) - 1})" if len(result.violations) > 1 else ''))
+    steps = sum(result.steps for result in results)
+    captures = sum(result.captures for result in results)
+    winners = {}
+    for result in results:
+        winner = 'нет' if result.winner is None else SIDE_NAMES[result.winner]
+        winners[winner] = winners.get(winner, 0) + 1
+    fingerprint = hashlib.sha256(''.join(result.digest for result in results).encode()).hexdigest()[:16]
+    print(f"Партий {len(results)}, ходов {steps} за {elapsed:.1f} с "
+          f"({len(results) / elapsed * 60:,.0f} партий/мин), победы {winners}, "
+          f"захвачено провинций {captures}")
+    print(f"Нарушений: {len(failed)} партий; отпечаток прогона {fingerprint}")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
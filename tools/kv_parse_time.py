@@ -0,0 +1,46 @@
+"""
+Время разбора разметки kv/ при старте.
+
+Сравнивает то, что разбирается до первого экрана (common.kv и splash.kv), с разбором
+всех файлов сразу — так приложение стартовало, пока разметка была одной строкой в main.py.
+
+    python -m tools.kv_parse_time --repeat 20
+"""
+import argparse
+import os
+import time
+
+from kivy.lang import Parser
+
+KV_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'kv')
+STARTUP_FILES = ('common.kv', 'splash.kv')
+
+
+def parse_time(filenames, repeat: int) -> float:
+    """Среднее время разбора набора файлов в миллисекундах"""
+    contents = []
+    for name in filenames:
+        with open(os.path.join(KV_DIR, name), encoding='utf-8') as f:
+            contents.append(f.read())
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for content in contents:
+            Parser(content=content)
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Время разбора kv-разметки')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    all_files = sorted(name for name in os.listdir(KV_DIR) if name.endswith('.kv'))
+    startup = parse_time(STARTUP_FILES, args.repeat)
+    everything = parse_time(all_files, args.repeat)
+    print(f"До первого экрана ({', '.join(STARTUP_FILES)}): {startup:.2f} мс")
+    print(f"Все файлы ({len(all_files)}): {everything:.2f} мс")
+
+
+if __name__ == '__main__':
+    main()
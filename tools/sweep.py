@@ -0,0 +1,351 @@
+"""
+Что будет с балансом, если поменять характеристику юнита.
+
+Перебирает сетку значений любого поля UnitType (attack, defence, cost, movement_range,
+attack_range) и пересчитывает только те матчапы, которые читают измененное поле:
+  - бои: 1-2 атакующих батальона против 1-2 защитников и 0-3 укреплений, обе стороны —
+    вероятность победы атакующего;
+  - стартовые наборы: каждый набор одной стороны атакует каждый набор другой — вероятность
+    победы в многораундовом бою;
+  - экономика: ожидаемая ценность прогноза (forecast.EconomyForecast) за горизонт для
+    стартового набора против провинции с одним батальоном — читает цены покупок и цену цели;
+  - досягаемость: доля карты, куда юнит дойдет из столицы за ход (movement_range)
+    и откуда достанет атакой после хода (movement_range + attack_range).
+Точки сетки делятся на непрерывные куски и считаются в отдельных процессах.
+
+Пример:
+    python -m tools.sweep --param "Германия/Т. Танк/attack=14..18" --workers 4
+    python -m tools.sweep --param "СССР/Арта/attack_range=1..3"
+"""
+import argparse
+import itertools
+import json
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, fields
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from battle_engine import battle_distribution, round_probabilities
+from battle_logic import MAX_PLACEMENTS, GameState, UnitType, get_all_unit_types
+from catalogue import COMBAT_UNITS, FORT, SIDE_COUNT, SIDE_INDEX, SIDE_NAMES, UNIT_INDEX, UNIT_NAMES
+from forecast import DEFAULT_HORIZON, MAX_ATTACKERS, EconomyForecast, top_army
+from result_store import get_store
+
+MAX_FORTS = 3
+# Числовые поля UnitType; каждое читает хотя бы один вид матчапов (см. MatchupTable._dependencies)
+SWEEP_FIELDS = tuple(f.name for f in fields(UnitType) if f.name != 'name')
+
+
+@dataclass
+class SweepParam:
+    side: int
+    unit: int
+    field: str
+    values: Sequence[int]
+
+    @classmethod
+    def parse(cls, text: str) -> 'SweepParam':
+        """'Сторона/Юнит/поле=1,2,3' или 'Сторона/Юнит/поле=1..3'; имена переводятся в индексы"""
+        target, _, values_text = text.partition('=')
+        side, unit, field = target.split('/')
+        if side not in SIDE_INDEX or unit not in UNIT_INDEX:
+            raise ValueError(f'Неизвестный юнит: {side}/{unit}')
+        if '..' in values_text:
+            low, high = values_text.split('..')
+            values = list(range(int(low), int(high) + 1))
+        else:
+            values = [int(v) for v in values_text.split(',')]
+        return cls(SIDE_INDEX[side], UNIT_INDEX[unit], field, values)
+
+    @property
+    def label(self) -> str:
+        return f"{SIDE_NAMES[self.side]}/{UNIT_NAMES[self.unit]}/{self.field}"
+
+
+class MatchupTable:
+    """
+    Результаты всех матчапов и индекс: (сторона, юнит, поле) -> матчапы, которые его читают.
+    Стороны и юниты в ключах — индексы; catalogue — get_all_unit_types(), [сторона][юнит];
+    distances — шаги от столицы каждой стороны до провинций карты (capital_distances).
+    """
+
+    def __init__(self, catalogue: List[List[UnitType]], starting_sets: List[List[dict]],
+                 distances: List[Dict[str, int]], results: Optional[Dict[tuple, float]] = None):
+        self.catalogue = catalogue
+        self.starting_sets = starting_sets
+        self.distances = distances
+        self.deps: Dict[Tuple[int, int, str], Set[tuple]] = defaultdict(set)
+
+        # Готовые результаты (например, из кэша на диске) избавляют от полного пересчета
+        self.results: Dict[tuple, float] = dict(results) if results else {}
+        for key in self._enumerate():
+            for dep in self._dependencies(key):
+                self.deps[dep].add(key)
+            if key not in self.results:
+                self.results[key] = self._evaluate(key)
+
+    def _enumerate(self):
+        for attacker, defender in itertools.permutations(range(SIDE_COUNT), 2):
+            atk_units = def_units = COMBAT_UNITS
+            atk_stacks = [(u,) for u in atk_units] + list(itertools.combinations_with_replacement(atk_units, 2))
+            def_stacks = ([()] + [(u,) for u in def_units] +
+                          list(itertools.combinations_with_replacement(def_units, 2)))
+            for atk_stack in atk_stacks:
+                for def_stack in def_stacks:
+                    for forts in range(MAX_FORTS + 1):
+                        yield 'battle', attacker, atk_stack, defender, def_stack, forts
+
+            for i in range(len(self.starting_sets[attacker])):
+                for j in range(len(self.starting_sets[defender])):
+                    yield 'sets', attacker, i, defender, j
+                for unit in COMBAT_UNITS:
+                    yield 'economy', attacker, i, defender, unit
+
+        for side in range(SIDE_COUNT):
+            for unit in COMBAT_UNITS:
+                yield 'move', side, unit
+                yield 'strike', side, unit
+
+    def _set_stack(self, side: int, index: int) -> Tuple[List[int], int]:
+        units = self.starting_sets[side][index]['units']
+        stack = [unit for unit, count in units.items() if unit != FORT for _ in range(count)]
+        return stack, units.get(FORT, 0)
+
+    def _dependencies(self, key):
+        kind = key[0]
+        if kind in ('move', 'strike'):
+            _, side, unit = key
+            yield side, unit, 'movement_range'
+            if kind == 'strike':
+                yield side, unit, 'attack_range'
+                yield side, unit, 'attack'
+            return
+        if kind == 'economy':
+            _, attacker, i, defender, target_unit = key
+            # Прогноз докупает любые боевые юниты по цене; ценность цели — цена ее батальона
+            for unit in COMBAT_UNITS:
+                yield attacker, unit, 'attack'
+                yield attacker, unit, 'cost'
+            yield defender, target_unit, 'defence'
+            yield defender, target_unit, 'cost'
+            return
+
+        if kind == 'battle':
+            _, attacker, atk_stack, defender, def_stack, forts = key
+        else:
+            _, attacker, i, defender, j = key
+            atk_stack, _ = self._set_stack(attacker, i)
+            def_stack, forts = self._set_stack(defender, j)
+
+        for unit in set(atk_stack):
+            yield attacker, unit, 'attack'
+        for unit in set(def_stack):
+            yield defender, unit, 'defence'
+        if forts:
+            yield defender, FORT, 'defence'
+
+    def _evaluate(self, key) -> float:
+        """
+        Вероятность победы атакующего (для боев — за одно сравнение с кубиками обеих сторон),
+        ценность прогноза для экономики, доля карты для досягаемости
+        """
+        if key[0] in ('move', 'strike'):
+            return self._reach(*key)
+        if key[0] == 'economy':
+            return self._economy(*key[1:])
+        if key[0] == 'battle':
+            _, attacker, atk_stack, defender, def_stack, forts = key
+            atk_units, def_units = self.catalogue[attacker], self.catalogue[defender]
+            attack = sum(atk_units[u].attack for u in atk_stack)
+            defence = sum(def_units[u].defence for u in def_stack) + forts * def_units[FORT].defence
+            p_over, p_win, _ = round_probabilities(attack, defence)
+            return p_over + p_win
+
+        _, attacker, i, defender, j = key
+        atk_stack, _ = self._set_stack(attacker, i)
+        def_stack, forts = self._set_stack(defender, j)
+        if not atk_stack:
+            return 0.0
+        atk_units, def_units = self.catalogue[attacker], self.catalogue[defender]
+        return battle_distribution([atk_units[u].attack for u in atk_stack],
+                                   [def_units[u].defence for u in def_stack],
+                                   forts * def_units[FORT].defence,
+                                   front_width=2).attacker_win_probability
+
+    def _reach(self, kind: str, side: int, unit: int) -> float:
+        unit_type = self.catalogue[side][unit]
+        reach = unit_type.movement_range
+        if kind == 'strike':
+            if unit_type.attack <= 0:
+                return 0.0
+            reach += unit_type.attack_range
+        distances = self.distances[side]
+        if not distances:
+            return 0.0
+        return sum(d <= reach for d in distances.values()) / len(distances)
+
+    def _economy(self, attacker: int, i: int, defender: int, target_unit: int) -> float:
+        atk_stack, _ = self._set_stack(attacker, i)
+        atk_units = self.catalogue[attacker]
+        target = self.catalogue[defender][target_unit]
+        shop_units = [u for u in COMBAT_UNITS if atk_units[u].attack > 0]
+        shop = [(atk_units[u].attack, atk_units[u].cost) for u in shop_units]
+        caps = tuple(min(MAX_PLACEMENTS[u], MAX_ATTACKERS) for u in shop_units)
+        forecast = EconomyForecast(shop, target.defence, float(target.cost))
+        return forecast.value(0, DEFAULT_HORIZON, top_army([atk_units[u].attack for u in atk_stack]), caps)
+
+    def set_field(self, side: int, unit: int, field: str, value: int) -> Set[tuple]:
+        """Меняет поле юнита и пересчитывает только зависящие от него матчапы"""
+        _check_field(field)
+        unit_type = self.catalogue[side][unit]
+        if getattr(unit_type, field) == value:
+            return set()
+        setattr(unit_type, field, value)
+        changed = self.deps.get((side, unit, field), set())
+        for key in changed:
+            self.results[key] = self._evaluate(key)
+        return changed
+
+
+def _check_field(field: str):
+    if field not in SWEEP_FIELDS:
+        raise ValueError(f"Неизвестное поле {field}, перебирать можно: {', '.join(SWEEP_FIELDS)}")
+
+
+# Состояние рабочего процесса: своя таблица, которую точки куска меняют по очереди
+_table = None
+_baseline = None
+
+
+def _init_worker(catalogue, starting_sets, distances, baseline):
+    global _table, _baseline
+    _table = MatchupTable(catalogue, starting_sets, distances, baseline)
+    _baseline = baseline
+
+
+def _run_chunk(params: List[SweepParam], points: List[tuple]):
+    affected = set()
+    for p in params:
+        affected |= _table.deps.get((p.side, p.unit, p.field), set())
+
+    results = []
+    for point in points:
+        for p, value in zip(params, point):
+            _table.set_field(p.side, p.unit, p.field, value)
+        diff = {key: (_baseline[key], _table.results[key]) for key in affected
+                if _table.results[key] != _baseline[key]}
+        results.append((point, diff))
+    return results
+
+
+def capital_distances(game_map: Dict[str, List[str]], capitals: List[Optional[str]]) -> List[Dict[str, int]]:
+    """Шаги по соседству от столицы каждой стороны до всех провинций, без учета владельцев"""
+    result = []
+    for capital in capitals:
+        distances = {} if capital is None else {capital: 0}
+        queue = deque(distances)
+        while queue:
+            name = queue.popleft()
+            for neighbour in game_map.get(name, ()):
+                if neighbour not in distances:
+                    distances[neighbour] = distances[name] + 1
+                    queue.append(neighbour)
+        result.append(distances)
+    return result
+
+
+def load_catalogue():
+    GameState.ensure_initialized()
+    sets = [GameState.get_starting_sets(side) for side in range(SIDE_COUNT)]
+    distances = capital_distances(GameState._game_map, [GameState.get_capital(side) for side in range(SIDE_COUNT)])
+    return get_all_unit_types(), sets, distances
+
+
+def baseline_results(use_cache: bool = True) -> Dict[tuple, float]:
+    """Матчапы при текущих характеристиках; между запусками хранятся на диске"""
+    def compute():
+        return MatchupTable(*load_catalogue()).results
+
+    if not use_cache:
+        return compute()
+    # Ключ записи меняется вместе с набором и форматом ключей матчапов
+    return get_store().get_or_compute('sweep.baseline', 'indices+economy+reach', compute)
+
+
+def run_sweep(params: List[SweepParam], workers: int = None,
+              use_cache: bool = True) -> List[Tuple[tuple, Dict[tuple, Tuple[float, float]]]]:
+    """Для каждой точки сетки — изменившиеся матчапы: ключ -> (было, стало)"""
+    baseline = baseline_results(use_cache)
+    catalogue, starting_sets, distances = load_catalogue()
+    for p in params:
+        _check_field(p.field)
+
+    points = list(itertools.product(*(p.values for p in params)))
+    workers = max(1, min(workers or 1, len(points)))
+    # Непрерывные куски: соседние точки отличаются последним параметром, пересчет минимален
+    size = -(-len(points) // workers)
+    chunks = [points[i:i + size] for i in range(0, len(points), size)]
+
+    if workers == 1:
+        _init_worker(catalogue, starting_sets, distances, baseline)
+        return _run_chunk(params, points)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(catalogue, starting_sets, distances, baseline)) as pool:
+        for chunk_results in pool.map(_run_chunk, [params] * len(chunks), chunks):
+            results.extend(chunk_results)
+    return results
+
+
+def describe(key) -> str:
+    if key[0] in ('move', 'strike'):
+        _, side, unit = key
+        what = 'ход' if key[0] == 'move' else 'ход и атака'
+        return f"Досягаемость из столицы ({what}): {SIDE_NAMES[side]} {UNIT_NAMES[unit]}"
+    if key[0] == 'economy':
+        _, attacker, i, defender, unit = key
+        return f"Прогноз: {SIDE_NAMES[attacker]} #{i + 1} против {SIDE_NAMES[defender]} [{UNIT_NAMES[unit]}]"
+    if key[0] == 'battle':
+        _, attacker, atk_stack, defender, def_stack, forts = key
+        return (f"{SIDE_NAMES[attacker]} [{' + '.join(UNIT_NAMES[u] for u in atk_stack)}] -> "
+                f"{SIDE_NAMES[defender]} [{' + '.join(UNIT_NAMES[u] for u in def_stack) or '—'}], укреп {forts}")
+    _, attacker, i, defender, j = key
+    return f"Наборы: {SIDE_NAMES[attacker]} #{i + 1} -> {SIDE_NAMES[defender]} #{j + 1}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Чувствительность матчапов к характеристикам юнитов')
+    parser.add_argument('--param', action='append', required=True,
+                        help=f"Сторона/Юнит/поле=значения, поле: {', '.join(SWEEP_FIELDS)}, "
+                             "например 'Германия/Т. Танк/attack=14..18'")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--top', type=int, default=5, help='сколько самых сильных изменений показать')
+    parser.add_argument('--json', help='сохранить все изменения в файл')
+    parser.add_argument('--no-cache', action='store_true', help='не читать и не писать кэш на диске')
+    args = parser.parse_args(argv)
+
+    try:
+        params = [SweepParam.parse(text) for text in args.param]
+        results = run_sweep(params, args.workers, use_cache=not args.no_cache)
+    except ValueError as e:
+        parser.error(str(e))
+
+    for point, diff in results:
+        label = ', '.join(f"{UNIT_NAMES[p.unit]}.{p.field}={v}" for p, v in zip(params, point))
+        mean = sum(new - old for old, new in diff.values()) / len(diff) if diff else 0.0
+        print(f"{label}: изменилось {len(diff)} матчапов, средний сдвиг {mean:+.3f}")
+        strongest = sorted(diff.items(), key=lambda item: abs(item[1][1] - item[1][0]), reverse=True)
+        for key, (old, new) in strongest[:args.top]:
+            print(f"    {describe(key)}: {old:.3f} -> {new:.3f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump([{'point': dict(zip((p.label for p in params), point)),
+                        'changes': [{'matchup': describe(key), 'before': old, 'after': new}
+                                    for key, (old, new) in diff.items()]}
+                       for point, diff in results], f, ensure_ascii=False, indent=1)
+
+
+if __name__ == '__main__':
+    main()
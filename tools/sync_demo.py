@@ -0,0 +1,95 @@
+"""
+Проверка сетевой синхронизации двумя процессами на одной машине.
+
+Хозяин играет за СССР, гость за Германию; каждый делает случайные допустимые ходы,
+когда его очередь. Стартовые наборы у процессов разные, поэтому первое подключение
+решается снимком. Посреди партии гость рвет соединение и переподключается,
+а с --conflicts оба процесса иногда ходят вне очереди, чтобы проверить разбор
+конфликтов. В конце позиции сравниваются по хэшу.
+
+    python -m tools.sync_demo --actions 300
+"""
+import argparse
+import multiprocessing
+import random
+import socket
+import time
+
+from catalogue import GERMANY, USSR
+
+SIDES = {'host': USSR, 'guest': GERMANY}
+SETTLE_SECONDS = 2.0
+
+
+def run_peer(role: str, port: int, actions: int, seed: int, conflicts: bool, results):
+    from battle_logic import GameState
+    from movegen import apply_move, generate_moves
+    from netsync import SyncPeer
+
+    rng = random.Random(seed)
+    GameState.seed(seed)
+    GameState.initialize()
+    GameState.set_starting_set(GERMANY, rng.randrange(4))
+    GameState.set_starting_set(USSR, rng.randrange(4))
+
+    peer = SyncPeer(role, '127.0.0.1', port, local_side=SIDES[role])
+    peer.start()
+    dropped = False
+    last_change = time.monotonic()
+    while True:
+        if peer.poll():
+            last_change = time.monotonic()
+        out_of_turn = conflicts and rng.random() < 0.02
+        if peer.connected and peer.seq < actions and (peer.can_act() or out_of_turn):
+            moves = list(generate_moves())
+            if moves and GameState.get_winner() is None:
+                apply_move(rng.choice(moves))
+                last_change = time.monotonic()
+        if role == 'guest' and not dropped and peer.seq >= actions // 2 and peer.connected:
+            # Обрыв связи: гость переподключится сам и досылает пропущенное по hello
+            dropped = True
+            peer._drop(peer._sock)
+        if (peer.seq >= actions or GameState.get_winner() is not None) and \
+                time.monotonic() - last_change > SETTLE_SECONDS:
+            break
+        time.sleep(0.002)
+    results.put((role, peer.seq, GameState.position_digest(), peer.stats.as_dict()))
+    peer.close()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Синхронизация партии между двумя процессами')
+    parser.add_argument('--actions', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--conflicts', action='store_true')
+    args = parser.parse_args(argv)
+
+    port = free_port()
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=run_peer, args=(role, port, args.actions, args.seed + i,
+                                                                args.conflicts, results))
+                 for i, role in enumerate(('host', 'guest'))]
+    for process in processes:
+        process.start()
+    reports = dict((role, (seq, digest, stats)) for role, seq, digest, stats in
+                   (results.get(timeout=300) for _ in processes))
+    for process in processes:
+        process.join()
+
+    for role, (seq, digest, stats) in reports.items():
+        per_delta = stats['bytes_sent'] / stats['deltas_sent'] if stats['deltas_sent'] else 0
+        print(f"{role}: seq {seq}, позиция {digest}, отправлено {stats['bytes_sent']} байт "
+              f"({per_delta:.0f} на дельту), {stats}")
+    digests = {digest for _, digest, _ in reports.values()}
+    print('Позиции совпадают' if len(digests) == 1 else 'ПОЗИЦИИ РАЗОШЛИСЬ')
+    raise SystemExit(0 if len(digests) == 1 else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Сравнение двух выгрузок телеметрии (кнопка «Сохранить» в оверлее) по экранам.
+
+    python -m tools.telemetry_diff old.json new.json
+"""
+import argparse
+
+from telemetry import load_export
+
+COLUMNS = (
+    ('frames', 'кадров', '{:.0f}'),
+    ('frame_p50', 'p50, мс', '{:.1f}'),
+    ('frame_p95', 'p95, мс', '{:.1f}'),
+    ('frame_max', 'макс, мс', '{:.1f}'),
+    ('render_p95', 'отрисовка p95', '{:.1f}'),
+    ('janky', 'рывков', '{:.0f}'),
+    ('gc_ms', 'GC, мс', '{:.1f}'),
+    ('widgets_max', 'виджетов', '{:.0f}'),
+    ('rss_kb_max', 'RSS, КБ', '{:.0f}'),
+)
+
+
+def diff_lines(old: dict, new: dict):
+    yield f"{old['meta']['build'] or '?'} -> {new['meta']['build'] or '?'}"
+    for screen in sorted(set(old['summary']) | set(new['summary'])):
+        before = old['summary'].get(screen)
+        after = new['summary'].get(screen)
+        yield f"=== {screen or '(без экрана)'} ==="
+        for key, title, fmt in COLUMNS:
+            a = fmt.format(before[key]) if before else '—'
+            b = fmt.format(after[key]) if after else '—'
+            delta = ''
+            if before and after and before[key]:
+                delta = f" ({(after[key] - before[key]) / before[key]:+.0%})"
+            yield f"  {title:>14}: {a:>10} -> {b:>10}{delta}"
+        if after and after['janky_actions']:
+            worst = ', '.join(f"{action or '—'} x{count}" for action, count in list(after['janky_actions'].items())[:3])
+            yield f"  рывки после: {worst}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Сравнение выгрузок телеметрии двух сборок')
+    parser.add_argument('old')
+    parser.add_argument('new')
+    args = parser.parse_args(argv)
+    for line in diff_lines(load_export(args.old), load_export(args.new)):
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Хэш позиции в духе Zobrist и таблица транспозиций.
+
+Позиция — набор признаков (ячейка буфера стороны, владелец и стеки провинции, фаза,
+кубик, ход). Каждой паре (признак, значение) соответствует псевдослучайный 64-битный
+ключ, хэш позиции — XOR ключей всех признаков. При изменении одного признака хэш
+пересчитывается за O(1): h ^= key(признак, старое) ^ key(признак, новое).
+
+Ключи не хранятся таблицей: значения (банк, количества) не ограничены, поэтому ключ
+вычисляется перемешиванием splitmix64 из основы признака и значения. Основа признака —
+CRC32 его имени, а не hash() строки: хэш одинаков во всех процессах и годится для
+проверки сохранений и повторов. Нулевое значение дает нулевой ключ, поэтому пустой
+буфер и пустая провинция ничего не вносят в хэш.
+"""
+import zlib
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+MASK = (1 << 64) - 1
+GOLDEN = 0x9E3779B97F4A7C15
+
+_bases: Dict[Tuple, int] = {}
+
+
+def _mix(x: int) -> int:
+    """Финализатор splitmix64"""
+    x = (x + GOLDEN) & MASK
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK
+    return x ^ (x >> 31)
+
+
+def feature(*parts) -> int:
+    """Основа ключа для признака, например feature('side', USSR, 3)"""
+    base = _bases.get(parts)
+    if base is None:
+        text = '\x1f'.join(str(part) for part in parts).encode('utf-8')
+        base = _mix(zlib.crc32(text) | (len(text) << 32))
+        _bases[parts] = base
+    return base
+
+
+def key(base: int, value: int) -> int:
+    if not value:
+        return 0
+    return _mix(base ^ ((value * GOLDEN) & MASK))
+
+
+def province_hash(province) -> int:
+    h = 0
+    if province.owner is not None:
+        h ^= key(feature('owner', province.name, province.owner), 1)
+    h ^= key(feature('forts', province.name), province.forts)
+    for unit, count in province.units.items():
+        h ^= key(feature('stack', province.name, unit), count)
+    return h
+
+
+@lru_cache(maxsize=256)
+def turn_hash(phase_index: int, dice: int, player: int) -> int:
+    # Индекс фазы сдвинут на 1: у первой фазы тоже должен быть ненулевой ключ
+    return (key(feature('phase'), phase_index + 1) ^ key(feature('dice'), dice) ^
+            key(feature('player', player), 1))
+
+
+def digest(position_hash: int) -> str:
+    """Хэш в виде 16 hex-символов для файлов сохранений и журналов"""
+    return f"{position_hash:016x}"
+
+
+class TranspositionTable:
+    """
+    Таблица фиксированного размера: слот выбирается младшими битами хэша, в слоте хранится
+    полный хэш для проверки. При коллизии слота остается запись с большей глубиной
+    (глубина — сколько работы вложено в значение), при равной — более свежая.
+    """
+
+    def __init__(self, size_bits: int = 16):
+        self.size = 1 << size_bits
+        self._mask = self.size - 1
+        self._hashes = [None] * self.size
+        self._values = [None] * self.size
+        self._depths = [0] * self.size
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.replaced = 0
+        self.rejected = 0
+        self.filled = 0
+
+    def get(self, position_hash: int, min_depth: int = 0) -> Optional[object]:
+        self.probes += 1
+        i = position_hash & self._mask
+        if self._hashes[i] == position_hash and self._depths[i] >= min_depth:
+            self.hits += 1
+            return self._values[i]
+        return None
+
+    def __contains__(self, position_hash: int) -> bool:
+        return self._hashes[position_hash & self._mask] == position_hash
+
+    def put(self, position_hash: int, value, depth: int = 0):
+        i = position_hash & self._mask
+        current = self._hashes[i]
+        if current is None:
+            self.filled += 1
+        elif current != position_hash:
+            if self._depths[i] > depth:
+                self.rejected += 1
+                return
+            self.replaced += 1
+        self._hashes[i] = position_hash
+        self._values[i] = value
+        self._depths[i] = depth
+        self.stores += 1
+
+    def clear(self):
+        self.__init__(self.size.bit_length() - 1)
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.probes if self.probes else 0.0
+
+    def stats(self) -> dict:
+        return {
+            'size': self.size,
+            'filled': self.filled,
+            'probes': self.probes,
+            'hits': self.hits,
+            'hit_rate': self.hit_rate,
+            'stores': self.stores,
+            'replaced': self.replaced,
+            'rejected': self.rejected,
+        }